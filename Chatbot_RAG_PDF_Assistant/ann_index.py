@@ -0,0 +1,192 @@
+import json
+import os
+from array import array
+import numpy as np
+
+# Rows assigned per block, to bound the temporary (rows x nlist) score matrix
+_ASSIGN_BLOCK = 8192
+
+# Rows before an index with a derived nlist trains. Below this, exact search
+# over the whole matrix takes about a millisecond and IVF gains nothing.
+MIN_TRAIN_ROWS = 2048
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index over a VectorIndex matrix
+
+    The index learns nlist centroids with spherical k-means once enough rows
+    have arrived, then files every row under its nearest centroid. A query
+    only scores the rows filed under its nprobe closest centroids, so nprobe
+    trades recall for latency. Rows added after training are assigned
+    incrementally; until the index is trained, callers fall back to exact
+    search.
+
+    Without an explicit nlist, the index trains once MIN_TRAIN_ROWS rows
+    have arrived and uses sqrt(rows) lists, which keeps enough rows per list
+    for k-means at the size of a single large document.
+
+    The vectors themselves stay in the parent matrix; this index only keeps
+    the centroids and one list of row numbers per centroid. With a directory,
+    the centroids and an append-only row -> list assignment file are persisted
+    next to the corpus.
+    """
+    PARAMS_FILE = "ivf.json"
+    CENTROIDS_FILE = "ivf_centroids.f32"
+    ASSIGN_FILE = "ivf_assign.i32"
+
+    def __init__(self, nlist=None, nprobe=8, train_size=None, iterations=10, directory=None, seed=0):
+        """
+        Initialize an untrained index (or open a persisted one)
+
+        Args:
+            nlist (int): Number of centroids / inverted lists (derived from the rows
+                available at training time if None)
+            nprobe (int): Lists scanned per query; higher is slower but more accurate
+            train_size (int): Rows required before training (defaults to 39 * nlist,
+                or MIN_TRAIN_ROWS when nlist is derived)
+            iterations (int): k-means iterations
+            directory (str): Directory to persist the index in, if any
+            seed (int): Random seed for centroid initialisation
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size or (39 * nlist if nlist else MIN_TRAIN_ROWS)
+        self.iterations = iterations
+        self.directory = directory
+        self.seed = seed
+        self.centroids = None
+        self._lists = None
+        self._assigned = 0
+        if directory and os.path.exists(self._path(self.PARAMS_FILE)):
+            self._open()
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open(self):
+        with open(self._path(self.PARAMS_FILE), "r", encoding="utf-8") as f:
+            params = json.load(f)
+        self.nlist = params["nlist"]
+        self.train_size = params["train_size"]
+        if params.get("dim"):
+            self.centroids = np.fromfile(self._path(self.CENTROIDS_FILE),
+                                         dtype=np.float32).reshape(self.nlist, params["dim"])
+            assignments = np.fromfile(self._path(self.ASSIGN_FILE), dtype=np.int32)
+            self._assigned = len(assignments)
+            self._build_lists(assignments)
+
+    def _build_lists(self, assignments, offset=0):
+        if self._lists is None:
+            self._lists = [array("q") for _ in range(self.nlist)]
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(self.nlist + 1))
+        for list_id in range(self.nlist):
+            rows = order[bounds[list_id]:bounds[list_id + 1]] + offset
+            if len(rows):
+                self._lists[list_id].extend(rows.tolist())
+
+    def _save_params(self):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        params = {
+            "nlist": self.nlist,
+            "train_size": self.train_size,
+            "dim": None if self.centroids is None else int(self.centroids.shape[1]),
+        }
+        tmp_path = self._path(self.PARAMS_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(params, f)
+        os.replace(tmp_path, self._path(self.PARAMS_FILE))
+
+    def train(self, matrix):
+        """
+        Learn the centroids with spherical k-means and assign every row
+
+        Args:
+            matrix (np.ndarray): Normalized vectors, one per row
+        """
+        rng = np.random.default_rng(self.seed)
+        sample = matrix
+        if len(matrix) > self.train_size:
+            sample = matrix[np.sort(rng.choice(len(matrix), self.train_size, replace=False))]
+        sample = np.asarray(sample, dtype=np.float32)
+        nlist = min(self.nlist or max(1, int(np.sqrt(len(matrix)))), len(sample))
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+        for _ in range(self.iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=nlist) == 0
+            # Re-seed empty clusters with random sample points
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+
+        self.nlist = nlist
+        self.centroids = centroids.astype(np.float32)
+        self._lists = None
+        self._assigned = 0
+        if self.directory:
+            self.centroids.tofile(self._path(self.CENTROIDS_FILE))
+            open(self._path(self.ASSIGN_FILE), "wb").close()
+        self._save_params()
+        self.add(matrix, 0)
+
+    def add(self, matrix, start):
+        """
+        Keep the index in sync with rows appended to the parent matrix
+
+        Args:
+            matrix (np.ndarray): Full normalized matrix of the parent index
+            start (int): First row that has not been added yet
+        """
+        if not self.trained:
+            if len(matrix) >= self.train_size:
+                self.train(matrix)
+            return
+        # Skip rows already assigned (e.g. when reopening a persisted index)
+        start = max(start, self._assigned)
+        for block_start in range(start, len(matrix), _ASSIGN_BLOCK):
+            block = np.asarray(matrix[block_start:block_start + _ASSIGN_BLOCK], dtype=np.float32)
+            assignments = np.argmax(block @ self.centroids.T, axis=1).astype(np.int32)
+            self._build_lists(assignments, offset=block_start)
+            if self.directory:
+                with open(self._path(self.ASSIGN_FILE), "ab") as f:
+                    f.write(assignments.tobytes())
+            self._assigned = block_start + len(block)
+
+    def sync(self, matrix):
+        """
+        Assign any rows of the parent matrix the index has not seen yet
+
+        Args:
+            matrix (np.ndarray): Full normalized matrix of the parent index
+        """
+        if self.trained and self._assigned < len(matrix):
+            self.add(matrix, self._assigned)
+
+    def candidates(self, query, nprobe=None):
+        """
+        Rows filed under the lists closest to a query
+
+        Args:
+            query (np.ndarray): Normalized query vector
+            nprobe (int): Lists to scan (defaults to self.nprobe)
+
+        Returns:
+            np.ndarray: Candidate row numbers
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        centroid_scores = self.centroids @ query
+        probed = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        rows = [np.frombuffer(self._lists[list_id], dtype=np.int64) for list_id in probed
+                if len(self._lists[list_id])]
+        return np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
@@ -1,12 +1,26 @@
 import streamlit as st
 import tempfile
 import os
-from pdf_processor import process_pdf, display_pdf
-from rag_engine import RAGEngine
+import sys
+
+# Shared modules (resources, providers, metrics) live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_processor import display_pdf
+from ingestion_pipeline import IngestionPipeline
+from rag_engine import DEFAULT_TENANT, RAGEngine
+from embedding_cache import EmbeddingCache
+from shared_resources import (cohere_client, groq_client, llm_provider, mongo_client, release_session_lease,
+                              session_lease, session_resource)
+from stream_render import StreamRenderer
+from history_view import HistoryView
+from user_registry import hash_key
 
 # Initialize session state for storing chat history and PDF state
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "history_view" not in st.session_state:
+    # Recent messages eagerly, older ones paged on request
+    st.session_state.history_view = HistoryView(older_label="🕘 Earlier messages", hidden_label="{count} messages hidden")
     
 if "pdf_indexed" not in st.session_state:
     st.session_state.pdf_indexed = False
@@ -14,19 +28,22 @@ if "pdf_indexed" not in st.session_state:
 if "pdf_path" not in st.session_state:
     st.session_state.pdf_path = None
     
-if "pdf_content" not in st.session_state:
-    st.session_state.pdf_content = None
-    
-if "rag_engine" not in st.session_state:
-    st.session_state.rag_engine = None
+if "rag_tenant" not in st.session_state:
+    st.session_state.rag_tenant = None
 
 # Check for required API keys and MongoDB URI
 groq_api_key = os.environ.get("GROQ_API_KEY")
 cohere_api_key = os.environ.get("COHERE_API_KEY")
 mongodb_uri = os.environ.get("MONGODB_URI")
+# Optional on-disk vector index; when set, MongoDB is not required
+rag_index_dir = os.environ.get("RAG_INDEX_DIR")
+# Optional approximate search for large documents: $RAG_ANN_NPROBE inverted
+# lists scanned per query (fewer is faster, more is closer to exact search)
+rag_ann_nprobe = os.environ.get("RAG_ANN_NPROBE")
+rag_ann_params = {"nprobe": int(rag_ann_nprobe)} if rag_ann_nprobe else None
 
-if not groq_api_key or not cohere_api_key or not mongodb_uri:
-    st.error("⚠️ Missing required API keys or MongoDB URI. Please add GROQ_API_KEY, COHERE_API_KEY, and MONGODB_URI to your environment.")
+if not groq_api_key or not cohere_api_key or not (mongodb_uri or rag_index_dir):
+    st.error("⚠️ Missing required API keys or storage. Please add GROQ_API_KEY, COHERE_API_KEY, and MONGODB_URI (or RAG_INDEX_DIR) to your environment.")
 
 # Page configuration
 st.set_page_config(
@@ -39,8 +56,81 @@ st.set_page_config(
 # Create the main title with an icon
 st.markdown('## :material/chat: PDF Chat Assistant')
 
+def workspace_tenant(workspace_key):
+    """
+    Tenant the session's documents are indexed under
+    
+    A workspace key selects a private tenant named after its digest (the key
+    itself is never stored); without one, sessions share $RAG_TENANT. Either
+    way the indexes are reused across sessions and restarts.
+    """
+    if workspace_key:
+        return hash_key(workspace_key)[:32]
+    return os.environ.get("RAG_TENANT", DEFAULT_TENANT)
+
+def rag_clients():
+    """
+    Clients of the RAG engines, shared by all sessions
+    
+    Every session using an engine leases them too, so they stay open as long
+    as any session still uses an engine built on them.
+    """
+    collection = None
+    if mongodb_uri:
+        collection = mongo_client(st.session_state, mongodb_uri)["pdf_chat_db"]["document_embeddings"]
+    embed_cache_path = os.environ.get("RAG_EMBED_CACHE")
+    embedding_cache = None
+    if embed_cache_path:
+        embedding_cache = session_resource(
+            st.session_state, ("embedding_cache", embed_cache_path),
+            lambda: EmbeddingCache(embed_cache_path)
+        )
+    return {
+        "groq_client": groq_client(st.session_state, groq_api_key),
+        "cohere_client": cohere_client(st.session_state, cohere_api_key),
+        "collection": collection,
+        "embedding_cache": embedding_cache,
+        "llm": llm_provider(
+            st.session_state,
+            groq={"api_key": groq_api_key, "model": "llama-3.1-8b-instant"},
+            ollama={"model": "gemma3:4b"}
+        ),
+    }
+
+def engine_health(engine):
+    """Fails once the engine's MongoDB client was closed, so the engine is rebuilt on the new client"""
+    if engine.collection is not None:
+        engine.collection.database.client.admin.command("ping")
+
+def get_rag_engine(tenant):
+    """
+    RAG engine of the tenant, shared by every session working on it
+    
+    One engine per tenant means one set of memory-mapped indexes: sessions
+    see each other's documents, and indexing is serialized by the engine.
+    """
+    # Leased by this session too, so they outlive the session that built the engine
+    rag_clients()
+    previous = st.session_state.rag_tenant
+    if previous is not None and previous != tenant:
+        release_session_lease(st.session_state, ("rag_engine", previous))
+    st.session_state.rag_tenant = tenant
+    lease = session_lease(
+        st.session_state, ("rag_engine", tenant),
+        # Clients are looked up again when the engine is rebuilt
+        lambda: RAGEngine(None, groq_api_key, cohere_api_key, index_dir=rag_index_dir,
+                          tenant=tenant, ann_params=rag_ann_params, **rag_clients()),
+        health_check=engine_health
+    )
+    return lease.value
+
+storage_ready = bool(groq_api_key and cohere_api_key and (mongodb_uri or rag_index_dir))
+
 # Create a sidebar
 with st.sidebar:
+    workspace_key = st.text_input("Workspace key (optional)", type="password")
+    tenant = workspace_tenant(workspace_key)
+    
     st.markdown("## Document Upload 📁")
     
     # File uploader for PDF
@@ -56,13 +146,26 @@ with st.sidebar:
         if st.button("Index Document", type="primary", use_container_width=True):
             with st.spinner("Processing document..."):
                 try:
-                    # Process the PDF
-                    pdf_content = process_pdf(st.session_state.pdf_path)
-                    st.session_state.pdf_content = pdf_content
+                    rag_engine = get_rag_engine(tenant)
+                    
+                    # Extract, chunk, embed and store with overlapping stages
+                    progress_placeholder = st.empty()
                     
-                    # Initialize RAG engine with both API keys
-                    rag_engine = RAGEngine(pdf_content, groq_api_key, cohere_api_key)
-                    st.session_state.rag_engine = rag_engine
+                    def show_progress(report):
+                        progress_placeholder.caption("  \n".join(
+                            f"**{stage['stage']}**: {stage['items']} ({stage['throughput']}/s)"
+                            for stage in report
+                        ))
+                    
+                    pipeline = IngestionPipeline(
+                        rag_engine,
+                        extract_workers=os.cpu_count() or 1,
+                        progress=show_progress
+                    )
+                    pipeline.run(st.session_state.pdf_path, title=uploaded_file.name)
+                    if pipeline.page_errors:
+                        st.warning(f"Skipped {len(pipeline.page_errors)} unreadable page(s): "
+                                   + ", ".join(str(page) for page, _ in pipeline.page_errors))
                     st.session_state.pdf_indexed = True
                     
                     # Success message
@@ -76,12 +179,28 @@ with st.sidebar:
         st.markdown("## PDF Preview 📄")
         display_pdf(st.session_state.pdf_path)
 
+# Documents indexed for this tenant, by any session, are available without uploading again
+rag_engine = None
+if storage_ready:
+    try:
+        rag_engine = get_rag_engine(tenant)
+        st.session_state.pdf_indexed = bool(rag_engine.documents())
+    except Exception as e:
+        st.error(f"Error opening the document index: {str(e)}")
+
 # Main chat area
-if st.session_state.pdf_indexed and st.session_state.rag_engine:
+if st.session_state.pdf_indexed and rag_engine is not None:
+    # Choose which indexed documents to search
+    indexed_docs = rag_engine.documents()
+    selected_docs = st.multiselect(
+        "Documents",
+        options=list(indexed_docs),
+        default=list(indexed_docs),
+        format_func=lambda doc_id: indexed_docs[doc_id]
+    )
+    
     # Display chat messages
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    st.session_state.history_view.render(st.session_state.messages)
     
     # Chat input
     if prompt := st.chat_input("Ask a question about your document"):
@@ -94,23 +213,18 @@ if st.session_state.pdf_indexed and st.session_state.rag_engine:
         
         # Display assistant response with streaming
         with st.chat_message("assistant"):
-            message_placeholder = st.empty()
-            full_response = ""
+            renderer = StreamRenderer(st.empty(), cursor="✨")
             
             try:
                 # Get streaming response from RAG engine
-                stream = st.session_state.rag_engine.query(prompt)
+                stream = rag_engine.query(prompt, doc_ids=selected_docs)
                 
-                # Process the streaming response
-                for chunk in stream:
-                    if hasattr(chunk.choices[0].delta, 'content'):
-                        content = chunk.choices[0].delta.content
-                        if content:
-                            full_response += content
-                            message_placeholder.markdown(full_response + "✨")
+                # Process the streaming response, redrawing at a capped rate
+                for token in stream:
+                    renderer.write(token)
                 
                 # Update with final response (without cursor)
-                message_placeholder.markdown(full_response)
+                full_response = renderer.finish()
                 
                 # Add assistant response to chat history
                 st.session_state.messages.append({"role": "assistant", "content": full_response})
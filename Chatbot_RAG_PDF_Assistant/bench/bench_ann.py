@@ -0,0 +1,68 @@
+"""
+Recall@k and latency of the IVF index against exact brute-force search.
+
+Usage (from Chatbot_RAG_PDF_Assistant/):
+    python bench/bench_ann.py --rows 200000 --dim 1024 --nlist 1024
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_index import VectorIndex
+
+
+def clustered_vectors(rows, dim, clusters, rng):
+    """Synthetic embeddings grouped around random topics, like chunks of real documents"""
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, rows)
+    return centers[labels] + 0.6 * rng.standard_normal((rows, dim)).astype(np.float32)
+
+
+def recall_at_k(exact, approx):
+    exact_rows = {row for row, _ in exact}
+    return len(exact_rows.intersection(row for row, _ in approx)) / max(len(exact_rows), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--nlist", type=int, default=512)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=10_000, help="rows per insert")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    corpus = clustered_vectors(args.rows, args.dim, max(args.nlist // 2, 1), rng)
+    queries = corpus[rng.choice(args.rows, args.queries)] + 0.3 * rng.standard_normal(
+        (args.queries, args.dim)).astype(np.float32)
+
+    index = VectorIndex(args.dim, ann_params={"nlist": args.nlist})
+    start = time.perf_counter()
+    for offset in range(0, args.rows, args.batch):
+        batch = corpus[offset:offset + args.batch]
+        index.add(list(range(offset, offset + len(batch))), [""] * len(batch), batch)
+    print(f"built {args.rows} rows incrementally in {time.perf_counter() - start:.2f}s "
+          f"(trained={index.ann.trained})")
+
+    start = time.perf_counter()
+    exact = [index.search(query, args.k, exact=True) for query in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / args.queries
+    print(f"exact      {exact_ms:8.2f} ms/query  recall@{args.k}=1.000")
+
+    for nprobe in args.nprobe:
+        start = time.perf_counter()
+        approx = [index.search(query, args.k, nprobe=nprobe) for query in queries]
+        approx_ms = (time.perf_counter() - start) * 1000 / args.queries
+        recall = np.mean([recall_at_k(e, a) for e, a in zip(exact, approx)])
+        print(f"nprobe={nprobe:<4d}{approx_ms:8.2f} ms/query  recall@{args.k}={recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Compare serial and batched ingestion in RAGEngine.store_documents
+against a local stub embedder.
+
+Usage (from Chatbot_RAG_PDF_Assistant/):
+    python bench/bench_ingest.py --chunks 500 --latency 0.05
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# metrics.py, imported by rag_engine, lives at the repository root
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from langchain.schema import Document
+from rag_engine import RAGEngine
+from stubs import StubCollection, StubEmbedder
+
+
+def run(num_chunks, latency, batch_size, concurrency):
+    embedder = StubEmbedder(latency=latency)
+    collection = StubCollection()
+    engine = RAGEngine([], None, None,
+                       embed_batch_size=batch_size,
+                       embed_concurrency=concurrency,
+                       groq_client=object(),
+                       cohere_client=embedder,
+                       collection=collection)
+    documents = [Document(page_content=f"chunk {i} " + "lorem ipsum " * 80)
+                 for i in range(num_chunks)]
+
+    start = time.perf_counter()
+    engine.store_documents(documents)
+    elapsed = time.perf_counter() - start
+
+    assert [doc["id"] for doc in collection.docs] == list(range(num_chunks))
+    return elapsed, embedder.calls, collection.writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="simulated seconds per embedding call")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    for label, batch_size, concurrency in (
+        ("serial", 1, 1),
+        ("batched", 96, args.concurrency),
+    ):
+        elapsed, calls, writes = run(args.chunks, args.latency, batch_size, concurrency)
+        print(f"{label:8s} {elapsed:8.2f}s  embed calls={calls:5d}  writes={writes:5d}  "
+              f"{args.chunks / elapsed:10.1f} chunks/s")
+
+
+if __name__ == "__main__":
+    main()
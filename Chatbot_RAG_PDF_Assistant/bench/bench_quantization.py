@@ -0,0 +1,53 @@
+"""
+Memory, latency and accuracy of quantized embedding storage versus float32.
+
+Usage (from Chatbot_RAG_PDF_Assistant/):
+    python bench/bench_quantization.py --rows 50000 --dim 1024
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_ann import clustered_vectors, recall_at_k
+from vector_index import DTYPES, VectorIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    corpus = clustered_vectors(args.rows, args.dim, 256, rng)
+    queries = corpus[rng.choice(args.rows, args.queries)] + 0.3 * rng.standard_normal(
+        (args.queries, args.dim)).astype(np.float32)
+
+    reference = None
+    for dtype in DTYPES:
+        index = VectorIndex(args.dim, dtype=dtype)
+        index.add(list(range(args.rows)), [""] * args.rows, corpus)
+
+        start = time.perf_counter()
+        results = [index.search(query, args.k) for query in queries]
+        latency_ms = (time.perf_counter() - start) * 1000 / args.queries
+        scores = np.stack([index.scores(query) for query in queries[:20]])
+
+        if reference is None:
+            reference = (results, scores, index.nbytes, latency_ms)
+        recall = np.mean([recall_at_k(e, a) for e, a in zip(reference[0], results)])
+        score_error = np.abs(scores - reference[1]).max()
+        # Quantized rows are widened to float32 while scoring, so they trade latency for memory
+        print(f"{dtype:8s} {index.nbytes / 2**20:9.1f} MiB ({reference[2] / index.nbytes:.1f}x smaller)  "
+              f"{latency_ms:7.2f} ms/query ({latency_ms / reference[3]:.1f}x float32)  "
+              f"recall@{args.k}={recall:.3f}  max |score error|={score_error:.5f}")
+
+
+if __name__ == "__main__":
+    main()
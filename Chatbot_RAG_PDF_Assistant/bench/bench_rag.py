@@ -0,0 +1,156 @@
+"""
+Offline ingestion and retrieval benchmark for RAGEngine.
+
+Builds synthetic corpora of the requested sizes with the Cohere, Groq and
+MongoDB clients replaced by local stand-ins (see stubs.py), and reports for
+each size: ingestion throughput, per-query retrieval latency (p50/p95/p99),
+peak RSS and index size. Each size runs in a fresh process so peak RSS is
+not inherited from the previous run. Results are printed as JSON lines and
+optionally appended to --output, so runs can be compared over time.
+
+Usage (from Chatbot_RAG_PDF_Assistant/):
+    python bench/bench_rag.py --sizes 1000 10000 100000 --output bench_results.jsonl
+    python bench/bench_rag.py --sizes 1000000 --storage disk --dtype int8 --ann-nlist 1024
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# metrics.py, imported by rag_engine, lives at the repository root
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+WORDS = ("cluster node pod deploy rollback ingress certificate rotate terraform state lock "
+         "drain cordon kubelet etcd backup restore firewall vpn subnet route dns latency "
+         "timeout retry alert prometheus grafana ansible playbook inventory jenkins pipeline "
+         "artifact registry image vulnerability patch kernel disk volume snapshot replica "
+         "failover quorum leader election heartbeat threshold incident runbook escalation").split()
+CHUNK_WORDS = 120
+BENCH_DOC_ID = "bench"
+
+
+def synthetic_chunks(count, rng, start=0):
+    """Runbook-like chunks mixing vocabulary words with unique identifiers"""
+    words = np.array(WORDS)
+    picks = rng.integers(0, len(words), (count, CHUNK_WORDS))
+    for i, row in enumerate(picks):
+        chunk_id = start + i
+        yield (f"MEP_{chunk_id} host-{chunk_id % 997:03d}.prod " + " ".join(words[row]))
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def run_size(size, args):
+    """Ingest one synthetic corpus and time queries against it (runs in a child process)"""
+    for name in ("MONGODB_URI", "RAG_INDEX_DIR", "RAG_EMBED_CACHE"):
+        os.environ.pop(name, None)
+
+    from langchain.schema import Document
+    from rag_engine import RAGEngine
+    from stubs import StubCollection, StubEmbedder, StubGroq
+
+    rng = np.random.default_rng(size)
+    index_dir = tempfile.mkdtemp(prefix="rag_bench_") if args.storage == "disk" else None
+    engine = RAGEngine(
+        None, None, None,
+        groq_client=StubGroq(),
+        cohere_client=StubEmbedder(latency=args.embed_latency),
+        collection=None if index_dir else StubCollection(keep=False),
+        index_dir=index_dir,
+        ann_params={"nlist": args.ann_nlist} if args.ann_nlist else None,
+        vector_dtype=args.dtype,
+        doc_ttl=None,
+    )
+
+    start = time.perf_counter()
+    engine.begin_document(BENCH_DOC_ID)
+    for offset in range(0, size, args.ingest_batch):
+        count = min(args.ingest_batch, size - offset)
+        documents = [Document(page_content=text) for text in synthetic_chunks(count, rng, offset)]
+        engine.store_documents(documents, doc_id=BENCH_DOC_ID)
+    engine.finish_document(BENCH_DOC_ID, "synthetic")
+    ingest_seconds = time.perf_counter() - start
+
+    words = np.array(WORDS)
+    queries = [
+        f"how to {' '.join(words[rng.integers(0, len(words), 6)])} on MEP_{rng.integers(0, size)}"
+        for _ in range(args.queries)
+    ]
+    latencies = []
+    for question in queries:
+        start = time.perf_counter()
+        engine._get_relevant_documents(question)
+        latencies.append(time.perf_counter() - start)
+
+    index = engine.indexes[BENCH_DOC_ID]
+    index_bytes = directory_size(index_dir) if index_dir else index.nbytes
+    if index_dir:
+        shutil.rmtree(index_dir, ignore_errors=True)
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "chunks": size,
+        "storage": args.storage,
+        "dtype": args.dtype,
+        "ann_nlist": args.ann_nlist,
+        "embed_latency_s": args.embed_latency,
+        "ingest_seconds": round(ingest_seconds, 3),
+        "ingest_chunks_per_s": round(size / ingest_seconds, 1),
+        "query_p50_ms": percentile_ms(latencies, 50),
+        "query_p95_ms": percentile_ms(latencies, 95),
+        "query_p99_ms": percentile_ms(latencies, 99),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "index_bytes": index_bytes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="corpus sizes in chunks (1000000 is supported but slow)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--storage", choices=("memory", "disk"), default="memory",
+                        help="in-memory index with a stub collection, or persistent index files")
+    parser.add_argument("--dtype", choices=("float32", "float16", "int8"), default="float32")
+    parser.add_argument("--ann-nlist", type=int, default=None, help="enable the IVF index")
+    parser.add_argument("--embed-latency", type=float, default=0.0,
+                        help="simulated seconds per embedding call")
+    parser.add_argument("--ingest-batch", type=int, default=10_000,
+                        help="chunks passed to each store_documents call")
+    parser.add_argument("--output", help="append results to this JSONL file")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    for size in args.sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(run_size, size, args).result()
+        line = json.dumps(result)
+        print(line, flush=True)
+        if args.output:
+            with open(args.output, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Local stand-ins for the external services used by RAGEngine, so ingestion
+and retrieval can be measured without network access.
+"""
+import hashlib
+import threading
+import time
+from types import SimpleNamespace
+import numpy as np
+
+
+class StubEmbedder:
+    """
+    Deterministic replacement for cohere.Client.embed
+
+    Every call sleeps for `latency` seconds (one simulated round-trip),
+    independent of how many texts it carries.
+    """
+    def __init__(self, dim=1024, latency=0.05):
+        self.dim = dim
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text):
+        # Same text, same vector: seed a generator from the text hash
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dim, dtype=np.float32)
+
+    def embed(self, texts, model=None, input_type=None):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return SimpleNamespace(embeddings=[self._vector(text) for text in texts])
+
+
+class StubCollection:
+    """
+    In-memory replacement for the pymongo collection used by RAGEngine
+
+    With keep=False inserted documents are counted but discarded, which
+    stands in for a remote database when benchmarking large corpora.
+    """
+    def __init__(self, latency=0.0, keep=True):
+        self.latency = latency
+        self.keep = keep
+        self.docs = []
+        self.writes = 0
+
+    def _write(self):
+        self.writes += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def create_index(self, keys, **kwargs):
+        pass
+
+    def index_information(self):
+        return {}
+
+    def drop_index(self, name):
+        pass
+
+    def insert_one(self, doc):
+        self.insert_many([doc])
+
+    def insert_many(self, docs):
+        self._write()
+        if self.keep:
+            self.docs.extend(dict(doc) for doc in docs)
+
+    def update_many(self, query, update):
+        for doc in self.docs:
+            if _matches(doc, query):
+                doc.update(update.get("$set", {}))
+
+    def delete_many(self, query):
+        self.docs = [doc for doc in self.docs if not _matches(doc, query)]
+
+    def find(self, query=None, projection=None):
+        return [dict(doc) for doc in self.docs if _matches(doc, query or {})]
+
+    def find_one(self, query=None, projection=None):
+        return next(iter(self.find(query, projection)), None)
+
+
+class StubGroq:
+    """
+    Replacement for groq.Groq that streams a canned answer
+
+    Mirrors the chat.completions.create(stream=True) interface: an iterator
+    of chunks exposing choices[0].delta.content.
+    """
+    def __init__(self, answer="This is a canned answer from the local stub.", token_delay=0.0):
+        self.answer = answer
+        self.token_delay = token_delay
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, messages, stream=False, **kwargs):
+        tokens = [token + " " for token in self.answer.split()]
+        if not stream:
+            message = SimpleNamespace(content="".join(tokens))
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        return self._stream(tokens)
+
+    def _stream(self, tokens):
+        for token in tokens:
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+
+def _matches(doc, query):
+    return all(doc.get(key) == value for key, value in query.items())
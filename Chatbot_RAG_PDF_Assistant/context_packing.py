@@ -0,0 +1,177 @@
+import hashlib
+import re
+from dataclasses import dataclass
+import numpy as np
+from chat_history import CHARS_PER_TOKEN, estimate_tokens
+from vector_index import normalize
+
+
+@dataclass
+class Segment:
+    """A run of consecutive chunks of one document, merged into a single passage"""
+    doc_id: str
+    rows: list
+    text: str
+    score: float
+    vector: np.ndarray = None
+
+
+def join_overlapping(first, second, max_overlap):
+    """
+    Concatenate two neighbouring chunks without repeating their shared text
+
+    Args:
+        first (str): Earlier chunk
+        second (str): Following chunk
+        max_overlap (int): Longest overlap to look for, in characters
+
+    Returns:
+        str: Joined text
+    """
+    for size in range(min(max_overlap, len(first), len(second)), 0, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first}\n{second}"
+
+
+def merge_adjacent(hits, indexes, max_overlap):
+    """
+    Merge retrieved chunks that are neighbours in the same document
+
+    Args:
+        hits (list): (doc_id, row, score) tuples
+        indexes (dict): Document id -> VectorIndex
+        max_overlap (int): Longest chunk overlap, in characters
+
+    Returns:
+        list: Segments, each scored with the best score of its chunks
+    """
+    by_doc = {}
+    for doc_id, row, score in hits:
+        by_doc.setdefault(doc_id, {})[row] = score
+
+    segments = []
+    for doc_id, scores in by_doc.items():
+        index = indexes[doc_id]
+        doc_segments = []
+        for row in sorted(scores):
+            text = index.content(row)
+            last = doc_segments[-1] if doc_segments else None
+            if last is not None and row == last.rows[-1] + 1:
+                last.rows.append(row)
+                last.text = join_overlapping(last.text, text, max_overlap)
+                last.score = max(last.score, scores[row])
+            else:
+                doc_segments.append(Segment(doc_id, [row], text, scores[row]))
+        for segment in doc_segments:
+            segment.vector = normalize(index.vectors(np.asarray(segment.rows)).mean(axis=0))
+        segments.extend(doc_segments)
+    return segments
+
+
+def drop_duplicates(segments):
+    """
+    Remove segments whose text repeats an earlier, better-scored one (e.g. boilerplate pages)
+
+    Args:
+        segments (list): Segments
+
+    Returns:
+        list: Segments with unique normalized text, best score first
+    """
+    seen, unique = set(), []
+    for segment in sorted(segments, key=lambda s: s.score, reverse=True):
+        key = hashlib.sha1(re.sub(r"\W+", " ", segment.text.lower()).strip().encode("utf-8")).digest()
+        if key not in seen:
+            seen.add(key)
+            unique.append(segment)
+    return unique
+
+
+def mmr(segments, query_vector=None, diversity=0.3):
+    """
+    Order segments by maximal marginal relevance
+
+    Each step picks the segment maximizing
+    (1 - diversity) * relevance - diversity * max similarity to those already picked.
+    Relevance is the cosine similarity to the query when a query vector is
+    given, otherwise the retrieval score rescaled to [0, 1].
+
+    Args:
+        segments (list): Segments with vectors
+        query_vector (array-like): Query embedding, if available
+        diversity (float): Weight of the redundancy penalty in [0, 1]
+
+    Returns:
+        list: Segments, most useful first
+    """
+    if len(segments) < 2:
+        return list(segments)
+    vectors = np.stack([segment.vector for segment in segments])
+    if query_vector is not None:
+        relevance = vectors @ normalize(query_vector)
+    else:
+        scores = np.array([segment.score for segment in segments], dtype=np.float32)
+        spread = scores.max() - scores.min()
+        relevance = (scores - scores.min()) / spread if spread else np.ones_like(scores)
+    similarity = vectors @ vectors.T
+
+    order = [int(np.argmax(relevance))]
+    redundancy = similarity[order[0]].copy()
+    remaining = set(range(len(segments))) - set(order)
+    while remaining:
+        candidates = np.fromiter(remaining, dtype=np.int64)
+        gains = (1 - diversity) * relevance[candidates] - diversity * redundancy[candidates]
+        best = int(candidates[np.argmax(gains)])
+        order.append(best)
+        remaining.remove(best)
+        redundancy = np.maximum(redundancy, similarity[best])
+    return [segments[i] for i in order]
+
+
+def pack(segments, token_budget):
+    """
+    Keep segments in order while they fit the token budget
+
+    The first segment is truncated rather than dropped if it alone exceeds
+    the budget, so the prompt always carries some evidence.
+
+    Args:
+        segments (list): Segments, most useful first
+        token_budget (int): Maximum estimated tokens of context
+
+    Returns:
+        list: Passage texts
+    """
+    passages, used = [], 0
+    for segment in segments:
+        tokens = estimate_tokens(segment.text)
+        if used + tokens <= token_budget:
+            passages.append(segment.text)
+            used += tokens
+        elif not passages:
+            passages.append(segment.text[:token_budget * CHARS_PER_TOKEN])
+            used = token_budget
+    return passages
+
+
+def build_context(hits, indexes, token_budget, query_vector=None, max_overlap=200, diversity=0.3):
+    """
+    Assemble prompt context from retrieved chunks
+
+    Neighbouring chunks are merged without their overlap, duplicate passages
+    are dropped, the rest is diversified with MMR and packed to the budget.
+
+    Args:
+        hits (list): (doc_id, row, score) tuples from retrieval
+        indexes (dict): Document id -> VectorIndex
+        token_budget (int): Maximum estimated tokens of context
+        query_vector (array-like): Query embedding, if available
+        max_overlap (int): Longest chunk overlap, in characters
+        diversity (float): MMR redundancy weight
+
+    Returns:
+        list: Passage texts, most useful first
+    """
+    segments = drop_duplicates(merge_adjacent(hits, indexes, max_overlap))
+    return pack(mmr(segments, query_vector, diversity), token_budget)
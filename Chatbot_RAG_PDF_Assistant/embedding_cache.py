@@ -0,0 +1,145 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import numpy as np
+from metrics import metrics
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed cache of embedding vectors
+
+    Entries are keyed by a hash of (model, input_type, text) and stored as
+    float32 blobs in a local SQLite file. When the cache grows beyond
+    max_entries the least recently used entries are evicted. The cache is
+    safe to share between threads.
+    """
+    def __init__(self, path, max_entries=200_000):
+        """
+        Open (or create) the cache
+
+        Args:
+            path (str): SQLite database file
+            max_entries (int): Maximum number of cached vectors
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def key(model, input_type, text):
+        """
+        Cache key for one text
+
+        Args:
+            model (str): Embedding model name
+            input_type (str): Embedding input type
+            text (str): Embedded text
+
+        Returns:
+            str: SHA-256 hex digest
+        """
+        digest = hashlib.sha256()
+        for part in (model, input_type, text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get_many(self, model, input_type, texts):
+        """
+        Look up cached vectors
+
+        Args:
+            model (str): Embedding model name
+            input_type (str): Embedding input type
+            texts (list): Texts to look up
+
+        Returns:
+            list: float32 vector for each hit, None for each miss
+        """
+        keys = [self.key(model, input_type, text) for text in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+                self._conn.commit()
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        metrics.incr("embedding_cache_lookups_total", hits, outcome="hit", input_type=input_type)
+        metrics.incr("embedding_cache_lookups_total", len(keys) - hits, outcome="miss", input_type=input_type)
+        return [np.frombuffer(found[key], dtype=np.float32) if key in found else None
+                for key in keys]
+
+    def put_many(self, model, input_type, texts, vectors):
+        """
+        Store vectors, evicting the least recently used entries if needed
+
+        Args:
+            model (str): Embedding model name
+            input_type (str): Embedding input type
+            texts (list): Embedded texts
+            vectors (list): One embedding vector per text
+        """
+        now = time.time()
+        rows = [(self.key(model, input_type, text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+                for text, vector in zip(texts, vectors)]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._count += self._conn.total_changes - before
+            if self._count > self.max_entries:
+                excess = self._count - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+                )
+                self._count -= excess
+                metrics.incr("embedding_cache_evictions_total", excess)
+            self._conn.commit()
+
+    def stats(self):
+        """
+        Hit/miss counters
+
+        Returns:
+            dict: hits, misses, hit_rate and entries
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": self._count,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,317 @@
+import hashlib
+import json
+import queue
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from metrics import metrics
+from pdf_processor import extract_pages
+from rag_engine import CHUNK_SIZE, fingerprint_page
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+class _Cancelled(Exception):
+    """Raised inside a stage when another stage has failed"""
+
+
+@dataclass
+class StageStats:
+    """Throughput counters of one pipeline stage"""
+    name: str
+    items: int = 0
+    busy_seconds: float = 0.0
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: float = None
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def throughput(self):
+        """Items processed per second of stage wall time"""
+        return self.items / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "elapsed_seconds": round(self.elapsed, 3),
+            "throughput": round(self.throughput, 2),
+        }
+
+
+class IngestionPipeline:
+    """
+    Overlapped extract -> chunk -> embed -> store ingestion for RAGEngine
+
+    Each stage runs in its own thread (the embed stage in several) and
+    hands its output to the next one through a bounded queue. A slow stage,
+    such as a rate-limited embedder, fills the queue in front of it and
+    blocks the stages upstream, so memory stays bounded by the queue sizes.
+    The store stage runs in the calling thread, which is where the progress
+    callback is invoked.
+    """
+    def __init__(self, engine, queue_size=8, embed_workers=None, extract_workers=1, progress=None):
+        """
+        Initialize the pipeline
+
+        Args:
+            engine (RAGEngine): Engine the document is indexed into
+            queue_size (int): Capacity of each queue between stages
+            embed_workers (int): Concurrent embedding calls (defaults to engine.embed_concurrency)
+            extract_workers (int): Processes used for PDF extraction
+            progress (callable): Called with the list of stage stats dicts after each stored batch
+        """
+        self.engine = engine
+        self.queue_size = queue_size
+        self.embed_workers = embed_workers or engine.embed_concurrency
+        self.extract_workers = extract_workers
+        self.progress = progress
+        self.stats = {}
+        self.page_errors = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._errors = []
+        # Fingerprint of the current run, hashed page by page as pages are extracted
+        self._digest = None
+        # Pages extracted before the run started, spooled to disk instead of memory
+        self._spool = None
+
+    def run(self, pdf_path, doc_id=None, title=None):
+        """
+        Index a PDF file
+
+        Args:
+            pdf_path (str): Path to the PDF file
+            doc_id (str): Document id; derived from the extracted text if None
+            title (str): Display name of the document
+
+        Returns:
+            str: Document id
+        """
+        self.stats = {name: StageStats(name) for name in ("extract", "chunk", "embed", "store")}
+        self.page_errors = []
+        self._stop.clear()
+        self._errors = []
+        self._digest = hashlib.sha256()
+
+        # Another session indexing into the same engine goes first; if it was
+        # the same document, the check below then reuses its index
+        with self.engine.indexing_lock, tempfile.TemporaryFile("w+", encoding="utf-8") as spool:
+            if doc_id is None or doc_id in self.engine.documents():
+                # The id, or whether the stored index is reused, depends on the
+                # fingerprint of the extracted text (as in add_document), so the
+                # text is extracted before the other stages start. The pages are
+                # replayed from a temporary file, not held in memory.
+                for page in self._extracted(pdf_path):
+                    fingerprint_page(self._digest, page)
+                    spool.write(json.dumps(page) + "\n")
+                spool.seek(0)
+                self._spool = spool
+                source_hash = self._digest.hexdigest()
+                doc_id = doc_id or source_hash[:16]
+                if self.engine.is_indexed(doc_id, source_hash):
+                    return doc_id
+            try:
+                self._index(pdf_path, doc_id, title)
+            finally:
+                self._spool = None
+        return doc_id
+
+    def _index(self, pdf_path, doc_id, title):
+        """Run the overlapped stages and mark the document as indexed"""
+        pages = queue.Queue(self.queue_size)
+        batches = queue.Queue(self.queue_size)
+        embedded = queue.Queue(self.queue_size)
+
+        threads = [
+            threading.Thread(target=self._guard, args=(self._extract, pdf_path, pages), daemon=True),
+            threading.Thread(target=self._guard, args=(self._chunk, pages, batches), daemon=True),
+        ]
+        embed_done = _Countdown(self.embed_workers, lambda: self._put(embedded, _DONE))
+        threads += [
+            threading.Thread(target=self._guard, args=(self._embed, batches, embedded, embed_done), daemon=True)
+            for _ in range(self.embed_workers)
+        ]
+
+        self.engine.begin_document(doc_id, title)
+        for thread in threads:
+            thread.start()
+        try:
+            self._store(embedded, doc_id, title)
+        except BaseException as e:
+            self._fail(e)
+        for thread in threads:
+            thread.join()
+        if self._errors:
+            self.engine.drop_document(doc_id)
+            raise self._errors[0]
+
+        self.engine.finish_document(doc_id, self._digest.hexdigest())
+        for stage in self.stats.values():
+            # Busy time per stage; the stages overlap, so they add up to more than the run
+            started = time.time() - (time.perf_counter() - stage.started_at)
+            metrics.record("ingest.stage", started, stage.busy_seconds,
+                           {"stage": stage.name}, attrs=stage.as_dict())
+
+    def _guard(self, stage, *args):
+        try:
+            stage(*args)
+        except _Cancelled:
+            pass
+        except BaseException as e:
+            self._fail(e)
+
+    def _fail(self, error):
+        if not isinstance(error, _Cancelled):
+            self._errors.append(error)
+        self._stop.set()
+
+    def _put(self, q, item):
+        # Blocks while the next stage is behind (backpressure), unless the pipeline failed
+        while True:
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._stop.is_set():
+                    raise _Cancelled()
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    raise _Cancelled()
+
+    def _extracted(self, pdf_path):
+        """Pages of the PDF, counted in the extract stage stats"""
+        stats = self.stats["extract"]
+        start = time.perf_counter()
+        for page in extract_pages(pdf_path, workers=self.extract_workers, errors=self.page_errors):
+            stats.items += 1
+            stats.busy_seconds += time.perf_counter() - start
+            yield page
+            start = time.perf_counter()
+        stats.finished_at = time.perf_counter()
+
+    def _extract(self, pdf_path, pages):
+        if self._spool is None:
+            for page in self._extracted(pdf_path):
+                fingerprint_page(self._digest, page)
+                self._put(pages, page)
+        else:
+            for line in self._spool:
+                self._put(pages, json.loads(line))
+        self._put(pages, _DONE)
+
+    def _chunk(self, pages, batches):
+        """
+        Split pages into chunks incrementally
+
+        Pages are accumulated until the buffer holds several chunks' worth of
+        text. Everything but the last chunk is emitted and the last chunk is
+        carried over, so chunks still span page boundaries like a split of
+        the joined document would.
+        """
+        stats = self.stats["chunk"]
+        splitter = self.engine.text_splitter()
+        window = 8 * CHUNK_SIZE
+        batch_size = self.engine.embed_batch_size
+        buffer, pending, seq = "", [], 0
+        while True:
+            page = self._get(pages)
+            start = time.perf_counter()
+            if page is not _DONE:
+                buffer = f"{buffer}\n{page}" if buffer else page
+                if len(buffer) < window:
+                    continue
+            with metrics.span("rag.chunk", stage="pipeline"):
+                chunks = splitter.split_text(buffer)
+            if page is not _DONE and len(chunks) > 1:
+                buffer = chunks.pop()
+            else:
+                buffer = ""
+            pending.extend(chunks)
+            stats.items += len(chunks)
+            stats.busy_seconds += time.perf_counter() - start
+            while len(pending) >= batch_size or (page is _DONE and pending):
+                # Batches are numbered so the store stage can keep chunk order
+                self._put(batches, (seq, pending[:batch_size]))
+                pending = pending[batch_size:]
+                seq += 1
+            if page is _DONE:
+                break
+        stats.finished_at = time.perf_counter()
+        self._put(batches, _DONE)
+
+    def _embed(self, batches, embedded, done):
+        stats = self.stats["embed"]
+        while True:
+            item = self._get(batches)
+            if item is _DONE:
+                # Let the other embed workers see the end marker too
+                self._put(batches, _DONE)
+                break
+            seq, batch = item
+            start = time.perf_counter()
+            embeddings = self.engine.embed_texts(batch)
+            with self._lock:
+                stats.items += len(batch)
+                stats.busy_seconds += time.perf_counter() - start
+            self._put(embedded, (seq, batch, embeddings))
+        done.arrive()
+
+    def _store(self, embedded, doc_id, title):
+        stats = self.stats["store"]
+        next_seq, waiting = 0, {}
+        while True:
+            item = self._get(embedded)
+            if item is _DONE:
+                break
+            # Embed workers may finish out of order; store batches in sequence
+            waiting[item[0]] = item
+            while next_seq in waiting:
+                _, batch, embeddings = waiting.pop(next_seq)
+                start = time.perf_counter()
+                self.engine.store_batch(batch, embeddings, doc_id=doc_id, title=title)
+                stats.items += len(batch)
+                stats.busy_seconds += time.perf_counter() - start
+                next_seq += 1
+                if self.progress:
+                    self.progress(self.report())
+        for stage in self.stats.values():
+            stage.finished_at = stage.finished_at or time.perf_counter()
+        if self.progress:
+            self.progress(self.report())
+
+    def report(self):
+        """
+        Per-stage throughput and progress
+
+        Returns:
+            list: One stats dict per stage, in pipeline order
+        """
+        return [stage.as_dict() for stage in self.stats.values()]
+
+
+class _Countdown:
+    """Runs a callback once every embed worker has finished"""
+    def __init__(self, count, callback):
+        self._count = count
+        self._callback = callback
+        self._lock = threading.Lock()
+
+    def arrive(self):
+        with self._lock:
+            self._count -= 1
+            last = self._count == 0
+        if last:
+            self._callback()
+
@@ -0,0 +1,173 @@
+import json
+import math
+import re
+from array import array
+import numpy as np
+
+# Identifiers such as MEP_206, web-01.prod, /var/log or --force stay whole tokens
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[_.\-/:][a-z0-9]+)*")
+PART_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """
+    Split text into lowercase search terms
+
+    Compound identifiers are emitted both whole and as their parts, so
+    "MEP_206" matches queries for "mep_206" as well as "mep" or "206".
+
+    Args:
+        text (str): Text to tokenize
+
+    Returns:
+        list: Terms, in order of appearance
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        terms.append(token)
+        parts = PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the chunks of a VectorIndex
+
+    Each term maps to a posting list of row numbers and term frequencies
+    stored in compact typed arrays. Rows are appended incrementally as
+    chunks are stored, and queries never leave the process.
+    """
+    def __init__(self, k1=1.2, b=0.75):
+        """
+        Initialize an empty index
+
+        Args:
+            k1 (float): BM25 term-frequency saturation
+            b (float): BM25 length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.doc_lengths = array("I")
+        self.total_length = 0
+        self._norm = None
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, texts):
+        """
+        Index chunks appended to the parent index
+
+        Args:
+            texts (list): Chunk texts, in row order
+        """
+        for text in texts:
+            row = len(self.doc_lengths)
+            terms = tokenize(text)
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = (array("I"), array("H"))
+                posting[0].append(row)
+                posting[1].append(min(count, 65535))
+            self.doc_lengths.append(len(terms))
+            self.total_length += len(terms)
+        self._norm = None
+
+    def search(self, query, k=3):
+        """
+        Rank chunks against a query with BM25
+
+        Args:
+            query (str): Query text
+            k (int): Number of results
+
+        Returns:
+            list: (row, score) tuples, best match first; chunks sharing no term are omitted
+        """
+        n = len(self.doc_lengths)
+        terms = [term for term in set(tokenize(query)) if term in self.postings]
+        if not n or not terms or k <= 0:
+            return []
+
+        if self._norm is None:
+            # Length normalization only changes when chunks are added
+            lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32).astype(np.float32)
+            self._norm = self.k1 * (1 - self.b + self.b * lengths / max(self.total_length / n, 1e-9))
+        norm = self._norm
+        scores = np.zeros(n, dtype=np.float32)
+        for term in terms:
+            rows, tfs = self.postings[term]
+            rows = np.frombuffer(rows, dtype=np.uint32)
+            tfs = np.frombuffer(tfs, dtype=np.uint16).astype(np.float32)
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norm[rows])
+
+        matched = np.flatnonzero(scores)
+        k = min(k, len(matched))
+        best = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        best = best[np.argsort(-scores[best])]
+        return [(int(row), float(scores[row])) for row in best]
+
+    def save(self, path):
+        """
+        Write the index to a file
+
+        Posting lists are concatenated into flat arrays with per-term
+        offsets, and the vocabulary is stored as JSON, so loading never
+        unpickles anything.
+
+        Args:
+            path (str): Destination file
+        """
+        terms = list(self.postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self.postings[term][0]) for term in terms], dtype=np.int64)
+        rows = array("I")
+        tfs = array("H")
+        for term in terms:
+            rows.extend(self.postings[term][0])
+            tfs.extend(self.postings[term][1])
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                params=np.array([self.k1, self.b], dtype=np.float64),
+                vocabulary=np.frombuffer(json.dumps(terms).encode("utf-8"), dtype=np.uint8),
+                offsets=offsets,
+                rows=np.frombuffer(rows, dtype=np.uint32),
+                tfs=np.frombuffer(tfs, dtype=np.uint16),
+                doc_lengths=np.frombuffer(self.doc_lengths, dtype=np.uint32),
+            )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read an index written by save()
+
+        Args:
+            path (str): Source file
+
+        Returns:
+            LexicalIndex: Loaded index
+        """
+        with np.load(path, allow_pickle=False) as state:
+            k1, b = state["params"].tolist()
+            terms = json.loads(state["vocabulary"].tobytes().decode("utf-8"))
+            offsets = state["offsets"].tolist()
+            rows = state["rows"].astype(np.uint32, copy=False)
+            tfs = state["tfs"].astype(np.uint16, copy=False)
+            doc_lengths = state["doc_lengths"].astype(np.uint32, copy=False)
+        index = cls(k1, b)
+        for term, start, stop in zip(terms, offsets, offsets[1:]):
+            posting = index.postings[term] = (array("I"), array("H"))
+            posting[0].frombytes(rows[start:stop].tobytes())
+            posting[1].frombytes(tfs[start:stop].tobytes())
+        index.doc_lengths.frombytes(doc_lengths.tobytes())
+        index.total_length = int(doc_lengths.sum())
+        return index
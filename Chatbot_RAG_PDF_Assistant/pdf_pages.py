@@ -0,0 +1,32 @@
+"""
+Page extraction run in the PDF worker processes
+
+Spawned workers import this module on start, so it imports nothing but
+PyPDF2: no Streamlit, and no metrics exporters.
+"""
+import PyPDF2
+
+
+def extract_range(pdf_path, start, stop, lazy=False):
+    """
+    Extract pages [start, stop) of a PDF file
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        start (int): First page index
+        stop (int): Page index after the last page
+        lazy (bool): Return a generator instead of a list (not picklable)
+        
+    Returns:
+        list: (page_index, text, error) tuples; error is None on success
+    """
+    def pages():
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            for page_num in range(start, stop):
+                try:
+                    yield page_num, pdf_reader.pages[page_num].extract_text(), None
+                except Exception as e:
+                    yield page_num, None, str(e)
+    
+    return pages() if lazy else list(pages())
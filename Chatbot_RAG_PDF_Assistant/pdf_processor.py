@@ -1,36 +1,90 @@
 import PyPDF2
+import multiprocessing
 import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 import streamlit as st
 from streamlit_pdf_viewer import pdf_viewer
+from metrics import metrics
+from pdf_pages import extract_range
 
-def process_pdf(pdf_path):
+# Smallest page range handed to a worker process
+PAGES_PER_TASK = 8
+
+def process_pdf(pdf_path, workers=1, errors=None):
     """
     Extract text content from a PDF file
     
     Args:
         pdf_path (str): Path to the PDF file
+        workers (int): Number of processes used for extraction
+        errors (list): Optional list collecting (page_number, message) for pages that failed
         
     Returns:
         list: List of strings containing the text content of each page
     """
-    try:
-        pdf_content = []
+    return list(extract_pages(pdf_path, workers=workers, errors=errors))
+
+def extract_pages(pdf_path, workers=1, errors=None):
+    """
+    Lazily extract the text of each page of a PDF file, in page order
+    
+    With workers > 1 the page range is split across a process pool; pages
+    are still yielded in order as soon as their range is done. A page that
+    fails to extract is skipped and reported in errors instead of aborting
+    the whole document.
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        workers (int): Number of processes used for extraction
+        errors (list): Optional list collecting (page_number, message) for pages that failed
         
+    Yields:
+        str: Text content of each non-empty page, prefixed with its page number
+    """
+    try:
         with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            
-            # Extract text from each page
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text = page.extract_text()
-                
-                if text:
-                    # Add page number information
-                    pdf_content.append(f"Page {page_num + 1}: {text}")
-        
-        return pdf_content
+            num_pages = len(PyPDF2.PdfReader(file).pages)
     except Exception as e:
         raise Exception(f"Error processing PDF: {str(e)}")
+    
+    executor = None
+    if workers <= 1 or num_pages < 2 * PAGES_PER_TASK:
+        results = [extract_range(pdf_path, 0, num_pages, lazy=True)]
+    else:
+        # Several small ranges per worker keep the pool balanced
+        step = max(PAGES_PER_TASK, -(-num_pages // (workers * 4)))
+        starts = list(range(0, num_pages, step))
+        stops = [min(start + step, num_pages) for start in starts]
+        # Spawned, not forked: the Streamlit server is multi-threaded, and a
+        # forked child may inherit locks held by its other threads. Workers
+        # only import pdf_pages, which has no Streamlit or metrics imports.
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        results = executor.map(extract_range, [pdf_path] * len(starts), starts, stops)
+    
+    # Extraction time, excluding the time the consumer holds each page
+    started, busy, failed = time.time(), 0.0, 0
+    resumed = time.perf_counter()
+    try:
+        for pages in results:
+            for page_num, text, error in pages:
+                if error is not None:
+                    failed += 1
+                    if errors is not None:
+                        errors.append((page_num + 1, error))
+                elif text:
+                    busy += time.perf_counter() - resumed
+                    resumed = None
+                    # Add page number information
+                    yield f"Page {page_num + 1}: {text}"
+                    resumed = time.perf_counter()
+    finally:
+        if resumed is not None:
+            busy += time.perf_counter() - resumed
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        metrics.record("pdf.extract", started, busy, {"mode": "pool" if executor else "serial"},
+                       attrs={"pages": num_pages, "failed_pages": failed, "workers": workers})
 
 def display_pdf(pdf_path):
     """
@@ -1,48 +1,492 @@
+import contextvars
+import datetime
+import hashlib
+import json
 import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import cohere
 import groq
+import httpx
 import numpy as np
+from cohere.core.api_error import ApiError as CohereApiError
 from pymongo import MongoClient
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
+from metrics import metrics
+from context_packing import build_context
+from embedding_cache import EmbeddingCache
+from vector_index import DTYPES, PersistentVectorIndex, VectorIndex, dequantize, normalize, quantize
+
+# Cohere accepts at most 96 texts per embed call
+EMBED_BATCH_SIZE = 96
+EMBED_MODEL = "embed-english-v3.0"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+
+# Reciprocal rank fusion constant and minimum candidates taken from each ranking
+RRF_K = 60
+RRF_CANDIDATES = 20
+
+# Seconds the query embedding may take before retrieval goes on with the
+# lexical ranking alone, and the embedding service failures that do the same
+QUERY_EMBED_TIMEOUT = 5.0
+EMBED_ERRORS = (FutureTimeoutError, TimeoutError, ConnectionError, httpx.HTTPError, CohereApiError)
+
+# Chunks considered for the prompt, and the estimated tokens of context they
+# may use (about the size of the three full chunks sent previously)
+CONTEXT_CANDIDATES = 12
+CONTEXT_TOKEN_BUDGET = 750
+
+DEFAULT_TENANT = "default"
+DEFAULT_DOC_ID = "default"
+DEFAULT_DOC_TTL = 7 * 24 * 3600  # Evict documents unused for a week
+
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+
+def _datetime(timestamp):
+    """UTC datetime of a timestamp, as MongoDB stores dates"""
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+def _timestamp(value):
+    """Timestamp of a date read from MongoDB (naive datetimes are UTC)"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.timestamp()
+
+def _check_name(value, field):
+    """Tenant and document ids are used as directory names, so keep them path-safe"""
+    if not _NAME_PATTERN.match(value) or value in (".", ".."):
+        raise ValueError(f"Invalid {field}: {value!r}")
+    return value
+
+def reciprocal_rank_fusion(rankings, k):
+    """
+    Merge rankings whose scores are not comparable with reciprocal rank fusion
+    
+    Args:
+        rankings (list): Lists of (score, doc_id, row) hits, each sorted here best first
+        k (int): Number of hits to return
+        
+    Returns:
+        list: (doc_id, row, fused score) hits, best first
+    """
+    fused = {}
+    for hits in rankings:
+        hits = sorted(hits, key=lambda hit: hit[0], reverse=True)
+        for rank, (_, doc_id, row) in enumerate(hits):
+            fused[(doc_id, row)] = fused.get((doc_id, row), 0.0) + 1.0 / (RRF_K + rank + 1)
+    best = sorted(fused, key=fused.get, reverse=True)[:k]
+    return [(doc_id, row, fused[(doc_id, row)]) for doc_id, row in best]
+
+def fingerprint_page(digest, page):
+    """
+    Add one page to a document fingerprint (see RAGEngine.fingerprint)
+    
+    Args:
+        digest: hashlib.sha256() object accumulating the pages in order
+        page (str): Text content of the page
+    """
+    digest.update(page.encode("utf-8"))
+    digest.update(b"\0")
 
 class RAGEngine:
-    def __init__(self, pdf_content, groq_api_key, cohere_api_key):
+    def __init__(self, pdf_content, groq_api_key, cohere_api_key,
+                 embed_batch_size=EMBED_BATCH_SIZE, embed_concurrency=4,
+                 groq_client=None, cohere_client=None, collection=None,
+                 index_dir=None, embedding_cache=None,
+                 tenant=DEFAULT_TENANT, doc_ttl=DEFAULT_DOC_TTL, ann_params=None,
+                 vector_dtype=None, llm=None, query_embed_timeout=QUERY_EMBED_TIMEOUT):
         """
         Initialize the RAG engine
         
         Args:
-            pdf_content (list): List of strings containing the text content of each page
+            pdf_content (list): List of strings containing the text content of each page,
+                or None to serve the documents already indexed for this tenant
             groq_api_key (str): Groq API key
             cohere_api_key (str): Cohere API key
+            embed_batch_size (int): Number of chunks sent per embedding call
+            embed_concurrency (int): Maximum number of embedding calls in flight
+            groq_client: Optional pre-built Groq client (e.g. a local stub)
+            cohere_client: Optional pre-built Cohere client (e.g. a local stub)
+            collection: Optional pre-built document collection used instead of MongoDB
+            index_dir (str): Directory of the persistent memory-mapped indexes
+                (defaults to $RAG_INDEX_DIR). When set, MongoDB is optional.
+            embedding_cache (EmbeddingCache): Optional persistent embedding cache
+                (defaults to one at $RAG_EMBED_CACHE when that is set)
+            tenant (str): Tenant or session the indexed documents belong to
+            doc_ttl (int): Seconds after which an unused document is evicted (None keeps forever)
+            ann_params (dict): IVF parameters (nlist, nprobe, ...) enabling approximate
+                search for large documents; exact search is used otherwise. An empty
+                dict derives nlist from each document's size (see ann_index.IVFIndex).
+            vector_dtype (str): Embedding storage type, "float32", "float16" or "int8"
+                (defaults to $RAG_VECTOR_DTYPE, else float32). Quantized types are also
+                stored in MongoDB as compact binary instead of lists of doubles.
+            llm: Optional LLM provider exposing stream(messages, **options) (see
+                llm_providers.py at the repository root), used to generate answers
+                instead of the Groq client
+            query_embed_timeout (float): Seconds to wait for the query embedding before
+                answering from the lexical ranking alone
         """
         # Set API keys
         self.groq_api_key = groq_api_key
         self.cohere_api_key = cohere_api_key
         
         # Initialize clients
-        self.groq_client = groq.Groq(api_key=groq_api_key)
-        self.cohere_client = cohere.Client(api_key=cohere_api_key)
+        self.groq_client = groq_client or groq.Groq(api_key=groq_api_key)
+        self.cohere_client = cohere_client or cohere.Client(api_key=cohere_api_key)
+        self.llm = llm
+        
+        self.tenant = _check_name(tenant, "tenant")
+        self.doc_ttl = doc_ttl
+        self.ann_params = ann_params
+        self.vector_dtype = vector_dtype or os.environ.get("RAG_VECTOR_DTYPE", "float32")
         
-        # MongoDB connection
+        self.db_name = "pdf_chat_db"
+        self.collection_name = "document_embeddings"
+        index_dir = index_dir or os.environ.get("RAG_INDEX_DIR")
         mongodb_uri = os.environ.get("MONGODB_URI")
-        if not mongodb_uri:
+        if collection is not None:
+            self.mongodb_client = None
+            self.collection = collection
+        elif mongodb_uri:
+            # MongoDB connection
+            self.mongodb_client = MongoClient(mongodb_uri)
+            self.db = self.mongodb_client[self.db_name]
+            self.collection = self.db[self.collection_name]
+        elif index_dir:
+            # The on-disk indexes are the only copy of the embeddings
+            self.mongodb_client = None
+            self.collection = None
+        else:
             raise ValueError("MONGODB_URI environment variable is not set")
+        if self.collection is not None:
+            self._ensure_collection_indexes()
+        
+        self.embedding_dim = 1024  # Default embedding dimension for Cohere
+        self.embed_batch_size = max(1, min(embed_batch_size, EMBED_BATCH_SIZE))
+        self.embed_concurrency = max(1, embed_concurrency)
+        self.query_embed_timeout = query_embed_timeout
+        # Query embeddings run here so retrieval can stop waiting for them
+        self._query_executor = ThreadPoolExecutor(max_workers=self.embed_concurrency,
+                                                  thread_name_prefix="rag-query-embed")
+        
+        cache_path = os.environ.get("RAG_EMBED_CACHE")
+        if embedding_cache is None and cache_path:
+            embedding_cache = EmbeddingCache(cache_path)
+        self.embedding_cache = embedding_cache
+        
+        # One vector index per document of this tenant, keyed by document id
+        self.index_dir = os.path.join(index_dir, self.tenant) if index_dir else None
+        self.indexes = {}
+        self._last_used = {}
+        # Sessions share one engine per tenant (see app.py). The lock guards the
+        # indexes and their files during each write; indexing_lock is held while
+        # a whole document is indexed, so two sessions never index at once and
+        # the second one reuses the first one's index.
+        self.lock = threading.RLock()
+        self.indexing_lock = threading.RLock()
+        self._load_indexes()
+        self.evict_expired()
+        
+        if pdf_content is not None:
+            self.add_document(pdf_content)
+    
+    def _ensure_collection_indexes(self):
+        """
+        Create the secondary and TTL indexes used to scope and expire chunks
+        """
+        self.collection.create_index([("tenant", 1), ("doc_id", 1), ("id", 1)])
+        # Chunks used to expire from their creation; like the on-disk indexes,
+        # they now expire doc_ttl seconds after their document was last used
+        if "created_at_1" in self.collection.index_information():
+            self.collection.drop_index("created_at_1")
+        if self.doc_ttl:
+            # Chunks written before last_used existed start counting now
+            self.collection.update_many({"last_used": {"$exists": False}}, {"$currentDate": {"last_used": True}})
+            self.collection.create_index("last_used", expireAfterSeconds=int(self.doc_ttl))
+    
+    def _new_index(self, doc_id):
+        if self.index_dir:
+            # Memory-mapped index; opening it only reads its metadata
+            return PersistentVectorIndex(os.path.join(self.index_dir, doc_id), self.embedding_dim,
+                                         ann_params=self.ann_params, dtype=self.vector_dtype)
+        # In-memory embedding matrix, kept in sync on insert
+        return VectorIndex(self.embedding_dim, ann_params=self.ann_params, dtype=self.vector_dtype)
+    
+    def _load_indexes(self):
+        """
+        Open the documents already indexed for this tenant
+        """
+        if self.index_dir:
+            if not os.path.isdir(self.index_dir):
+                return
+            for doc_id in sorted(os.listdir(self.index_dir)):
+                path = os.path.join(self.index_dir, doc_id)
+                if os.path.isfile(os.path.join(path, PersistentVectorIndex.META_FILE)):
+                    self.indexes[doc_id] = PersistentVectorIndex(path, ann_params=self.ann_params)
+            return
+        
+        # Load the embeddings present in the collection into in-memory indexes
+        grouped = {}
+        projection = {"content": 1, "dtype": 1, "embedding": 1, "scale": 1, "id": 1, "doc_id": 1, "title": 1,
+                      "last_used": 1, "source_hash": 1}
+        with metrics.span("mongo.read", op="load_indexes") as span:
+            for doc in self.collection.find({"tenant": self.tenant}, projection):
+                entry = grouped.setdefault(doc["doc_id"], ([], [], [], doc.get("title"), doc.get("last_used"), set()))
+                entry[0].append(doc["id"])
+                entry[1].append(doc["content"])
+                entry[2].append(self._decode_embedding(doc))
+                entry[5].add(doc.get("source_hash"))
+            span.set(documents=len(grouped))
+        for doc_id, (ids, contents, embeddings, title, last_used, source_hashes) in grouped.items():
+            index = self._new_index(doc_id)
+            index.add(ids, contents, embeddings)
+            index.update_meta(title=title)
+            if len(source_hashes) == 1 and None not in source_hashes:
+                # Every chunk was marked complete by finish_document
+                index.update_meta(source_hash=source_hashes.pop())
+            if last_used is not None:
+                index.update_meta(last_used=_timestamp(last_used))
+            self.indexes[doc_id] = index
+    
+    def documents(self):
+        """
+        List the documents indexed for this tenant
+        
+        Returns:
+            dict: Document id -> title
+        """
+        with self.lock:
+            return {doc_id: index.meta.get("title") or doc_id for doc_id, index in self.indexes.items()}
+    
+    def add_document(self, pdf_content, doc_id=None, title=None):
+        """
+        Index a document for this tenant, replacing any previous version with the same id
+        
+        Args:
+            pdf_content (list): List of strings containing the text content of each page
+            doc_id (str): Document id; derived from the content if None
+            title (str): Display name of the document
             
-        self.mongodb_client = MongoClient(mongodb_uri)
-        self.db_name = "pdf_chat_db"
-        self.collection_name = "document_embeddings"
-        self.db = self.mongodb_client[self.db_name]
-        self.collection = self.db[self.collection_name]
+        Returns:
+            str: Document id
+        """
+        source_hash = self.fingerprint(pdf_content)
+        doc_id = _check_name(doc_id or source_hash[:16], "doc_id")
+        
+        with self.indexing_lock:
+            if self.is_indexed(doc_id, source_hash):
+                # Same document already indexed: no embedding calls needed
+                return doc_id
+            
+            self.begin_document(doc_id, title)
+            
+            # Process and store documents
+            documents = self._process_documents(pdf_content)
+            self.store_documents(documents, doc_id=doc_id, title=title)
+            
+            self.finish_document(doc_id, source_hash)
+        return doc_id
+    
+    def is_indexed(self, doc_id, source_hash):
+        """
+        Check whether a document is already indexed from the same source
         
-        # Clear existing documents in the collection for this session
-        self.collection.delete_many({})
+        With MongoDB configured, its chunks must still be there and carry the
+        same fingerprint: they expire on their own and may have been replaced
+        by another process, independently of the local index.
         
-        self.embedding_dim = 1024  # Default embedding dimension for Cohere
+        Args:
+            doc_id (str): Document id
+            source_hash (str): Fingerprint of the document source
+            
+        Returns:
+            bool: True if the stored index can be reused as is
+        """
+        index = self.indexes.get(doc_id)
+        if index is None or not len(index) or index.meta.get("source_hash") != source_hash:
+            return False
+        if self.collection is not None:
+            with metrics.span("mongo.read", op="is_indexed"):
+                stored = self.collection.find_one(
+                    {"tenant": self.tenant, "doc_id": doc_id, "source_hash": source_hash}, {"_id": 1}
+                )
+            if stored is None:
+                return False
+        self._touch(doc_id)
+        return True
+    
+    def begin_document(self, doc_id, title=None):
+        """
+        Start (re-)indexing a document, dropping any previous version
+        
+        Args:
+            doc_id (str): Document id
+            title (str): Display name of the document
+        """
+        with self.lock:
+            self.drop_document(doc_id)
+            index = self.indexes[doc_id] = self._new_index(doc_id)
+            index.update_meta(model=EMBED_MODEL, title=title or doc_id)
+    
+    def finish_document(self, doc_id, source_hash):
+        """
+        Mark a document as completely indexed
+        
+        Args:
+            doc_id (str): Document id
+            source_hash (str): Fingerprint of the document source
+        """
+        with self.lock:
+            # Recorded last so an interrupted indexing run is redone on restart
+            self.indexes[doc_id].flush()
+            if self.collection is not None:
+                with metrics.span("mongo.write", op="finish_document"):
+                    self.collection.update_many(
+                        {"tenant": self.tenant, "doc_id": doc_id},
+                        {"$set": {"source_hash": source_hash}}
+                    )
+            self.indexes[doc_id].update_meta(source_hash=source_hash)
+            self._touch(doc_id)
+            self.evict_expired()
+    
+    def drop_document(self, doc_id):
+        """
+        Remove a document from the indexes and the collection
+        
+        Args:
+            doc_id (str): Document id
+        """
+        with self.lock:
+            self.indexes.pop(doc_id, None)
+            self._last_used.pop(doc_id, None)
+            if self.collection is not None:
+                self.collection.delete_many({"tenant": self.tenant, "doc_id": doc_id})
+            if self.index_dir:
+                shutil.rmtree(os.path.join(self.index_dir, doc_id), ignore_errors=True)
+    
+    def _touch(self, doc_id):
+        now = time.time()
+        with self.lock:
+            index = self.indexes.get(doc_id)
+            if index is None:
+                return  # Dropped by another session meanwhile
+            self._last_used[doc_id] = now
+            # Persist at most once a minute so queries do not rewrite the sidecar
+            # or the document's chunks
+            if now - index.meta.get("last_used", 0) > 60:
+                index.update_meta(last_used=now)
+                if self.collection is not None:
+                    self.collection.update_many(
+                        {"tenant": self.tenant, "doc_id": doc_id},
+                        {"$set": {"last_used": _datetime(now)}}
+                    )
+    
+    def evict_expired(self, now=None):
+        """
+        Drop documents that have not been used for doc_ttl seconds
+        
+        Documents of this tenant are dropped from every store; on-disk
+        indexes of the other tenants are swept too, since no engine may be
+        open for them. MongoDB expires chunks by itself with the same rule
+        (a TTL index on last_used).
+        
+        Args:
+            now (float): Current time; defaults to time.time()
+            
+        Returns:
+            list: Evicted document ids
+        """
+        if not self.doc_ttl:
+            return []
+        now = now or time.time()
+        with self.lock:
+            expired = [
+                doc_id for doc_id, index in self.indexes.items()
+                if now - self._last_used.get(doc_id, index.meta.get("last_used", now)) > self.doc_ttl
+            ]
+            for doc_id in expired:
+                self.drop_document(doc_id)
+            if self.index_dir:
+                self._sweep_tenants(now)
+        return expired
+    
+    def _sweep_tenants(self, now):
+        """
+        Remove the expired on-disk indexes of the other tenants, and their empty directories
+        
+        Args:
+            now (float): Current time
+        """
+        root = os.path.dirname(self.index_dir)
+        if not os.path.isdir(root):
+            return  # Nothing indexed on disk yet
+        for tenant in os.listdir(root):
+            tenant_dir = os.path.join(root, tenant)
+            if tenant == self.tenant or not os.path.isdir(tenant_dir):
+                continue
+            for doc_id in os.listdir(tenant_dir):
+                meta_path = os.path.join(tenant_dir, doc_id, PersistentVectorIndex.META_FILE)
+                try:
+                    with open(meta_path, "r", encoding="utf-8") as f:
+                        last_used = json.load(f).get("last_used")
+                    # Indexes never queried count from their last write
+                    last_used = last_used or os.path.getmtime(meta_path)
+                except (OSError, ValueError):
+                    continue
+                if now - last_used > self.doc_ttl:
+                    shutil.rmtree(os.path.join(tenant_dir, doc_id), ignore_errors=True)
+            try:
+                os.rmdir(tenant_dir)
+            except OSError:
+                pass  # Not empty
+    
+    def close(self):
+        """
+        Release the engine's threads and its own MongoDB client (shared clients are left open)
+        """
+        self._query_executor.shutdown(wait=False, cancel_futures=True)
+        if self.mongodb_client is not None:
+            self.mongodb_client.close()
+    
+    @staticmethod
+    def fingerprint(pdf_content):
+        """
+        Fingerprint the extracted PDF text
+        
+        The source hash and default document id of every indexing path
+        (add_document and IngestionPipeline), so a document is recognized
+        whichever path indexed it.
         
-        # Process and store documents
-        documents = self._process_documents(pdf_content)
-        self.store_documents(documents)
+        Args:
+            pdf_content (list): List of strings containing the text content of each page
+            
+        Returns:
+            str: SHA-256 hex digest
+        """
+        digest = hashlib.sha256()
+        for page in pdf_content:
+            fingerprint_page(digest, page)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def text_splitter():
+        """
+        Text splitter used to cut documents into chunks
+        
+        Returns:
+            RecursiveCharacterTextSplitter: Configured splitter
+        """
+        return RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            separators=["\n\n", "\n", ".", " ", ""],
+            length_function=len
+        )
     
     def _process_documents(self, pdf_content):
         """
@@ -58,131 +502,283 @@ class RAGEngine:
         full_text = "\n".join(pdf_content)
         
         # Split the text into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=100,
-            separators=["\n\n", "\n", ".", " ", ""],
-            length_function=len
-        )
-        
-        # Create document chunks
-        chunks = text_splitter.split_text(full_text)
+        with metrics.span("rag.chunk", stage="document") as span:
+            chunks = self.text_splitter().split_text(full_text)
+            span.set(chars=len(full_text), chunks=len(chunks))
         
         # Convert to Document objects
         documents = [Document(page_content=chunk) for chunk in chunks]
         
         return documents
     
-    def _generate_embeddings(self, text):
+    def _generate_embeddings(self, text, input_type="search_query"):
         """
         Generate embeddings for text using Cohere
         
         Args:
             text (str): Text to generate embeddings for
+            input_type (str): Cohere input type ("search_query" or "search_document")
             
         Returns:
             list: Embedding vector
         """
-        response = self.cohere_client.embed(
-            texts=[text],
-            model="embed-english-v3.0",
-            input_type="search_query"
-        )
-        
-        return response.embeddings[0]
+        return self.embed_texts([text], input_type)[0]
     
-    def store_documents(self, documents):
+    def embed_texts(self, texts, input_type="search_document"):
         """
-        Store documents with embeddings in our MongoDB document store
+        Embed texts, serving repeated ones from the embedding cache
         
         Args:
-            documents (list): List of Document objects
-        """
-        # Process each document
-        for i, doc in enumerate(documents):
-            # Generate embeddings
-            embedding = self._generate_embeddings(doc.page_content)
+            texts (list): Texts to generate embeddings for (at most EMBED_BATCH_SIZE)
+            input_type (str): Cohere input type ("search_query" or "search_document")
             
-            # Store document with embedding in MongoDB collection
-            self.collection.insert_one({
-                "content": doc.page_content,
-                "embedding": embedding,
-                "id": i
-            })
+        Returns:
+            list: Embedding vectors, in the same order as texts
+        """
+        if self.embedding_cache is None:
+            return self._generate_embeddings_batch(texts, input_type)
+        
+        with metrics.span("rag.embed_cache", op="get") as span:
+            embeddings = self.embedding_cache.get_many(EMBED_MODEL, input_type, texts)
+            missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+            span.set(texts=len(texts), misses=len(missing))
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            generated = self._generate_embeddings_batch(missing_texts, input_type)
+            self.embedding_cache.put_many(EMBED_MODEL, input_type, missing_texts, generated)
+            for i, embedding in zip(missing, generated):
+                embeddings[i] = embedding
+        return embeddings
     
-    def _get_relevant_documents(self, question, k=3):
+    def _generate_embeddings_batch(self, texts, input_type="search_document"):
         """
-        Get relevant documents for a question using vector similarity
+        Generate embeddings for several texts in a single Cohere call
         
         Args:
-            question (str): Question to find relevant documents for
-            k (int): Number of documents to return
+            texts (list): Texts to generate embeddings for (at most EMBED_BATCH_SIZE)
+            input_type (str): Cohere input type ("search_query" or "search_document")
             
         Returns:
-            list: List of relevant document texts
+            list: Embedding vectors, in the same order as texts
+        """
+        with metrics.span("rag.embed", input_type=input_type) as span:
+            response = self.cohere_client.embed(
+                texts=texts,
+                model=EMBED_MODEL,
+                input_type=input_type
+            )
+            span.set(texts=len(texts))
+        
+        return response.embeddings
+    
+    def store_documents(self, documents, doc_id=DEFAULT_DOC_ID, title=None):
         """
-        # Generate embedding for the question
-        question_embedding = self._generate_embeddings(question)
+        Store documents with embeddings in the vector index (and MongoDB if configured)
         
-        # Find similar documents
-        similar_docs = []
+        Chunks are embedded in batches of embed_batch_size with up to
+        embed_concurrency calls in flight, and each batch is written with
+        a single insert_many.
         
-        # Get all documents from MongoDB
-        all_docs = list(self.collection.find({}))
+        Args:
+            documents (list): List of Document objects
+            doc_id (str): Document the chunks belong to
+            title (str): Display name of the document
+        """
+        if doc_id not in self.indexes:
+            self.begin_document(doc_id, title)
+        
+        texts = [doc.page_content for doc in documents]
+        batches = [texts[i:i + self.embed_batch_size]
+                   for i in range(0, len(texts), self.embed_batch_size)]
+        if not batches:
+            return
+        
+        with ThreadPoolExecutor(max_workers=self.embed_concurrency) as executor:
+            # map() yields results in submission order, so ids stay aligned
+            embedded = executor.map(self.embed_texts, batches)
+            for batch, embeddings in zip(batches, embedded):
+                self.store_batch(batch, embeddings, doc_id=doc_id, title=title)
+    
+    def store_batch(self, texts, embeddings, doc_id=DEFAULT_DOC_ID, title=None):
+        """
+        Append one batch of embedded chunks to a document with a single insert_many
+        
+        Args:
+            texts (list): Chunk texts
+            embeddings (list): Embedding vector of each chunk
+            doc_id (str): Document the chunks belong to
+            title (str): Display name of the document
+        """
+        with self.lock:
+            if doc_id not in self.indexes:
+                self.begin_document(doc_id, title)
+            index = self.indexes[doc_id]
+            ids = list(range(len(index), len(index) + len(texts)))
+            if self.collection is not None:
+                created_at = datetime.datetime.now(datetime.timezone.utc)
+                with metrics.span("mongo.write", op="insert_many") as span:
+                    span.set(documents=len(texts))
+                    self.collection.insert_many([
+                        {
+                            "tenant": self.tenant,
+                            "doc_id": doc_id,
+                            "title": title,
+                            "id": chunk_id,
+                            "content": content,
+                            "created_at": created_at,
+                            "last_used": created_at,
+                            **self._encode_embedding(embedding),
+                        }
+                        for chunk_id, content, embedding in zip(ids, texts, embeddings)
+                    ])
+            with metrics.span("rag.index_add"):
+                index.add(ids, texts, embeddings)
+    
+    def _encode_embedding(self, embedding):
+        """
+        MongoDB fields holding one embedding in the configured storage type
         
-        # Calculate similarity scores
-        for doc in all_docs:
-            content = doc["content"]
-            embedding = doc["embedding"]
+        Args:
+            embedding (list): Embedding vector
             
-            # Calculate similarity
-            similarity = self._calculate_similarity(question_embedding, embedding)
+        Returns:
+            dict: "embedding" as a list of doubles (float32) or packed binary plus
+                its "dtype" and, for int8, its "scale"
+        """
+        if self.vector_dtype == "float32":
+            return {"embedding": list(map(float, embedding))}
+        stored, scales = quantize(normalize([embedding]), self.vector_dtype)
+        fields = {"embedding": stored.tobytes(), "dtype": self.vector_dtype}
+        if scales is not None:
+            fields["scale"] = float(scales[0])
+        return fields
+    
+    @staticmethod
+    def _decode_embedding(doc):
+        """
+        Embedding vector of a stored chunk, whichever storage type it was written with
+        
+        Args:
+            doc (dict): MongoDB document
             
-            similar_docs.append((content, similarity))
+        Returns:
+            np.ndarray or list: Embedding vector
+        """
+        embedding = doc["embedding"]
+        if not isinstance(embedding, bytes):
+            return embedding
+        stored = np.frombuffer(embedding, dtype=DTYPES[doc.get("dtype", "float32")])
+        scale = doc.get("scale")
+        return dequantize(stored[None, :], None if scale is None else [scale])[0]
+    
+    def _retrieve(self, question, k=3, doc_ids=None):
+        """
+        Rank chunks for a question using hybrid lexical + vector search
         
-        # Sort by similarity (highest first)
-        similar_docs.sort(key=lambda x: x[1], reverse=True)
+        Vector similarity and BM25 rankings are merged with reciprocal rank
+        fusion. If the embedder fails or takes longer than query_embed_timeout,
+        the lexical ranking is used on its own.
         
-        # Return top k document texts
-        return [doc[0] for doc in similar_docs[:k]]
+        Args:
+            question (str): Question to find relevant chunks for
+            k (int): Number of chunks to return
+            doc_ids (list): Restrict the search to these documents (all documents if None)
+            
+        Returns:
+            tuple: ((doc_id, row, fused score) hits best first, question embedding or None)
+        """
+        with self.lock:
+            # Snapshot: another session may add or drop documents meanwhile
+            selected = dict(self.indexes) if doc_ids is None else {
+                doc_id: self.indexes[doc_id] for doc_id in doc_ids if doc_id in self.indexes
+            }
+        if not selected:
+            return [], None
+        for doc_id in selected:
+            self._touch(doc_id)
+        candidates = max(k * 4, RRF_CANDIDATES)
+        
+        # Lexical ranking: exact identifiers, no network call
+        lexical_hits = []
+        with metrics.span("rag.score", method="lexical"):
+            for doc_id, index in selected.items():
+                lexical_hits.extend((score, doc_id, row) for row, score in index.lexical.search(question, candidates))
+        
+        # Vector ranking: score every chunk of each selected document at once
+        vector_hits = []
+        question_embedding = None
+        # In the caller's context, so the embed span stays in this query's trace
+        future = self._query_executor.submit(contextvars.copy_context().run, self._generate_embeddings, question)
+        try:
+            question_embedding = future.result(timeout=self.query_embed_timeout)
+        except EMBED_ERRORS as e:
+            future.cancel()
+            if not lexical_hits:
+                raise
+            metrics.incr("rag_lexical_fallback_total", reason=type(e).__name__)
+        else:
+            with metrics.span("rag.score", method="vector") as span:
+                for doc_id, index in selected.items():
+                    vector_hits.extend((score, doc_id, row) for row, score in index.search(question_embedding, candidates))
+                span.set(documents=len(selected), chunks=sum(len(index) for index in selected.values()))
+        
+        with metrics.span("rag.score", method="fusion"):
+            hits = reciprocal_rank_fusion((vector_hits, lexical_hits), k)
+        
+        return hits, question_embedding
     
-    def _calculate_similarity(self, vec1, vec2):
+    def _get_relevant_documents(self, question, k=3, doc_ids=None):
         """
-        Calculate cosine similarity between two vectors
+        Get relevant documents for a question using hybrid lexical + vector search
         
         Args:
-            vec1 (list): First vector
-            vec2 (list): Second vector
+            question (str): Question to find relevant documents for
+            k (int): Number of documents to return
+            doc_ids (list): Restrict the search to these documents (all documents if None)
             
         Returns:
-            float: Cosine similarity score
+            list: List of relevant document texts
         """
-        vec1 = np.array(vec1)
-        vec2 = np.array(vec2)
-        
-        # Calculate cosine similarity
-        dot_product = np.dot(vec1, vec2)
-        norm_vec1 = np.linalg.norm(vec1)
-        norm_vec2 = np.linalg.norm(vec2)
+        hits, _ = self._retrieve(question, k, doc_ids)
+        return [self.indexes[doc_id].content(row) for doc_id, row, _ in hits]
+    
+    def _build_context(self, question, doc_ids=None, token_budget=CONTEXT_TOKEN_BUDGET):
+        """
+        Assemble the prompt context for a question within a token budget
         
-        # Avoid division by zero
-        if norm_vec1 == 0 or norm_vec2 == 0:
-            return 0
+        More candidates than fit are retrieved; neighbouring chunks are merged
+        without their overlap, duplicates dropped, and the rest diversified
+        with maximal marginal relevance before packing to the budget.
         
-        return dot_product / (norm_vec1 * norm_vec2)
+        Args:
+            question (str): Question to answer
+            doc_ids (list): Restrict retrieval to these documents (all documents if None)
+            token_budget (int): Maximum estimated tokens of context
+            
+        Returns:
+            list: Passage texts, most useful first
+        """
+        with metrics.span("rag.retrieve"):
+            hits, question_embedding = self._retrieve(question, CONTEXT_CANDIDATES, doc_ids)
+        with metrics.span("rag.pack_context"):
+            return build_context(hits, self.indexes, token_budget,
+                                 query_vector=question_embedding,
+                                 max_overlap=2 * CHUNK_OVERLAP)
     
-    def query(self, question):
+    def query(self, question, doc_ids=None, token_budget=CONTEXT_TOKEN_BUDGET):
         """
         Query the RAG engine
         
         Args:
             question (str): Question to ask
+            doc_ids (list): Restrict retrieval to these documents (all documents if None)
+            token_budget (int): Maximum estimated tokens of retrieved context in the prompt
             
         Returns:
-            generator: Stream of response tokens
+            generator: Stream of response text tokens
         """
-        # Get relevant documents
-        relevant_docs = self._get_relevant_documents(question)
+        # Get relevant passages, packed to the token budget
+        relevant_docs = self._build_context(question, doc_ids, token_budget)
         
         # Combine relevant documents with the question
         context = "\n\n".join(relevant_docs)
@@ -199,17 +795,24 @@ class RAGEngine:
         
         Answer:"""
         
-        # Generate streaming response using Groq
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+        
+        # Generate streaming response with the provider (deadline, retries, metrics)
+        if self.llm is not None:
+            return self.llm.stream(messages, temperature=0.5, max_tokens=1024, top_p=1)
+        
+        # Or directly with the Groq client
         stream = self.groq_client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
+            messages=messages,
             model="llama-3.1-8b-instant",
             temperature=0.5,
             max_tokens=1024,
             top_p=1,
             stream=True
         )
-        
-        return stream
+        tokens = (chunk.choices[0].delta.content for chunk in stream
+                  if chunk.choices and chunk.choices[0].delta.content)
+        return metrics.timed_stream(tokens, "groq", "llama-3.1-8b-instant")
@@ -0,0 +1,529 @@
+import json
+import os
+import numpy as np
+from ann_index import IVFIndex
+from lexical_index import LexicalIndex
+
+
+def normalize(vectors):
+    """
+    L2-normalize a vector or a matrix of row vectors as float32
+
+    Args:
+        vectors (array-like): Vector of shape (dim,) or matrix of shape (n, dim)
+
+    Returns:
+        np.ndarray: Normalized float32 copy; zero vectors stay zero
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# Storage types for the embedding matrix
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+# Rows converted to float32 at a time when scoring a quantized matrix: a
+# reused buffer of a few MiB stays in cache, unlike a fresh 64 MiB copy
+_SCORE_BLOCK = 512
+
+# float16 rows are widened with integer ops: numpy's float16 -> float32 cast is
+# several times slower than the matrix product. A half's bits, sign-extended to
+# int32 and shifted left by 13, hold its exponent and mantissa where float32
+# keeps them; clearing bits 28-30 leaves the sign and a float32 equal to the
+# half times 2**-112 (exactly, subnormals and zero included).
+_HALF_MASK = np.int32(-0x70000001)  # 0x8fffffff
+_HALF_SCALE = np.float32(2.0 ** 112)
+
+
+def quantize(rows, dtype):
+    """
+    Convert normalized float32 rows to a storage type
+
+    int8 uses symmetric per-row scalar quantization: each row is scaled so
+    its largest component maps to 127, and the scale is kept alongside.
+
+    Args:
+        rows (np.ndarray): Normalized float32 rows
+        dtype (str): One of DTYPES
+
+    Returns:
+        tuple: (stored rows, float32 per-row scales or None)
+    """
+    if dtype == "int8":
+        peak = np.abs(rows).max(axis=1)
+        peak[peak == 0] = 1.0
+        stored = np.round(rows / peak[:, None] * 127).astype(np.int8)
+        return stored, (peak / 127).astype(np.float32)
+    return rows.astype(DTYPES[dtype]), None
+
+
+def dequantize(stored, scales=None):
+    """
+    Convert stored rows back to float32
+
+    Args:
+        stored (np.ndarray): Rows in their storage type
+        scales (np.ndarray): Per-row scales of int8 rows
+
+    Returns:
+        np.ndarray: float32 rows
+    """
+    rows = np.asarray(stored, dtype=np.float32)
+    if scales is not None:
+        rows = rows * np.asarray(scales)[:, None]
+    return rows
+
+
+class VectorIndex:
+    """
+    In-memory matrix of pre-normalized chunk embeddings
+
+    Rows are appended as chunks are stored, and a query is scored with one
+    matrix-vector product followed by argpartition for the top-k. With
+    ann_params, an IVF index is built incrementally alongside the matrix and
+    queries only score the rows it selects; exact search remains available
+    and is used until the IVF index has enough rows to train. A BM25
+    LexicalIndex over the chunk texts is maintained next to the vectors.
+
+    The matrix can be stored as float16 or int8 (see quantize) to cut memory
+    2x or 4x; quantized rows are scored in blocks without materializing a
+    float32 copy of the whole matrix. Scoring is slower than float32, since
+    every row is widened before the product: on 50k x 1024 rows, about
+    65 ms per exact query for float16 and 35 ms for int8 against 25 ms for
+    float32 (bench/bench_quantization.py). An ANN index avoids the full scan.
+    """
+    def __init__(self, dim=None, ann_params=None, dtype="float32"):
+        """
+        Initialize an empty index
+
+        Args:
+            dim (int): Embedding dimension; inferred from the first insert if None
+            ann_params (dict): IVFIndex parameters (nlist, nprobe, ...) to enable approximate search
+            dtype (str): Storage type of the matrix: "float32", "float16" or "int8"
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype: {dtype!r}")
+        self.dim = dim
+        self.dtype = dtype
+        self.ann = IVFIndex(**ann_params) if ann_params is not None else None
+        self._matrix = None
+        self._scales = None
+        self._size = 0
+        self.ids = []
+        self.contents = []
+        self.meta = {}
+        self.lexical = LexicalIndex()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def matrix(self):
+        """Normalized embeddings in their storage type, one row per stored chunk"""
+        if self._matrix is None:
+            return np.empty((0, self.dim or 0), dtype=DTYPES[self.dtype])
+        return self._matrix[:self._size]
+
+    @property
+    def scales(self):
+        """Per-row scales of an int8 matrix, None for float storage"""
+        if self._scales is None:
+            return None
+        return self._scales[:self._size]
+
+    @property
+    def nbytes(self):
+        """Memory used by the stored embeddings"""
+        scales = self.scales
+        return self.matrix.nbytes + (0 if scales is None else scales.nbytes)
+
+    def add(self, ids, contents, embeddings):
+        """
+        Append chunks to the index
+
+        Args:
+            ids (list): Chunk ids
+            contents (list): Chunk texts
+            embeddings (array-like): Embedding vectors, one per chunk
+        """
+        if not len(contents):
+            return
+        rows = normalize(embeddings)
+        if self.dim is None:
+            self.dim = rows.shape[1]
+        if rows.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of dimension {self.dim}, got {rows.shape[1]}")
+
+        stored, scales = quantize(rows, self.dtype)
+
+        # Grow geometrically so repeated inserts stay amortized O(n)
+        needed = self._size + len(rows)
+        if self._matrix is None or needed > len(self._matrix):
+            capacity = max(needed, 2 * (0 if self._matrix is None else len(self._matrix)), 256)
+            grown = np.empty((capacity, self.dim), dtype=DTYPES[self.dtype])
+            if self._size:
+                grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+            if scales is not None:
+                grown_scales = np.empty(capacity, dtype=np.float32)
+                grown_scales[:self._size] = self.scales
+                self._scales = grown_scales
+        self._matrix[self._size:needed] = stored
+        if scales is not None:
+            self._scales[self._size:needed] = scales
+        start, self._size = self._size, needed
+
+        self.ids.extend(ids)
+        self.contents.extend(contents)
+        self.lexical.add(contents)
+        if self.ann is not None:
+            self.ann.add(self.matrix, start)
+
+    def update_meta(self, **meta):
+        """
+        Store extra metadata about the indexed content
+
+        Args:
+            **meta: JSON-serializable values to store
+        """
+        self.meta.update(meta)
+
+    def flush(self):
+        """
+        Persist derived structures once a document is completely indexed
+        """
+
+    def content(self, row):
+        """
+        Text of one chunk
+
+        Args:
+            row (int): Row number
+
+        Returns:
+            str: Chunk text
+        """
+        return self.contents[row]
+
+    def scores(self, query_embedding):
+        """
+        Cosine similarity of a query against every stored chunk
+
+        Args:
+            query_embedding (array-like): Query vector
+
+        Returns:
+            np.ndarray: One float32 score per row
+        """
+        query = normalize(query_embedding)
+        matrix = self.matrix
+        if self.dtype == "float32":
+            return matrix @ query
+        half = self.dtype == "float16"
+        if half:
+            matrix = matrix.view(np.int16)
+            query = query * _HALF_SCALE
+        scores = np.empty(len(matrix), dtype=np.float32)
+        buffer = np.empty((min(len(matrix), _SCORE_BLOCK), matrix.shape[1]),
+                          dtype=np.int32 if half else np.float32)
+        for start in range(0, len(matrix), _SCORE_BLOCK):
+            rows = matrix[start:start + _SCORE_BLOCK]
+            block = buffer[:len(rows)]
+            np.copyto(block, rows, casting="unsafe")
+            if half:
+                np.left_shift(block, 13, out=block)
+                np.bitwise_and(block, _HALF_MASK, out=block)
+                block = block.view(np.float32)
+            np.matmul(block, query, out=scores[start:start + len(rows)])
+        scales = self.scales
+        if scales is not None:
+            scores *= scales
+        return scores
+
+    def vectors(self, rows):
+        """
+        float32 embeddings of selected rows
+
+        Args:
+            rows (np.ndarray): Row numbers
+
+        Returns:
+            np.ndarray: One normalized (up to quantization error) vector per row
+        """
+        scales = self.scales
+        return dequantize(self.matrix[rows], None if scales is None else scales[rows])
+
+    def search(self, query_embedding, k=3, exact=False, nprobe=None):
+        """
+        Find the k most similar chunks
+
+        Args:
+            query_embedding (array-like): Query vector
+            k (int): Number of results
+            exact (bool): Score every row even when an ANN index is available
+            nprobe (int): IVF lists to scan, overriding the index default
+
+        Returns:
+            list: (row, score) tuples, best match first
+        """
+        if not self._size or k <= 0:
+            return []
+        if exact or self.ann is None or not self.ann.trained:
+            return top_k(self.scores(query_embedding), k)
+
+        query = normalize(query_embedding)
+        self.ann.sync(self.matrix)
+        rows = self.ann.candidates(query, nprobe)
+        scores = self.vectors(rows) @ query
+        return [(int(rows[i]), score) for i, score in top_k(scores, k)]
+
+
+def top_k(scores, k):
+    """
+    Select the k highest scores without sorting the whole array
+
+    Args:
+        scores (np.ndarray): Score per row
+        k (int): Number of results
+
+    Returns:
+        list: (row, score) tuples, best match first
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return []
+    if k < len(scores):
+        rows = np.argpartition(-scores, k - 1)[:k]
+    else:
+        rows = np.arange(len(scores))
+    rows = rows[np.argsort(-scores[rows])]
+    return [(int(row), float(scores[row])) for row in rows]
+
+
+class PersistentVectorIndex(VectorIndex):
+    """
+    On-disk VectorIndex that is memory-mapped on first use
+
+    Layout of the index directory:
+        embeddings.*    row-major matrix of normalized embeddings
+                        (.f32, .f16 or .i8 depending on the storage dtype)
+        scales.f32      per-row scales of an int8 matrix
+        chunks.idx      (chunk id, byte offset, byte length) per row
+        chunks.txt      UTF-8 chunk texts, addressed through chunks.idx
+        meta.json       dimension, row count and free-form metadata
+        lexical.npz     BM25 inverted index, written once the document is indexed
+        ivf_*           optional IVF index (see ann_index.IVFIndex)
+
+    Opening the index only reads meta.json. The matrix and the tables are
+    mapped read-only when first needed, so the page cache is shared between
+    processes serving the same index. Rows are appended in place and
+    meta.json is replaced atomically afterwards, so readers never see a
+    partially written row. Only one process should write at a time.
+    """
+    META_FILE = "meta.json"
+    MATRIX_FILES = {"float32": "embeddings.f32", "float16": "embeddings.f16", "int8": "embeddings.i8"}
+    SCALES_FILE = "scales.f32"
+    TABLE_FILE = "chunks.idx"
+    TEXTS_FILE = "chunks.txt"
+    LEXICAL_FILE = "lexical.npz"
+    TABLE_DTYPE = np.dtype([("id", "<i8"), ("offset", "<i8"), ("length", "<i8")])
+
+    def __init__(self, directory, dim=None, ann_params=None, dtype="float32"):
+        """
+        Open (or create) an index directory
+
+        Args:
+            directory (str): Directory holding the index files
+            dim (int): Embedding dimension for a new index; inferred if None
+            ann_params (dict): IVFIndex parameters to enable approximate search;
+                an IVF index already persisted in the directory is always reopened
+            dtype (str): Storage type for a new index; an existing index keeps its own
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype: {dtype!r}")
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.ann = None
+        if ann_params is not None or os.path.exists(os.path.join(directory, IVFIndex.PARAMS_FILE)):
+            self.ann = IVFIndex(directory=directory, **(ann_params or {}))
+        self.meta = self._read_meta()
+        if self.meta is None:
+            self.meta = {"dim": dim, "count": 0, "dtype": dtype}
+        self.dim = self.meta["dim"]
+        self.dtype = self.meta["dtype"]
+        self._size = self.meta["count"]
+        self._lexical = None
+        self._unmap()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._path(self.META_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self):
+        tmp_path = self._path(self.META_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self._path(self.META_FILE))
+
+    def _unmap(self):
+        self._matrix = None
+        self._scales = None
+        self._table = None
+        self._texts = None
+
+    def refresh(self):
+        """
+        Pick up rows appended by another process since the index was opened
+        """
+        meta = self._read_meta()
+        if meta is not None and meta["count"] != self._size:
+            self.meta = meta
+            self.dim = meta["dim"]
+            self._size = meta["count"]
+            self._unmap()
+
+    @property
+    def matrix(self):
+        if not self._size:
+            return np.empty((0, self.dim or 0), dtype=DTYPES[self.dtype])
+        if self._matrix is None:
+            self._matrix = np.memmap(self._path(self.MATRIX_FILES[self.dtype]), dtype=DTYPES[self.dtype],
+                                     mode="r", shape=(self._size, self.dim))
+        return self._matrix
+
+    @property
+    def scales(self):
+        if self.dtype != "int8":
+            return None
+        if not self._size:
+            return np.empty(0, dtype=np.float32)
+        if self._scales is None:
+            self._scales = np.memmap(self._path(self.SCALES_FILE), dtype=np.float32,
+                                     mode="r", shape=(self._size,))
+        return self._scales
+
+    @property
+    def table(self):
+        """Chunk id / offset table, one record per row"""
+        if not self._size:
+            return np.empty(0, dtype=self.TABLE_DTYPE)
+        if self._table is None:
+            self._table = np.memmap(self._path(self.TABLE_FILE), dtype=self.TABLE_DTYPE,
+                                    mode="r", shape=(self._size,))
+        return self._table
+
+    @property
+    def ids(self):
+        return self.table["id"]
+
+    @property
+    def lexical(self):
+        """BM25 index, loaded from disk (or rebuilt from the chunk texts) on first use"""
+        if self._lexical is None or len(self._lexical) != self._size:
+            path = self._path(self.LEXICAL_FILE)
+            lexical = LexicalIndex.load(path) if os.path.exists(path) else None
+            if lexical is None or len(lexical) != self._size:
+                lexical = LexicalIndex()
+                lexical.add(self.contents[row] for row in range(self._size))
+            self._lexical = lexical
+        return self._lexical
+
+    def flush(self):
+        self.lexical.save(self._path(self.LEXICAL_FILE))
+
+    @property
+    def contents(self):
+        return _ChunkTexts(self)
+
+    def content(self, row):
+        """
+        Read the text of one chunk
+
+        Args:
+            row (int): Row number
+
+        Returns:
+            str: Chunk text
+        """
+        if self._texts is None:
+            self._texts = np.memmap(self._path(self.TEXTS_FILE), dtype=np.uint8, mode="r")
+        record = self.table[row]
+        start = int(record["offset"])
+        return bytes(self._texts[start:start + int(record["length"])]).decode("utf-8")
+
+    def add(self, ids, contents, embeddings):
+        if not len(contents):
+            return
+        rows = normalize(embeddings)
+        if self.dim is None:
+            self.dim = self.meta["dim"] = rows.shape[1]
+        if rows.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of dimension {self.dim}, got {rows.shape[1]}")
+
+        stored, scales = quantize(rows, self.dtype)
+
+        # Truncate leftovers of an interrupted write before appending
+        matrix_path = self._path(self.MATRIX_FILES[self.dtype])
+        scales_path = self._path(self.SCALES_FILE)
+        table_path = self._path(self.TABLE_FILE)
+        texts_path = self._path(self.TEXTS_FILE)
+        truncations = [(matrix_path, self._size * self.dim * stored.itemsize),
+                       (table_path, self._size * self.TABLE_DTYPE.itemsize)]
+        if scales is not None:
+            truncations.append((scales_path, self._size * scales.itemsize))
+        for path, size in truncations:
+            with open(path, "ab") as f:
+                f.truncate(size)
+        offset = int(self.table[-1]["offset"] + self.table[-1]["length"]) if self._size else 0
+        with open(texts_path, "ab") as f:
+            f.truncate(offset)
+
+        lexical = self.lexical
+        encoded = [text.encode("utf-8") for text in contents]
+        table = np.empty(len(encoded), dtype=self.TABLE_DTYPE)
+        table["id"] = ids
+        table["length"] = [len(data) for data in encoded]
+        table["offset"] = offset + np.concatenate(([0], np.cumsum(table["length"][:-1])))
+
+        with open(matrix_path, "ab") as f:
+            f.write(stored.tobytes())
+        if scales is not None:
+            with open(scales_path, "ab") as f:
+                f.write(scales.tobytes())
+        with open(table_path, "ab") as f:
+            f.write(table.tobytes())
+        with open(texts_path, "ab") as f:
+            f.write(b"".join(encoded))
+
+        start = self._size
+        self._size += len(rows)
+        self.meta["count"] = self._size
+        self._write_meta()
+        self._unmap()
+        lexical.add(contents)
+        if self.ann is not None:
+            self.ann.add(self.matrix, start)
+
+    def update_meta(self, **meta):
+        self.meta.update(meta)
+        self._write_meta()
+
+
+class _ChunkTexts:
+    """Read-only sequence view over the chunk texts of a PersistentVectorIndex"""
+    def __init__(self, index):
+        self._index = index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __getitem__(self, row):
+        return self._index.content(row)
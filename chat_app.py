@@ -1,7 +1,11 @@
 import streamlit as st
-import json
+import uuid
 from chat_engine import ChatBot
-from usersconfig import UserKeys
+from user_registry import hash_key, registry
+from shared_resources import llm_scheduler, secret_key, session_resource, transcript_store
+from llm_scheduler import QueueFull
+from stream_render import StreamRenderer
+from history_view import HistoryView
 
 st.set_page_config(
     page_icon="🤖",
@@ -16,13 +20,29 @@ def initialize_session_state():
         st.session_state.chat_started = False
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "history_view" not in st.session_state:
+        # Recent messages eagerly, older ones paged on request
+        st.session_state.history_view = HistoryView()
     if "chatbot" not in st.session_state:
-        st.session_state.chatbot = ChatBot(st.secrets["GROQ_API"])
-    if "users_config" not in st.session_state:
-        st.session_state.users_config = UserKeys()
+        # One ChatBot for the whole server; conversations are separated by thread_id
+        st.session_state.chatbot = session_resource(
+            st.session_state,
+            secret_key("chatbot", st.secrets["GROQ_API"]),
+            lambda: ChatBot(st.secrets["GROQ_API"])
+        )
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
 
 initialize_session_state()
 
+# Messages are appended to a transcript log written in the background,
+# from which the history download is built when the chat ends
+transcripts = transcript_store(st.session_state)
+
+def add_message(role, content):
+    st.session_state.messages.append({"role": role, "content": content})
+    transcripts.append(st.session_state.transcript_id, role, content)
+
 with st.sidebar:
     st.subheader("🅞🆇 Z 🅴🅴 - 🇩🇵🇦-🇧 ", divider="gray")
     st.write('`DPAB Chatbot` | `Support & Déploiement Infra`')
@@ -31,16 +51,21 @@ with st.sidebar:
     
     if not st.session_state.chat_started:
         if st.button("Démarrer Chat", use_container_width=True):
-            # If no user key provided, use 'guest' thread
-            thread_id = user_key if user_key else 'guest'
+            # Threads are named after the key's digest, never the key itself, since
+            # the id is stored in the checkpoints and shown in the file name.
+            # Each chat gets a thread of its own, so its first question is a
+            # standalone one the response cache can answer; the scheduler still
+            # queues per user (or per guest session)
+            queue_id = hash_key(user_key) if user_key else f"guest-{st.session_state.session_id}"
+            thread_id = f"{queue_id}-{uuid.uuid4().hex[:12]}"
             
             # If user key is provided, get personalized system prompt
             system_prompt = None
             user_info = None
             if user_key:
-                user_info = st.session_state.users_config.get_user_by_key(user_key)
+                user_info = registry.get("chat_app", user_key)
                 if user_info:
-                    system_prompt = user_info['personalized_system_prompt']
+                    system_prompt = user_info['prompt']
                     st.success(f"Connecté en tant que {user_info['user_name']}")
                 else:
                     st.error("Clé utilisateur invalide")
@@ -48,7 +73,9 @@ with st.sidebar:
             
             st.session_state.chat_started = True
             st.session_state.messages = []
+            st.session_state.transcript_id = f"chat_app-{uuid.uuid4().hex}"
             st.session_state.thread_id = thread_id
+            st.session_state.queue_id = queue_id
             st.session_state.system_prompt = system_prompt
             st.session_state.user_info = user_info  # Store user info in session state
             st.rerun()
@@ -61,7 +88,7 @@ with st.sidebar:
         
         if st.button("Terminer le chat", use_container_width=True, type="primary"):
             # Option to download chat history
-            chat_history_json = json.dumps(st.session_state.messages, indent=2)
+            chat_history_json = transcripts.export(st.session_state.transcript_id, "json")
             
             # Customize filename based on user info if available
             filename = f"chat_history_{st.session_state.thread_id}.json"
@@ -85,31 +112,39 @@ st.subheader("☰ :grey-background[DPAB] :grey[CHAT]🅱🅞🆃 🍓", divider=
 if st.session_state.chat_started:
     if not st.session_state.messages:
         hello_message = ":sparkles: Bonjour, comment puis-je vous aider aujourd'hui ?"
-        st.session_state.messages = [{"role": "assistant", "content": hello_message}]
+        add_message("assistant", hello_message)
     
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    st.session_state.history_view.render(st.session_state.messages)
 
     if prompt := st.chat_input("Votre message"):
+        # Shown now, written to the transcript with its answer (a refused question never is)
         st.session_state.messages.append({"role": "user", "content": prompt})
         with st.chat_message("user"):
             st.markdown(prompt)
 
         with st.chat_message("assistant"):
-            # Use the thread_id and optional system_prompt from session state
-            response = st.session_state.chatbot.chat(
-                prompt, 
-                thread_id=st.session_state.thread_id, 
-                system_prompt=st.session_state.system_prompt
-            )
+            # Wait for a turn on the shared model; requests are queued per
+            # user (or guest session) and served round-robin
+            placeholder = st.empty()
+            def show_wait(position, seconds):
+                placeholder.info(f"⏳ En file d'attente : {position} requête(s) avant vous, ~{seconds:.0f} s")
             
-            response_content = response["messages"][-1].content
-            response_str = ""
-            response_container = st.empty()
-            for token in response_content:
-                response_str += token
-                response_container.markdown(response_str)
-            st.session_state.messages.append(
-                {"role": "assistant", "content": response["messages"][-1].content}
-            )
+            # Use the thread_id and optional system_prompt from session state;
+            # cached answers are replayed without queuing for the model
+            renderer = StreamRenderer(placeholder, cursor="▌")
+            try:
+                for token in st.session_state.chatbot.stream(
+                    prompt, 
+                    thread_id=st.session_state.thread_id, 
+                    system_prompt=st.session_state.system_prompt,
+                    admission=lambda: llm_scheduler(st.session_state).slot(st.session_state.queue_id, on_wait=show_wait)
+                ):
+                    renderer.write(token)
+            except QueueFull:
+                # Refused before the model ran, so the thread does not hold the
+                # question either; it is dropped from the history, to be asked again
+                st.session_state.messages.pop()
+                placeholder.warning("🚦 Serveur occupé, trop de requêtes en attente. Réessayez dans quelques instants.")
+            else:
+                transcripts.append(st.session_state.transcript_id, "user", prompt)
+                add_message("assistant", renderer.finish())
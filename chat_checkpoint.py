@@ -0,0 +1,107 @@
+import sqlite3
+import time
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+# Idle threads are forgotten after a month
+DEFAULT_THREAD_TTL = 30 * 24 * 3600
+# Checkpoints kept per thread; only the latest is needed to resume a conversation
+DEFAULT_KEEP_CHECKPOINTS = 2
+# Seconds between two maintenance passes
+MAINTENANCE_INTERVAL = 600
+
+
+class BoundedSqliteSaver(SqliteSaver):
+    """
+    SQLite checkpointer that keeps the database bounded
+
+    LangGraph writes a checkpoint per step and never deletes one. This saver
+    records when each thread was last written, and periodically drops idle
+    threads, keeps only the latest checkpoints of the others and gives the
+    freed pages back to the file system. The number of messages per thread is
+    capped by the graph itself (see ChatBot).
+    """
+
+    def __init__(self, path, thread_ttl=DEFAULT_THREAD_TTL,
+                 keep_checkpoints=DEFAULT_KEEP_CHECKPOINTS,
+                 maintenance_interval=MAINTENANCE_INTERVAL):
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        super().__init__(conn)
+        self.thread_ttl = thread_ttl
+        self.keep_checkpoints = max(1, keep_checkpoints)
+        self.maintenance_interval = maintenance_interval
+        self._last_maintenance = 0.0
+        self.setup()
+        with self.cursor() as cur:
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS thread_activity "
+                "(thread_id TEXT PRIMARY KEY, last_used REAL NOT NULL)"
+            )
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = super().put(config, checkpoint, metadata, new_versions)
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT INTO thread_activity (thread_id, last_used) VALUES (?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET last_used = excluded.last_used",
+                (str(config["configurable"]["thread_id"]), time.time()),
+            )
+        if time.monotonic() - self._last_maintenance >= self.maintenance_interval:
+            self.maintain()
+        return result
+
+    def forget_thread(self, thread_id):
+        """Delete every checkpoint of a thread"""
+        with self.cursor() as cur:
+            for table in ("checkpoints", "writes", "thread_activity"):
+                cur.execute(f"DELETE FROM {table} WHERE thread_id = ?", (str(thread_id),))
+
+    def maintain(self):
+        """
+        Evict idle threads and compact the others
+
+        Returns:
+            dict: Number of threads evicted and checkpoints removed
+        """
+        self._last_maintenance = time.monotonic()
+        with self.cursor() as cur:
+            evicted = 0
+            if self.thread_ttl:
+                cur.execute("SELECT thread_id FROM thread_activity WHERE last_used < ?",
+                            (time.time() - self.thread_ttl,))
+                idle = [row[0] for row in cur.fetchall()]
+                for table in ("checkpoints", "writes", "thread_activity"):
+                    cur.executemany(f"DELETE FROM {table} WHERE thread_id = ?",
+                                    [(thread_id,) for thread_id in idle])
+                evicted = len(idle)
+
+            # Checkpoint ids are time-ordered, so the ones ranked past
+            # keep_checkpoints in descending order are the oldest
+            cur.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS stale_checkpoints "
+                "(thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT)"
+            )
+            cur.execute("DELETE FROM stale_checkpoints")
+            cur.execute(
+                "INSERT INTO stale_checkpoints "
+                "SELECT thread_id, checkpoint_ns, checkpoint_id FROM ("
+                "  SELECT thread_id, checkpoint_ns, checkpoint_id, ROW_NUMBER() OVER ("
+                "    PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS rank"
+                "  FROM checkpoints"
+                ") WHERE rank > ?",
+                (self.keep_checkpoints,),
+            )
+            removed = cur.execute("SELECT COUNT(*) FROM stale_checkpoints").fetchone()[0]
+            for table in ("checkpoints", "writes"):
+                cur.execute(
+                    f"DELETE FROM {table} WHERE (thread_id, checkpoint_ns, checkpoint_id) IN "
+                    "(SELECT thread_id, checkpoint_ns, checkpoint_id FROM stale_checkpoints)"
+                )
+        with self.lock:
+            self.conn.execute("PRAGMA incremental_vacuum")
+        return {"evicted_threads": evicted, "removed_checkpoints": removed}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -1,42 +1,162 @@
-#from langchain_groq import ChatGroq
-from langchain_ollama import ChatOllama
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import START, MessagesState, StateGraph
-from langchain_core.messages import SystemMessage
+from langgraph.types import StreamWriter
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage
+from collections import OrderedDict
+from contextlib import nullcontext
+import os
+import threading
+from chat_checkpoint import BoundedSqliteSaver
+from chat_history import clip, estimate_tokens, llm_summarizer, split_point, summary_message
+from llm_providers import get_provider
+from metrics import metrics
+from response_cache import ResponseCache, replay
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful IT and CloudOPS assistant. Respond in French."
+# Conversation memory survives restarts in this SQLite file
+DEFAULT_CHECKPOINT_PATH = os.environ.get("CHATBOT_CHECKPOINT_DB", "chat_memory.sqlite")
+# Messages kept per thread (user and assistant turns); older ones are summarized
+DEFAULT_MAX_MESSAGES = 40
+# Estimated tokens of prompt per turn: system prompt, summary, history and question
+DEFAULT_TOKEN_BUDGET = 3000
+
+ROLES = {"human": "user", "ai": "assistant"}
+
+class ChatState(MessagesState):
+    # Rolling summary of the turns removed from the thread
+    summary: str
 
 class ChatBot:
-    def __init__(self, groq_api_key: str):
+    def __init__(self, groq_api_key: str, max_workflows: int = 16,
+                 checkpoint_path: str = DEFAULT_CHECKPOINT_PATH,
+                 max_messages: int = DEFAULT_MAX_MESSAGES,
+                 token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 max_message_tokens: int = 600, summary_tokens: int = 300,
+                 response_cache: ResponseCache = None, **checkpoint_options):
         self.groq_api_key = groq_api_key
         self.model_name = "llama-3.2-3b-preview"
         self.llm = self._setup_llm()
-        self.app = self._setup_workflow()
+        self.max_messages = max(2, max_messages)
+        self.token_budget = token_budget
+        self.max_message_tokens = max_message_tokens
+        self.summary_tokens = summary_tokens
+        self.summarize = llm_summarizer(self.llm.complete, summary_tokens)
+        # Answers to standalone questions, shared by every thread of a persona
+        self.response_cache = response_cache if response_cache is not None else ResponseCache.from_env()
+        # One checkpointer for every workflow, so a thread keeps its history
+        # whichever system prompt it is served with
+        self.memory = BoundedSqliteSaver(checkpoint_path, **checkpoint_options)
+        # Compiled workflows by system prompt, least recently used first
+        self.max_workflows = max(1, max_workflows)
+        self._workflows = OrderedDict()
+        self._workflows_lock = threading.Lock()
+        self.app = self._workflow_for()
 
     def _setup_llm(self):
-        #return ChatGroq(temperature=0.1, groq_api_key=self.groq_api_key, model_name=self.model_name)
-        retrun ChatOllama(model="mistral:latest", base_url='http://127.0.0.1:11434',)
+        # Local Ollama by default; $LLM_PROVIDER=groq or fake switches backend
+        return get_provider(
+            ollama={"model": "mistral:latest", "host": "http://127.0.0.1:11434"},
+            groq={"api_key": self.groq_api_key, "model": self.model_name},
+        )
 
-    def _setup_workflow(self, system_prompt="You are a helpful IT and CloudOPS assistant. Respond in French."):
-        workflow = StateGraph(state_schema=MessagesState)
+    def _setup_workflow(self, system_prompt=DEFAULT_SYSTEM_PROMPT):
+        workflow = StateGraph(state_schema=ChatState)
+        
+        def summarize_history(state: ChatState):
+            # Fold the oldest turns into the summary once the thread outgrows
+            # the token budget or message cap, and remove them from the thread
+            with metrics.span("chatbot.node", node="summarize") as span:
+                history = state["messages"][:-1]
+                turns = [{"role": ROLES.get(m.type, m.type), "content": m.content} for m in history]
+                budget = (self.token_budget - self.summary_tokens - estimate_tokens(system_prompt)
+                          - estimate_tokens(state["messages"][-1].content))
+                start = split_point(turns, max(budget, 0), self.max_message_tokens, self.max_messages)
+                span.set(messages=len(history), folded=start)
+                if not start:
+                    return {}
+                return {
+                    "summary": self.summarize(state.get("summary", ""), turns[:start]),
+                    "messages": [RemoveMessage(id=m.id) for m in history[:start]],
+                }
         
-        def call_model(state: MessagesState):
-            # Add system message at the beginning of the conversation
-            sys_prompt = SystemMessage(content=system_prompt)
-            modified_messages = [sys_prompt] + state["messages"]
+        def call_model(state: ChatState, writer: StreamWriter):
+            # Add system message and summary at the beginning of the conversation
+            modified_messages = [{"role": "system", "content": system_prompt}]
+            if state.get("summary"):
+                modified_messages.append(summary_message(state["summary"]))
+            modified_messages.extend(
+                {"role": ROLES.get(m.type, m.type), "content": clip(m.content, self.max_message_tokens)}
+                for m in state["messages"][:-1]
+            )
+            modified_messages.append({"role": "user", "content": state["messages"][-1].content})
             
-            response = self.llm.invoke(modified_messages)
-            return {"messages": response}
+            # Tokens go to stream() through the custom stream as they arrive
+            tokens = []
+            with metrics.span("chatbot.node", node="model") as span:
+                for token in self.llm.stream(modified_messages):
+                    tokens.append(token)
+                    writer(token)
+                span.set(prompt_messages=len(modified_messages), tokens=len(tokens))
+            return {"messages": AIMessage(content="".join(tokens))}
 
-        workflow.add_edge(START, "model")
+        workflow.add_edge(START, "summarize")
+        workflow.add_node("summarize", summarize_history)
+        workflow.add_edge("summarize", "model")
         workflow.add_node("model", call_model)
         
-        return workflow.compile(checkpointer=MemorySaver())
+        return workflow.compile(checkpointer=self.memory)
+
+    def _workflow_for(self, system_prompt=None):
+        # Compile each system prompt's workflow once and keep the most
+        # recently used ones; evicting a workflow keeps its threads' history
+        system_prompt = system_prompt or DEFAULT_SYSTEM_PROMPT
+        with self._workflows_lock:
+            app = self._workflows.get(system_prompt)
+            if app is not None:
+                self._workflows.move_to_end(system_prompt)
+                return app
+        app = self._setup_workflow(system_prompt)
+        with self._workflows_lock:
+            app = self._workflows.setdefault(system_prompt, app)
+            self._workflows.move_to_end(system_prompt)
+            while len(self._workflows) > self.max_workflows:
+                self._workflows.popitem(last=False)
+        return app
 
     def chat(self, message: str, thread_id: str = 'guest', system_prompt=None):
-        # If a custom system prompt is provided, recreate the workflow
-        if system_prompt:
-            self.app = self._setup_workflow(system_prompt)
-        
-        return self.app.invoke(
+        return self._workflow_for(system_prompt).invoke(
             {"messages": [{"role": "user", "content": message}]},
             {"configurable": {"thread_id": thread_id}}
         )
+
+    def stream(self, message: str, thread_id: str = 'guest', system_prompt=None, admission=None):
+        # Yield answer tokens as the model produces them; the graph still
+        # checkpoints the complete reply once the model node returns.
+        # admission() returns a context held while the model runs (e.g. a
+        # scheduler slot); cached answers skip it and the model entirely
+        app = self._workflow_for(system_prompt)
+        config = {"configurable": {"thread_id": thread_id}}
+        system_prompt = system_prompt or DEFAULT_SYSTEM_PROMPT
+        
+        # The thread's messages and summary so far; only first turns are shared
+        values = app.get_state(config).values
+        history = list(values.get("messages", ())) + ([values["summary"]] if values.get("summary") else [])
+        cached = self.response_cache.get(system_prompt, message, history)
+        if cached:
+            # Record the exchange in the thread as if the model had answered
+            app.update_state(
+                config, {"messages": [HumanMessage(content=message), AIMessage(content=cached)]}, as_node="model"
+            )
+            yield from replay(cached)
+            return
+        
+        tokens = []
+        with admission() if admission else nullcontext():
+            for token in app.stream(
+                {"messages": [{"role": "user", "content": message}]}, config, stream_mode="custom"
+            ):
+                tokens.append(token)
+                yield token
+        self.response_cache.put(system_prompt, message, "".join(tokens), history)
+
+    def close(self):
+        self.memory.close()
@@ -0,0 +1,148 @@
+import re
+from typing import Callable, Dict, List, Optional
+
+# Rough size of a token in characters of English/French text, shared by every
+# token budget (chat history, personas, RAG context packing)
+CHARS_PER_TOKEN = 4
+# When the history overflows, evict down to this fraction of the budget so
+# that the summary is updated once every few turns rather than every turn
+LOW_WATER = 0.75
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+
+Message = Dict[str, str]
+Summarizer = Callable[[str, List[Message]], str]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token count estimate used for budgeting"""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def clip(text: str, max_tokens: Optional[int]) -> str:
+    """Shorten an overlong message (e.g. a pasted log) to its head and tail"""
+    if not max_tokens or estimate_tokens(text) <= max_tokens:
+        return text
+    keep = max_tokens * CHARS_PER_TOKEN
+    head = keep * 2 // 3
+    return f"{text[:head]}\n[...]\n{text[-(keep - head):]}"
+
+
+def split_point(messages: List[Message], token_budget: int,
+                max_message_tokens: Optional[int] = None,
+                max_messages: Optional[int] = None) -> int:
+    """
+    Index of the first message to keep so the history fits the budget
+
+    Returns 0 while everything fits. Otherwise the newest messages are kept
+    up to LOW_WATER of the budget, starting on a user turn.
+    """
+    sizes = [estimate_tokens(clip(m["content"], max_message_tokens)) for m in messages]
+    if sum(sizes) <= token_budget and (not max_messages or len(messages) <= max_messages):
+        return 0
+    target = token_budget * LOW_WATER
+    target_count = int(max_messages * LOW_WATER) if max_messages else len(messages)
+    start, used = len(messages), 0
+    while start > 0 and used + sizes[start - 1] <= target and len(messages) - start < target_count:
+        start -= 1
+        used += sizes[start]
+    while start < len(messages) and messages[start]["role"] != "user":
+        start += 1
+    return start
+
+
+def extractive_summary(summary: str, evicted: List[Message], max_tokens: int = 300) -> str:
+    """Summary without a model call: the first sentence of each evicted message, newest kept"""
+    lines = summary.splitlines() if summary else []
+    for message in evicted:
+        first = re.split(r"(?<=[.!?])\s|\n", message["content"].strip(), maxsplit=1)[0]
+        lines.append(f"- {message['role']}: {clip(first, 40)}")
+    kept, used = [], 0
+    for line in reversed(lines):
+        used += estimate_tokens(line) + 1
+        if used > max_tokens:
+            break
+        kept.append(line)
+    return "\n".join(reversed(kept))
+
+
+def llm_summarizer(complete: Callable[[List[Message]], str], max_tokens: int = 300) -> Summarizer:
+    """
+    Summarizer folding evicted turns into the running summary with a model call
+
+    Args:
+        complete: Function sending chat messages to a model and returning its answer
+        max_tokens: Target summary size
+
+    Falls back to extractive_summary if the model call fails.
+    """
+    def summarize(summary: str, evicted: List[Message]) -> str:
+        transcript = "\n".join(f"{m['role'].upper()}: {clip(m['content'], 500)}" for m in evicted)
+        try:
+            return complete([
+                {"role": "system", "content": (
+                    f"Update the summary of a conversation in at most {max_tokens * 3 // 4} words. "
+                    "Keep facts, host and service names, commands, errors and decisions. "
+                    "Write in the language of the conversation. Answer with the summary only."
+                )},
+                {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"},
+            ]).strip()
+        except Exception:
+            return extractive_summary(summary, evicted, max_tokens)
+    return summarize
+
+
+def summary_message(summary: str) -> Message:
+    return {"role": "system", "content": f"{SUMMARY_HEADER}\n{summary}"}
+
+
+class HistoryWindow:
+    """
+    Token-budgeted chat history with a rolling summary, for one conversation
+
+    build() keeps the newest turns that fit the budget and folds the turns it
+    evicts into a summary message, updated incrementally, so the prompt size
+    stays roughly constant however long the conversation gets.
+    """
+
+    def __init__(self, token_budget: int = 2000, max_message_tokens: int = 600,
+                 summary_tokens: int = 300, summarize: Optional[Summarizer] = None):
+        self.token_budget = token_budget
+        self.max_message_tokens = max_message_tokens
+        self.summary_tokens = summary_tokens
+        self.summarize = summarize or (lambda s, e: extractive_summary(s, e, summary_tokens))
+        self.reset()
+
+    def reset(self):
+        self.summary = ""
+        self.folded = 0
+
+    def build(self, system_prompt: str, history: List[Message], user_message: str) -> List[Message]:
+        """
+        Prompt messages for the next turn
+
+        Args:
+            system_prompt: System prompt of the conversation
+            history: All previous messages, oldest first (without user_message)
+            user_message: The new user message
+
+        Returns:
+            list: System prompt, summary, recent history and the new message
+        """
+        if len(history) < self.folded:
+            self.reset()  # The conversation was cleared
+        recent = history[self.folded:]
+        budget = (self.token_budget - self.summary_tokens
+                  - estimate_tokens(system_prompt) - estimate_tokens(user_message))
+        start = split_point(recent, max(budget, 0), self.max_message_tokens)
+        if start:
+            self.summary = self.summarize(self.summary, recent[:start])
+            self.folded += start
+            recent = recent[start:]
+
+        messages = [{"role": "system", "content": system_prompt}]
+        if self.summary:
+            messages.append(summary_message(self.summary))
+        messages.extend({"role": m["role"], "content": clip(m["content"], self.max_message_tokens)}
+                        for m in recent)
+        messages.append({"role": "user", "content": user_message})
+        return messages
@@ -1,30 +1,24 @@
 import streamlit as st
-from ollama import Client
 import datetime
 import os
+import sys
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared_resources import llm_provider, llm_scheduler, response_cache, transcript_store
+from llm_scheduler import QueueFull
+from response_cache import replay
+from stream_render import StreamRenderer
+from history_view import HistoryView
+from chat_history import HistoryWindow, llm_summarizer
+from user_registry import hash_key, registry
 
 # unset localhost proxy calls
 os.environ["no_proxy"] = "127.0.0.1,localhost"
 
-=== Liste des ingénieurs autorisés ===
-
-ENGINEERS = {
-    "X22222": {
-        "name": "Emily Davis",
-        "prompt": "You are Emily's personal AI assistant. You're good at providing health and wellness recommendations."
-    },
-    "X33333": {
-        "name": "Michael Wilson",
-        "prompt": "You are Michael's AI companion. You specialize in financial advice and investment strategies."
-    }
-}
-
-# === Prompt invité par défaut ===
-GUEST_PROMPT = (
-    "Vous êtes un assistant expert en infrastructure IT, spécialisé dans la planification et le déploiement "
-    "dans une entreprise de services cloud."
-    "Répondez en français de manière concise."
-)
+# === Ingénieurs autorisés et prompt invité (personas.json, rechargé à chaud) ===
+APP_NAME = "chatbot_simple"
+GUEST_PROMPT = registry.guest_prompt(APP_NAME)
 
 # === INIT SESSION STATE ===
 st.set_page_config(
@@ -39,10 +33,23 @@ st.set_page_config(
 # === INIT SESSION STATE ===
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "history_view" not in st.session_state:
+    # Recent messages eagerly, older ones paged on request
+    st.session_state.history_view = HistoryView()
 if "current_prompt" not in st.session_state:
     st.session_state.current_prompt = GUEST_PROMPT
 if "engineer_mode" not in st.session_state:
     st.session_state.engineer_mode = False
+if "user_id" not in st.session_state:
+    st.session_state.user_id = uuid.uuid4().hex
+if "transcript_id" not in st.session_state:
+    st.session_state.transcript_id = f"{APP_NAME}-{uuid.uuid4().hex}"
+if "history_window" not in st.session_state:
+    # Older turns are folded into a summary written by the local model
+    st.session_state.history_window = HistoryWindow(
+        token_budget=2000,
+        summarize=llm_summarizer(lambda messages: provider().complete(messages))
+    )
 
 
 # === SIDEBAR ===
@@ -52,10 +59,12 @@ engineer_mode = st.sidebar.toggle("  | `Accès DPAB` ")
 
 if engineer_mode:
     key = st.sidebar.text_input("🔐 Clé d'accès", type="password")
-    if key in ENGINEERS:
-        st.sidebar.success(f"✅ {ENGINEERS[key]['name']} 👷‍♂️")
-        st.session_state.current_prompt = ENGINEERS[key]["prompt"]
+    engineer = registry.get(APP_NAME, key)
+    if engineer:
+        st.sidebar.success(f"✅ {engineer['user_name']} 👷‍♂️")
+        st.session_state.current_prompt = engineer["prompt"]
         st.session_state.engineer_mode = True
+        st.session_state.user_id = hash_key(key)
     else:
         st.sidebar.warning("Clé invalide ou vide. Mode invité activé.")
         st.session_state.current_prompt = GUEST_PROMPT
@@ -67,14 +76,21 @@ else:
 st.sidebar.divider()
 if st.sidebar.button("💬 Nouveau Chat", use_container_width=True):
     st.session_state.messages = []
+    st.session_state.history_window.reset()
+    st.session_state.transcript_id = f"{APP_NAME}-{uuid.uuid4().hex}"
 
-if st.session_state.messages:
-    chat_text = "\n".join(
-        [f"{m['role'].upper()} : {m['content']}" for m in st.session_state.messages]
-    )
+# Every message is appended to a transcript log written in the background;
+# the export is built from that log only when asked for
+transcripts = transcript_store(st.session_state)
+
+def add_message(role, content):
+    st.session_state.messages.append({"role": role, "content": content})
+    transcripts.append(st.session_state.transcript_id, role, content)
+
+if st.session_state.messages and st.sidebar.button("📄 Préparer l'historique", use_container_width=True):
     st.sidebar.download_button(
         label="📥 Télécharger l'historique",
-        data=chat_text,
+        data=transcripts.export(st.session_state.transcript_id, "text"),
         file_name=f"chat_{datetime.datetime.now().strftime('%Y-%m-%d_%H%M')}.txt",
         mime="text/plain"
     )
@@ -82,29 +98,27 @@ if st.session_state.messages:
 # === Affichage des anciens messages ===
 st.subheader(":material/chat: Assistant IT – :red[DPAB] 🛡️ 👨🏻‍💻", divider='red')
 
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+st.session_state.history_view.render(st.session_state.messages)
 
 # === Stream avec mémoire ===
-def context_messages(user_message, memory_limit=2):
-    history = st.session_state.messages[-memory_limit*2:]
-    messages = [{"role": "system", "content": st.session_state.current_prompt}]
-    messages.extend(history)
-    messages.append({"role": "user", "content": user_message})
-    return messages
+def context_messages(user_message):
+    # Recent turns within the token budget, older ones as a rolling summary;
+    # the last stored message is user_message itself
+    return st.session_state.history_window.build(
+        st.session_state.current_prompt, st.session_state.messages[:-1], user_message
+    )
+
+def provider():
+    # One provider (and keep-alive connection pool) for all sessions;
+    # $LLM_PROVIDER=fake serves canned answers without Ollama
+    return llm_provider(st.session_state, ollama={"model": "gemma3:4b"})
 
 def stream_response(messages):
-    client = Client(host='http://127.0.0.1:11434')
-    return client.chat(
-        #model="mistral:latest",
-        model="gemma3:4b",
-        messages=messages,
-        stream=True,
-    )
+    return provider().stream(messages)
 
 # === Input utilisateur ===
 if prompt := st.chat_input("Posez votre question technique..."):
+    # Shown now, written to the transcript once answered or failed (a refused question never is)
     st.session_state.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user"):
         st.markdown(prompt)
@@ -112,20 +126,38 @@ if prompt := st.chat_input("Posez votre question technique..."):
     with st.chat_message("assistant"):
         with st.spinner("♻️ Réflexion en cours..."):
             placeholder = st.empty()
-            response_text = ""
-            context = context_messages(prompt)
+            renderer = StreamRenderer(placeholder, cursor="🔲✨")
+
+            def show_wait(position, seconds):
+                placeholder.info(f"⏳ File d'attente : {position} requête(s) avant vous, ~{seconds:.0f} s")
 
             try:
-                for chunk in stream_response(context):
-                    if 'message' in chunk and 'content' in chunk['message']:
-                        content = chunk['message']['content']
-                        response_text += content
-                        placeholder.markdown(response_text + "🔲✨")
+                # First questions already answered for this persona skip the model entirely
+                cache = response_cache(st.session_state)
+                history = st.session_state.messages[:-1]
+                cached = cache.get(st.session_state.current_prompt, prompt, history)
+                if cached:
+                    for token in replay(cached):
+                        renderer.write(token)
+                else:
+                    # One turn on the local model at a time per slot, fair across engineers
+                    with llm_scheduler(st.session_state).slot(st.session_state.user_id, on_wait=show_wait):
+                        context = context_messages(prompt)
+                        for token in stream_response(context):
+                            renderer.write(token)
                 
                 # Remove the cursor indicator in the final display
-                placeholder.markdown(response_text)
-                st.session_state.messages.append({"role": "assistant", "content": response_text})
+                response_text = renderer.finish()
+                if not cached:
+                    cache.put(st.session_state.current_prompt, prompt, response_text, history)
+                transcripts.append(st.session_state.transcript_id, "user", prompt)
+                add_message("assistant", response_text)
+            except QueueFull:
+                # Not an answer: the question is dropped from the history, to be asked again
+                st.session_state.messages.pop()
+                placeholder.warning("🚦 Serveur occupé, trop de requêtes en attente. Réessayez dans quelques instants.")
             except Exception as e:
                 error_message = f"Erreur de connection à Ollama: {str(e)}"
                 placeholder.error(error_message)
-                st.session_state.messages.append({"role": "assistant", "content": error_message})
+                transcripts.append(st.session_state.transcript_id, "user", prompt)
+                add_message("assistant", error_message)
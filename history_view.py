@@ -0,0 +1,70 @@
+from typing import Dict, List, Optional
+
+import streamlit as st
+
+# Messages rendered on every rerun; older ones are paged on request
+DEFAULT_RECENT = 20
+DEFAULT_PAGE_SIZE = 20
+PREVIEW_CHARS = 60
+
+
+def preview(message: Dict[str, str]) -> str:
+    """First line of a message, shortened, to label a page of older messages"""
+    first_line = message["content"].strip().split("\n", 1)[0]
+    return first_line if len(first_line) <= PREVIEW_CHARS else first_line[:PREVIEW_CHARS] + "…"
+
+
+class HistoryView:
+    """
+    Chat history whose rendering cost does not grow with the session
+
+    The last `recent` messages are rendered on every rerun. Older ones sit
+    behind a page selector in a collapsed expander and only the selected
+    page is rendered. Messages are rendered as written, as the live chat
+    renders them.
+    """
+
+    def __init__(self, key: str = "history", recent: int = DEFAULT_RECENT,
+                 page_size: int = DEFAULT_PAGE_SIZE,
+                 older_label: str = "🕘 Messages précédents",
+                 page_label: str = "Messages {first}–{last}",
+                 hidden_label: str = "{count} messages masqués"):
+        self.key = key
+        self.recent = recent
+        self.page_size = page_size
+        self.older_label = older_label
+        self.page_label = page_label
+        self.hidden_label = hidden_label
+
+    def _render(self, messages, start: int, stop: int):
+        for message in messages[start:stop]:
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+
+    def _page_label(self, messages, page: Optional[int]) -> str:
+        if page is None:
+            return self.hidden_label.format(count=len(messages) - self.recent)
+        first = page * self.page_size
+        last = min(first + self.page_size, len(messages) - self.recent)
+        label = self.page_label.format(first=first + 1, last=last)
+        return f"{label} · {preview(messages[first])}"
+
+    def render(self, messages: List[Dict[str, str]]):
+        older = max(0, len(messages) - self.recent)
+        if older:
+            # Labels stay the same as the session grows, so Streamlit keeps
+            # the expander and the selected page across reruns
+            with st.expander(self.older_label):
+                pages = [None] + list(range((older + self.page_size - 1) // self.page_size))
+                page = st.selectbox(
+                    self.older_label,
+                    options=pages,
+                    format_func=lambda p: self._page_label(messages, p),
+                    key=f"{self.key}_page",
+                    label_visibility="collapsed",
+                )
+                if page is not None:
+                    start = page * self.page_size
+                    self._render(messages, start, min(start + self.page_size, older))
+
+        self._render(messages, older, len(messages))
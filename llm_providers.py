@@ -0,0 +1,336 @@
+import asyncio
+import hashlib
+import os
+import queue
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from metrics import metrics
+
+Message = Dict[str, str]
+
+# Seconds allowed for a whole call, and for the first token of an attempt
+DEFAULT_TIMEOUT = 120.0
+DEFAULT_FIRST_TOKEN_TIMEOUT = 30.0
+DEFAULT_RETRIES = 2
+
+
+@dataclass
+class CallMetrics:
+    """Latency record of one LLM call"""
+    provider: str
+    model: str
+    started: float
+    first_token_seconds: Optional[float] = None
+    duration_seconds: Optional[float] = None
+    tokens: int = 0
+    attempts: int = 0
+    error: Optional[str] = None
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        if self.first_token_seconds is None or not self.duration_seconds:
+            return None
+        generating = self.duration_seconds - self.first_token_seconds
+        return self.tokens / generating if generating > 0 else None
+
+
+def _export(record: CallMetrics):
+    """Publish a finished call to the process metrics (no-op unless enabled)"""
+    metrics.record_generation(record.provider, record.model, record.started, record.duration_seconds,
+                              record.first_token_seconds, record.tokens, record.error,
+                              attempts=record.attempts)
+
+
+# === Background event loop for the synchronous API ===
+# Streamlit scripts are synchronous; every provider runs on one shared loop so
+# its async HTTP client, and the connections it keeps alive, belong to a single loop
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-providers", daemon=True).start()
+        return _loop
+
+
+_DONE = object()
+
+
+class Provider:
+    """
+    Streaming chat completion backend
+
+    Subclasses implement _astream(). The base class adds an overall deadline,
+    a first-token timeout, retries with exponential backoff and full jitter
+    (only while nothing has been streamed yet), and records CallMetrics for
+    every call. stream() and complete() are synchronous wrappers for
+    Streamlit scripts.
+    """
+    name = "base"
+
+    def __init__(self, model: str, timeout: float = DEFAULT_TIMEOUT,
+                 first_token_timeout: float = DEFAULT_FIRST_TOKEN_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES, backoff_base: float = 0.5,
+                 backoff_cap: float = 8.0, metrics_size: int = 1000):
+        self.model = model
+        self.timeout = timeout
+        self.first_token_timeout = first_token_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.metrics = deque(maxlen=metrics_size)
+
+    async def _astream(self, messages: List[Message], model: str, **options) -> AsyncIterator[str]:
+        raise NotImplementedError
+        yield
+
+    def is_retryable(self, exc: BaseException) -> bool:
+        return isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError))
+
+    async def astream(self, messages: List[Message], model: Optional[str] = None,
+                      timeout: Optional[float] = None, **options) -> AsyncIterator[str]:
+        """
+        Stream the answer's text tokens
+
+        Args:
+            messages: Chat messages ({"role", "content"} dicts)
+            model: Model name (defaults to the provider's model)
+            timeout: Deadline for the whole call in seconds
+            options: temperature, top_p, max_tokens
+        """
+        loop = asyncio.get_running_loop()
+        model = model or self.model
+        deadline = loop.time() + (timeout or self.timeout)
+        record = CallMetrics(self.name, model, time.time())
+        self.metrics.append(record)
+        start = time.perf_counter()
+        try:
+            while True:
+                record.attempts += 1
+                stream = self._astream(messages, model, **options)
+                try:
+                    while True:
+                        remaining = deadline - loop.time()
+                        if remaining <= 0:
+                            raise asyncio.TimeoutError(f"{self.name} call exceeded its deadline")
+                        if not record.tokens:
+                            remaining = min(remaining, self.first_token_timeout)
+                        try:
+                            token = await asyncio.wait_for(stream.__anext__(), remaining)
+                        except StopAsyncIteration:
+                            return
+                        if not token:
+                            continue
+                        if not record.tokens:
+                            record.first_token_seconds = time.perf_counter() - start
+                        record.tokens += 1
+                        yield token
+                except Exception as exc:
+                    # A partial answer has been shown already, so it cannot be retried
+                    if record.tokens or record.attempts > self.retries or not self.is_retryable(exc):
+                        raise
+                    delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** (record.attempts - 1)))
+                    if loop.time() + delay >= deadline:
+                        raise
+                    await asyncio.sleep(delay)
+                finally:
+                    await stream.aclose()
+        except (asyncio.CancelledError, GeneratorExit):
+            record.error = "cancelled"
+            raise
+        except Exception as exc:
+            record.error = type(exc).__name__
+            raise
+        finally:
+            record.duration_seconds = time.perf_counter() - start
+            _export(record)
+
+    async def acomplete(self, messages: List[Message], **options) -> str:
+        return "".join([token async for token in self.astream(messages, **options)])
+
+    def stream(self, messages: List[Message], **options) -> Iterator[str]:
+        """Synchronous astream(); stopping the iteration cancels the call"""
+        tokens = queue.Queue()
+        # The call runs on the background loop; keep it in the caller's trace
+        parent = metrics.current()
+
+        async def pump():
+            metrics.attach(parent)
+            try:
+                async for token in self.astream(messages, **options):
+                    tokens.put(token)
+            except BaseException as exc:
+                tokens.put(exc)
+            finally:
+                tokens.put(_DONE)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), background_loop())
+        try:
+            while True:
+                item = tokens.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def complete(self, messages: List[Message], **options) -> str:
+        return "".join(self.stream(messages, **options))
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """Summary of the recorded calls"""
+        calls = list(self.metrics)
+        done = [c for c in calls if c.duration_seconds is not None]
+        first = sorted(c.first_token_seconds for c in done if c.first_token_seconds is not None)
+        rates = [c.tokens_per_second for c in done if c.tokens_per_second]
+
+        def percentile(values, q):
+            return round(values[min(len(values) - 1, int(q * len(values)))], 3) if values else None
+
+        return {
+            "calls": len(done),
+            "errors": sum(1 for c in done if c.error),
+            "retries": sum(c.attempts - 1 for c in done),
+            "first_token_p50_s": percentile(first, 0.5),
+            "first_token_p95_s": percentile(first, 0.95),
+            "tokens_per_second": round(statistics.mean(rates), 1) if rates else None,
+        }
+
+
+class GroqProvider(Provider):
+    """Groq chat completions over one keep-alive AsyncGroq client"""
+    name = "groq"
+
+    def __init__(self, api_key: Optional[str] = None, model: str = "llama-3.1-8b-instant", **kwargs):
+        super().__init__(model, **kwargs)
+        self.api_key = api_key or os.environ.get("GROQ_API_KEY")
+        self._client = None
+
+    @property
+    def client(self):
+        # Created lazily on the loop that will use it; retries are handled here
+        if self._client is None:
+            from groq import AsyncGroq
+            self._client = AsyncGroq(api_key=self.api_key, max_retries=0, timeout=self.timeout)
+        return self._client
+
+    def is_retryable(self, exc):
+        import groq
+        return super().is_retryable(exc) or isinstance(
+            exc, (groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError))
+
+    async def _astream(self, messages, model, temperature=None, top_p=None, max_tokens=None):
+        options = {"temperature": temperature, "top_p": top_p, "max_completion_tokens": max_tokens}
+        stream = await self.client.chat.completions.create(
+            messages=messages, model=model, stream=True,
+            **{key: value for key, value in options.items() if value is not None},
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class OllamaProvider(Provider):
+    """Local Ollama chat over one keep-alive AsyncClient"""
+    name = "ollama"
+
+    def __init__(self, host: str = "http://127.0.0.1:11434", model: str = "gemma3:4b", **kwargs):
+        super().__init__(model, **kwargs)
+        self.host = os.environ.get("OLLAMA_HOST", host)
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from ollama import AsyncClient
+            self._client = AsyncClient(host=self.host)
+        return self._client
+
+    def is_retryable(self, exc):
+        import httpx
+        from ollama import ResponseError
+        if isinstance(exc, ResponseError):
+            return exc.status_code == 429 or exc.status_code >= 500
+        return super().is_retryable(exc) or isinstance(exc, httpx.TransportError)
+
+    async def _astream(self, messages, model, temperature=None, top_p=None, max_tokens=None):
+        options = {"temperature": temperature, "top_p": top_p, "num_predict": max_tokens}
+        stream = await self.client.chat(
+            model=model, messages=messages, stream=True,
+            options={key: value for key, value in options.items() if value is not None},
+        )
+        async for chunk in stream:
+            content = chunk["message"]["content"]
+            if content:
+                yield content
+
+
+class FakeProvider(Provider):
+    """
+    Local backend streaming canned answers, for tests and load tests without a network
+
+    The answer is picked from responses by a hash of the last message, and
+    streamed word by word after first_token_latency at tokens_per_second.
+    fail_rate makes that fraction of attempts fail with a retryable error.
+    """
+    name = "fake"
+
+    RESPONSES = (
+        "Voici la procédure : vérifiez l'état du service, consultez les journaux, puis redémarrez-le si nécessaire.",
+        "Je n'ai pas assez d'informations pour répondre ; précisez l'environnement et le message d'erreur.",
+        "Pour déployer, validez le plan Terraform, appliquez-le, puis contrôlez la supervision.",
+    )
+
+    def __init__(self, model: str = "fake", tokens_per_second: float = 50.0,
+                 first_token_latency: float = 0.2, responses=None, fail_rate: float = 0.0,
+                 seed: Optional[int] = None, **kwargs):
+        super().__init__(model, **kwargs)
+        self.tokens_per_second = tokens_per_second
+        self.first_token_latency = first_token_latency
+        self.responses = tuple(responses or self.RESPONSES)
+        self.fail_rate = fail_rate
+        self._random = random.Random(seed)
+
+    async def _astream(self, messages, model, max_tokens=None, **options):
+        if self.fail_rate and self._random.random() < self.fail_rate:
+            raise ConnectionError("fake provider failure")
+        prompt = messages[-1]["content"] if messages else ""
+        digest = int(hashlib.sha1(prompt.encode("utf-8")).hexdigest(), 16)
+        words = self.responses[digest % len(self.responses)].split(" ")
+        await asyncio.sleep(self.first_token_latency)
+        for i, word in enumerate(words[:max_tokens]):
+            if i and self.tokens_per_second:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            yield word if i == 0 else " " + word
+
+
+PROVIDERS = {"groq": GroqProvider, "ollama": OllamaProvider, "fake": FakeProvider}
+
+
+def get_provider(name: Optional[str] = None, **configs) -> Provider:
+    """
+    Build the provider selected by name or $LLM_PROVIDER
+
+    Args:
+        name: "groq", "ollama" or "fake"; defaults to $LLM_PROVIDER, else the
+            first provider configured
+        configs: Constructor arguments per provider name, e.g.
+            groq={"api_key": ..., "model": ...}, ollama={"model": ...}
+    """
+    name = name or os.environ.get("LLM_PROVIDER") or next(iter(configs), "fake")
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider {name!r}, expected one of {', '.join(PROVIDERS)}")
+    return PROVIDERS[name](**configs.get(name, {}))
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, Optional
+
+from metrics import metrics
+
+# Concurrent requests the local model handles best; more only thrash its CPU
+DEFAULT_MAX_IN_FLIGHT = int(os.environ.get("LLM_MAX_IN_FLIGHT", "2"))
+# Initial guess of a request's duration, refined as requests complete
+DEFAULT_SERVICE_SECONDS = 20.0
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Ticket:
+    def __init__(self, user: Hashable):
+        self.user = user
+        self.enqueued = time.monotonic()
+        self.granted_at = None
+        self.granted = threading.Event()
+        self.cancelled = False
+
+
+class FairScheduler:
+    """
+    Admission control in front of a shared model
+
+    At most max_in_flight requests run at once. Waiting requests are queued
+    per user and granted round-robin across users, so one user sending a
+    burst cannot starve the others. Waiters get their queue position and an
+    estimated wait, and leaving the queue (e.g. the page was closed) frees
+    their place. Queue waits, queue length and outcomes are reported to
+    the process metrics, labelled with the backend name.
+    """
+
+    def __init__(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, max_queue: int = 100,
+                 service_seconds: float = DEFAULT_SERVICE_SECONDS, backend: str = "ollama"):
+        self.backend = backend
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max_queue
+        self.service_seconds = service_seconds
+        self.in_flight = 0
+        self.completed = 0
+        self.cancelled = 0
+        # User -> waiting tickets; key order is the round-robin order
+        self._queues: "OrderedDict[Hashable, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, user: Hashable) -> Ticket:
+        ticket = Ticket(user)
+        with self._lock:
+            if self.waiting() >= self.max_queue:
+                metrics.incr("llm_scheduler_requests_total", backend=self.backend, outcome="rejected")
+                raise QueueFull("Too many requests waiting for the model")
+            self._queues.setdefault(user, deque()).append(ticket)
+            self._dispatch()
+        return ticket
+
+    def waiting(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _dispatch(self):
+        while self.in_flight < self.max_in_flight and self._queues:
+            user, tickets = next(iter(self._queues.items()))
+            ticket = tickets.popleft()
+            # The user goes to the back of the rotation
+            del self._queues[user]
+            if tickets:
+                self._queues[user] = tickets
+            self.in_flight += 1
+            ticket.granted_at = time.monotonic()
+            ticket.granted.set()
+            metrics.observe("llm_scheduler_wait_seconds", ticket.granted_at - ticket.enqueued,
+                            backend=self.backend)
+        metrics.gauge("llm_scheduler_in_flight", self.in_flight, backend=self.backend)
+        metrics.gauge("llm_scheduler_waiting", self.waiting(), backend=self.backend)
+
+    def position(self, ticket: Ticket) -> int:
+        """Number of queued requests that will be granted before this one"""
+        with self._lock:
+            if ticket.granted.is_set() or ticket.user not in self._queues:
+                return 0
+            rank = list(self._queues[ticket.user]).index(ticket)
+            before = rank
+            for user, tickets in self._queues.items():
+                if user == ticket.user:
+                    continue
+                # Users ahead in the rotation get one more turn in our round
+                ahead = list(self._queues).index(user) < list(self._queues).index(ticket.user)
+                before += min(len(tickets), rank + ahead)
+            return before
+
+    def estimated_wait(self, position: int) -> float:
+        """Seconds until a request at this queue position starts"""
+        return (position // self.max_in_flight + (self.in_flight >= self.max_in_flight)) * self.service_seconds
+
+    def release(self, ticket: Ticket):
+        """Give back a slot, or leave the queue if the request never started"""
+        with self._lock:
+            if ticket.granted.is_set():
+                self.in_flight -= 1
+                if ticket.cancelled:
+                    self.cancelled += 1
+                    outcome = "cancelled"
+                else:
+                    outcome = "completed"
+                    self.completed += 1
+                    # Moving average of the service time, for wait estimates
+                    duration = time.monotonic() - ticket.granted_at
+                    self.service_seconds = 0.8 * self.service_seconds + 0.2 * duration
+            else:
+                tickets = self._queues.get(ticket.user)
+                if tickets and ticket in tickets:
+                    tickets.remove(ticket)
+                    if not tickets:
+                        del self._queues[ticket.user]
+                self.cancelled += 1
+                outcome = "left_queue"
+            metrics.incr("llm_scheduler_requests_total", backend=self.backend, outcome=outcome)
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, user: Hashable, on_wait: Optional[Callable[[int, float], None]] = None,
+             poll_interval: float = 1.0):
+        """
+        Wait for a turn, then hold a slot for the duration of the block
+
+        on_wait(position, estimated_seconds) is called while queued. If the
+        caller goes away (an exception while waiting or inside the block),
+        the place or slot is given back immediately.
+        """
+        ticket = self.submit(user)
+        try:
+            while not ticket.granted.is_set():
+                if on_wait:
+                    position = self.position(ticket)
+                    on_wait(position, self.estimated_wait(position))
+                ticket.granted.wait(poll_interval)
+            yield ticket
+        except BaseException:
+            ticket.cancelled = True
+            raise
+        finally:
+            self.release(ticket)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "waiting": self.waiting(),
+                "users_waiting": len(self._queues),
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "service_seconds": round(self.service_seconds, 2),
+            }
@@ -0,0 +1,422 @@
+import atexit
+import contextvars
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+# Histogram upper bounds: seconds, from index lookups to long generations
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Tokens per second of a generation
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+# Seconds between two writes of the metrics file and trace log
+EXPORT_INTERVAL = 5.0
+
+# (trace_id, span_id) of the span the current code runs in
+_current = contextvars.ContextVar("metrics_span", default=None)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "labels", "attrs", "trace_id", "span_id", "parent_id",
+                 "wall_start", "start", "token")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.attrs = {}
+
+    def __enter__(self):
+        parent = _current.get()
+        self.trace_id, self.parent_id = parent if parent else (uuid.uuid4().hex[:16], None)
+        self.span_id = uuid.uuid4().hex[:16]
+        self.token = _current.set((self.trace_id, self.span_id))
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _current.reset(self.token)
+        self.metrics.record(self.name, self.wall_start, duration, self.labels, self.attrs,
+                            error=exc_type.__name__ if exc_type else None,
+                            ids=(self.trace_id, self.span_id, self.parent_id))
+        return False
+
+    def set(self, **attrs):
+        """Attach attributes (counts, sizes) written to the trace only, not used as labels"""
+        self.attrs.update(attrs)
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def _label_text(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """
+    Latency spans and counters, exported as Prometheus text and a JSONL trace
+
+    Disabled (the default), span() returns a shared no-op context manager and
+    observe()/incr() return at once, so instrumented code costs one attribute
+    check. Enabled, every span feeds the span_duration_seconds histogram,
+    labelled by span name and its labels, and is appended to the trace log
+    with its trace id and parent span; nested spans share their trace id.
+
+    The metrics file, trace log and HTTP endpoint start with the first
+    recorded value (or start()), never at import and never in a child
+    process such as a PDF extraction worker.
+    """
+
+    def __init__(self, enabled: bool = False, trace_path: Optional[str] = None,
+                 buckets: Optional[Dict[str, tuple]] = None, export_path: Optional[str] = None,
+                 port: Optional[int] = None):
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self.export_path = export_path
+        self.port = port
+        self.buckets = {"llm_tokens_per_second": RATE_BUCKETS}
+        self.buckets.update(buckets or {})
+        self._histograms: Dict[str, Dict[tuple, _Histogram]] = {}
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._gauges: Dict[str, Dict[tuple, float]] = {}
+        self._trace = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+        self._started = False
+
+    @classmethod
+    def from_env(cls):
+        """
+        Metrics configured from the environment
+
+        $METRICS_FILE (Prometheus text file), $METRICS_PORT (HTTP /metrics
+        endpoint) and $METRICS_TRACE_FILE (JSONL trace log) each enable
+        collection; $METRICS_ENABLED=1 collects in memory only.
+        """
+        path = os.environ.get("METRICS_FILE")
+        port = os.environ.get("METRICS_PORT")
+        trace_path = os.environ.get("METRICS_TRACE_FILE")
+        enabled = bool(path or port or trace_path) or os.environ.get("METRICS_ENABLED", "") not in ("", "0")
+        return cls(enabled=enabled, trace_path=trace_path, export_path=path,
+                   port=int(port) if port else None)
+
+    def start(self):
+        """
+        Start the configured exporters, once per process
+
+        Does nothing in a child process: workers re-import this module, and
+        would otherwise all bind the same port and append to the same files.
+        """
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        if multiprocessing.parent_process() is not None:
+            return
+        if self.port:
+            self.serve(self.port)
+        if self.export_path or self.trace_path:
+            self.start_export(self.export_path)
+
+    # === Recording ===
+
+    def span(self, name: str, **labels):
+        """Context manager timing a block; labels should have few distinct values"""
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, name, labels)
+
+    def traced(self, name: Optional[str] = None, **labels) -> Callable:
+        """Decorator running each call of a function in a span"""
+        def decorate(fn):
+            span_name = name or fn.__qualname__
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with _Span(self, span_name, labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def current(self) -> Optional[Tuple[str, str]]:
+        """(trace_id, span_id) of the enclosing span, to continue a trace in another thread"""
+        return _current.get()
+
+    def attach(self, parent: Optional[Tuple[str, str]]):
+        """Make spans started from here on children of parent (see current())"""
+        if parent is not None:
+            _current.set(parent)
+
+    def observe(self, metric: str, value: float, **labels):
+        """Add a value to a histogram"""
+        if not self.enabled or value is None:
+            return
+        if not self._started:
+            self.start()
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(metric, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self.buckets.get(metric, SECONDS_BUCKETS))
+            histogram.observe(value)
+
+    def incr(self, metric: str, value: float = 1.0, **labels):
+        """Add to a counter"""
+        if not self.enabled:
+            return
+        if not self._started:
+            self.start()
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(metric, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def gauge(self, metric: str, value: float, **labels):
+        """Set a value that goes up and down, e.g. a queue length"""
+        if not self.enabled:
+            return
+        if not self._started:
+            self.start()
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._gauges.setdefault(metric, {})[key] = value
+
+    def record(self, name: str, start: float, duration: float, labels: Optional[dict] = None,
+               attrs: Optional[dict] = None, error: Optional[str] = None, ids: Optional[tuple] = None):
+        """
+        Record a finished span
+
+        Used by span() and directly for work timed elsewhere, such as LLM
+        calls measured by the providers.
+
+        Args:
+            name: Span name, e.g. "rag.embed"
+            start: Wall-clock start time (time.time())
+            duration: Duration in seconds
+            labels: Prometheus labels of the span
+            attrs: Extra attributes written to the trace only
+            error: Exception type name if the work failed
+            ids: (trace_id, span_id, parent_id); defaults to a child of the current span
+        """
+        if not self.enabled:
+            return
+        labels = labels or {}
+        self.observe("span_duration_seconds", duration, span=name, **labels)
+        if error:
+            self.incr("span_errors_total", span=name, error=error)
+        if self.trace_path is None:
+            return
+        if ids is None:
+            parent = _current.get()
+            trace_id, parent_id = parent if parent else (uuid.uuid4().hex[:16], None)
+            ids = (trace_id, uuid.uuid4().hex[:16], parent_id)
+        line = json.dumps({
+            "trace_id": ids[0],
+            "span_id": ids[1],
+            "parent_id": ids[2],
+            "name": name,
+            "start": round(start, 6),
+            "duration_s": round(duration, 6),
+            "labels": labels,
+            "attrs": attrs or {},
+            "error": error,
+        }, ensure_ascii=False, default=str)
+        with self._lock:
+            self._trace.append(line + "\n")
+
+    def record_generation(self, provider: str, model: str, start: float, duration: float,
+                          first_token: Optional[float], tokens: int, error: Optional[str] = None,
+                          **attrs):
+        """
+        Record one LLM generation: time to first token, tokens/s and total time
+
+        Args:
+            provider: Backend name, e.g. "groq"
+            model: Model name
+            start: Wall-clock start time (time.time())
+            duration: Total generation time in seconds
+            first_token: Seconds until the first token, None if none came
+            tokens: Number of tokens (stream chunks) received
+            error: Exception type name if the call failed
+            attrs: Extra attributes written to the trace only
+        """
+        if not self.enabled:
+            return
+        labels = {"provider": provider, "model": model}
+        generating = duration - first_token if first_token is not None else 0
+        rate = tokens / generating if generating > 0 else None
+        self.incr("llm_calls_total", outcome=error or "ok", **labels)
+        self.incr("llm_tokens_total", tokens, **labels)
+        self.observe("llm_generation_seconds", duration, **labels)
+        self.observe("llm_time_to_first_token_seconds", first_token, **labels)
+        self.observe("llm_tokens_per_second", rate, **labels)
+        self.record("llm.call", start, duration, labels, error=error, attrs=dict(
+            attrs, first_token_s=first_token, tokens=tokens, tokens_per_s=rate
+        ))
+
+    def timed_stream(self, tokens: Iterator[str], provider: str, model: str) -> Iterator[str]:
+        """Pass a token stream through, recording it with record_generation()"""
+        if not self.enabled:
+            yield from tokens
+            return
+        start, began = time.time(), time.perf_counter()
+        first_token, count, error = None, 0, None
+        try:
+            for token in tokens:
+                if first_token is None:
+                    first_token = time.perf_counter() - began
+                count += 1
+                yield token
+        except BaseException as exc:
+            error = "cancelled" if isinstance(exc, GeneratorExit) else type(exc).__name__
+            raise
+        finally:
+            self.record_generation(provider, model, start, time.perf_counter() - began,
+                                   first_token, count, error)
+
+    # === Export ===
+
+    def prometheus_text(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for metric, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in series.items():
+                    lines.append(f"{metric}{_label_text(key)} {value:g}")
+            for metric, series in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {metric} gauge")
+                for key, value in series.items():
+                    lines.append(f"{metric}{_label_text(key)} {value:g}")
+            for metric, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {metric} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        le = 'le="%g"' % bound
+                        lines.append(f"{metric}_bucket{_label_text(key, le)} {cumulative}")
+                    le = 'le="+Inf"'
+                    lines.append(f"{metric}_bucket{_label_text(key, le)} {histogram.count}")
+                    lines.append(f"{metric}_sum{_label_text(key)} {histogram.sum:.6f}")
+                    lines.append(f"{metric}_count{_label_text(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Write the metrics file atomically, for node_exporter's textfile collector"""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def flush_trace(self):
+        with self._lock:
+            lines, self._trace = self._trace, []
+        if lines and self.trace_path:
+            with open(self.trace_path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+
+    def start_export(self, path: Optional[str] = None, interval: float = EXPORT_INTERVAL):
+        """Write the metrics file (if any) and the trace log every interval seconds, in background"""
+        def run():
+            while not self._stop.wait(interval):
+                self._export(path)
+
+        self._thread = threading.Thread(target=run, name="metrics-export", daemon=True)
+        self._thread.start()
+        atexit.register(self._export, path)
+
+    def _export(self, path):
+        self.flush_trace()
+        if path:
+            self.write_prometheus(path)
+
+    def serve(self, port: int, host: str = "0.0.0.0"):
+        """Serve GET /metrics over HTTP from a background thread"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        return self._server
+
+    def close(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+        self.flush_trace()
+
+
+# === Metrics shared by the whole process ===
+# Exporters start with the first recorded value, in the server process only
+metrics = Metrics.from_env()
+span = metrics.span
+traced = metrics.traced
+observe = metrics.observe
+incr = metrics.incr
+gauge = metrics.gauge
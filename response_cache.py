@@ -0,0 +1,173 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from metrics import metrics
+
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MAX_ENTRIES = 2000
+# Cosine similarity above which two questions are taken to be the same
+DEFAULT_THRESHOLD = 0.93
+# Shorter questions are usually too vague to share, even as a first turn
+MIN_WORDS = 4
+
+Embedder = Callable[[List[str]], List[List[float]]]
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, accent-insensitive form of a question with punctuation and spacing collapsed"""
+    text = unicodedata.normalize("NFKD", question.lower().replace("œ", "oe").replace("æ", "ae"))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"[^\w./:-]+", " ", text).strip(" .:-")
+
+
+@lru_cache(maxsize=1024)
+def persona_key(system_prompt: str) -> str:
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def replay(answer: str) -> Iterator[str]:
+    """Stream a cached answer word by word through the normal rendering path"""
+    for token in re.findall(r"\s*\S+", answer):
+        yield token
+
+
+def ollama_embedder(model: str, host: str = "http://127.0.0.1:11434") -> Embedder:
+    from ollama import Client
+    client = Client(host=os.environ.get("OLLAMA_HOST", host))
+    return lambda texts: client.embed(model=model, input=texts)["embeddings"]
+
+
+class _Entry:
+    __slots__ = ("answer", "created", "persona", "vector")
+
+    def __init__(self, answer, persona, vector):
+        self.answer = answer
+        self.created = time.time()
+        self.persona = persona
+        self.vector = vector
+
+
+class ResponseCache:
+    """
+    Answers to standalone questions, shared by all users of a persona
+
+    Entries are keyed by a hash of the system prompt plus the normalized
+    question, expire after ttl seconds and are evicted least recently used
+    first. With an embedder, a question missing exactly is also matched to
+    the most similar cached question of the same persona above threshold.
+
+    Only the first question of a conversation is looked up or stored: a
+    later answer depends on the asker's history (which may hold pasted logs
+    or secrets) and must not be replayed to another user.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL,
+                 embed: Optional[Embedder] = None, threshold: float = DEFAULT_THRESHOLD,
+                 min_words: int = MIN_WORDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embed = embed
+        self.threshold = threshold
+        self.min_words = min_words
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Cache with semantic matching when $RESPONSE_CACHE_EMBED_MODEL names an Ollama embedding model"""
+        model = os.environ.get("RESPONSE_CACHE_EMBED_MODEL")
+        return cls(embed=ollama_embedder(model) if model else None, **kwargs)
+
+    def cacheable(self, question: str, history: Sequence = ()) -> bool:
+        """Whether a question asked after history (prior messages or summary) may be shared"""
+        return not history and len(normalize_question(question).split()) >= self.min_words
+
+    def _vector(self, question):
+        if self.embed is None:
+            return None
+        try:
+            vector = np.asarray(self.embed([question])[0], dtype=np.float32)
+        except Exception:
+            return None  # Exact matching still works without the embedder
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _expired(self, entry):
+        return self.ttl and time.time() - entry.created > self.ttl
+
+    def get(self, system_prompt: str, question: str, history: Sequence) -> Optional[str]:
+        """Cached answer for the question under this persona, if any (history: see cacheable)"""
+        if not self.cacheable(question, history):
+            return None
+        persona = persona_key(system_prompt)
+        key = (persona, normalize_question(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.incr("response_cache_lookups_total", outcome="hit")
+                return entry.answer
+            if self.embed is None:
+                self.misses += 1
+                metrics.incr("response_cache_lookups_total", outcome="miss")
+                return None
+
+        vector = self._vector(question)
+        with self._lock:
+            candidates = [(k, e) for k, e in self._entries.items()
+                          if e.persona == persona and e.vector is not None and not self._expired(e)]
+            if vector is not None and candidates:
+                similarities = np.stack([e.vector for _, e in candidates]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self._entries.move_to_end(candidates[best][0])
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    metrics.incr("response_cache_lookups_total", outcome="semantic_hit")
+                    return candidates[best][1].answer
+            self.misses += 1
+            metrics.incr("response_cache_lookups_total", outcome="miss")
+            return None
+
+    def put(self, system_prompt: str, question: str, answer: str, history: Sequence):
+        """Store a complete answer (empty answers are not cached; history: see cacheable)"""
+        if not answer.strip() or not self.cacheable(question, history):
+            return
+        persona = persona_key(system_prompt)
+        entry = _Entry(answer, persona, self._vector(question))
+        with self._lock:
+            key = (persona, normalize_question(question))
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+                metrics.incr("response_cache_evictions_total")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
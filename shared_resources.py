@@ -0,0 +1,267 @@
+import hashlib
+import os
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Seconds between two health checks of the same resource
+HEALTH_CHECK_INTERVAL = 30.0
+
+
+class _Entry:
+    def __init__(self, factory: Callable[[], Any],
+                 health_check: Optional[Callable[[Any], Any]]):
+        self.value = None
+        self.factory = factory
+        self.health_check = health_check
+        self.refs = 0
+        self.healthy = True
+        self.rebuilding = False
+        self.checked_at = time.monotonic()
+        self.created_at = time.time()
+        # Set once the first build finished, successfully or not
+        self.ready = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class Lease:
+    """One reference on a shared resource, released when the lease is garbage collected"""
+
+    def __init__(self, pool: "SharedResources", key: Hashable):
+        self.key = key
+        self._pool = pool
+        self._finalizer = weakref.finalize(self, pool.release, key)
+
+    @property
+    def value(self) -> Any:
+        # Read through the pool so a resource rebuilt after a failed health check is picked up
+        return self._pool.get(self.key)
+
+    def release(self):
+        self._finalizer()
+
+
+class SharedResources:
+    """
+    Pool of thread-safe clients and engines shared by every session of the process
+
+    Each resource is built once per key and reference-counted; it is closed
+    when the last reference is released. Health checks run at most once per
+    health_check_interval, on acquire and on every read through get() (so
+    through Lease.value), and a resource whose check raises is rebuilt.
+    Resources are built outside the pool lock: a slow factory only delays
+    the sessions waiting for that same key.
+    """
+
+    def __init__(self, health_check_interval: float = HEALTH_CHECK_INTERVAL):
+        self.health_check_interval = health_check_interval
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._lock = threading.RLock()
+
+    def acquire(self, key: Hashable, factory: Callable[[], Any],
+                health_check: Optional[Callable[[Any], Any]] = None) -> Any:
+        """Return the resource for key, building it if needed, and take a reference on it"""
+        with self._lock:
+            entry = self._entries.get(key)
+            building = entry is None
+            if building:
+                entry = self._entries[key] = _Entry(factory, health_check)
+            entry.refs += 1
+        if building:
+            try:
+                entry.value = factory()
+            except BaseException as error:
+                with self._lock:
+                    del self._entries[key]
+                entry.error = error
+                raise
+            finally:
+                entry.ready.set()
+        else:
+            entry.ready.wait()
+            if entry.error is not None:
+                # The build failed in another session: try again on a new entry
+                return self.acquire(key, factory, health_check)
+        return self._current(key, entry)
+
+    def lease(self, key: Hashable, factory: Callable[[], Any],
+              health_check: Optional[Callable[[Any], Any]] = None) -> Lease:
+        """Acquire a resource and return a Lease holding the reference"""
+        self.acquire(key, factory, health_check)
+        return Lease(self, key)
+
+    def get(self, key: Hashable) -> Any:
+        """Return the resource for key, rebuilt first if its health check fails"""
+        with self._lock:
+            entry = self._entries[key]
+        entry.ready.wait()
+        return self._current(key, entry)
+
+    def _current(self, key: Hashable, entry: _Entry) -> Any:
+        # Health checks may do network I/O, so they run outside the pool lock
+        if not self._check(entry):
+            self._rebuild(key, entry)
+        return entry.value
+
+    def release(self, key: Hashable):
+        """Drop one reference; the resource is closed once nobody holds it"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refs -= 1
+            if entry.refs > 0:
+                return
+            del self._entries[key]
+        self._close(entry.value)
+
+    def _check(self, entry: _Entry, force: bool = False) -> bool:
+        if entry.health_check is None:
+            return True
+        now = time.monotonic()
+        if not force and entry.healthy and now - entry.checked_at < self.health_check_interval:
+            return True
+        entry.checked_at = now
+        try:
+            entry.health_check(entry.value)
+            entry.healthy = True
+        except Exception:
+            entry.healthy = False
+        return entry.healthy
+
+    def _rebuild(self, key: Hashable, entry: _Entry):
+        with self._lock:
+            if entry.healthy or entry.rebuilding or self._entries.get(key) is not entry:
+                return  # Another thread already rebuilt it, or is rebuilding it
+            entry.rebuilding = True
+        try:
+            value = entry.factory()
+        finally:
+            entry.rebuilding = False
+        with self._lock:
+            if self._entries.get(key) is entry:
+                value, entry.value = entry.value, value
+                entry.healthy = True
+                entry.checked_at = time.monotonic()
+        # The stale resource, or the new one if the entry was released meanwhile
+        self._close(value)
+
+    @staticmethod
+    def _close(value: Any):
+        close = getattr(value, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception:
+                pass
+
+    def health(self) -> Dict[str, Dict[str, Any]]:
+        """Run every health check now and report references and status per resource"""
+        with self._lock:
+            entries = [(key, entry) for key, entry in self._entries.items() if entry.ready.is_set()]
+        return {
+            str(key): {
+                "refs": entry.refs,
+                "healthy": self._check(entry, force=True),
+                "age_seconds": round(time.time() - entry.created_at, 1),
+            }
+            for key, entry in entries
+        }
+
+
+# === Pool shared by all the sessions of the Streamlit server ===
+resources = SharedResources()
+
+
+def session_resource(session_state, key: Hashable, factory: Callable[[], Any],
+                     health_check: Optional[Callable[[Any], Any]] = None) -> Any:
+    """
+    Get a shared resource on behalf of a Streamlit session
+
+    The session keeps one lease per resource in its state, so it holds a
+    single reference however often the script reruns, released when the
+    session ends and its state is garbage collected.
+    """
+    return session_lease(session_state, key, factory, health_check).value
+
+
+def session_lease(session_state, key: Hashable, factory: Callable[[], Any],
+                  health_check: Optional[Callable[[Any], Any]] = None) -> Lease:
+    """
+    Lease on a shared resource held by a Streamlit session
+
+    Reading lease.value on each use picks up a resource rebuilt after a
+    failed health check, where a reference kept to the value itself would
+    go on using the closed one.
+    """
+    leases = session_state.setdefault("_shared_leases", {})
+    lease = leases.get(key)
+    if lease is None:
+        lease = leases[key] = resources.lease(key, factory, health_check)
+    return lease
+
+
+def release_session_lease(session_state, key: Hashable):
+    """Give back a session's reference on a resource it no longer uses (e.g. another tenant's engine)"""
+    lease = session_state.get("_shared_leases", {}).pop(key, None)
+    if lease is not None:
+        lease.release()
+
+
+def secret_key(kind: str, secret: Optional[str]) -> tuple:
+    """Pool key for a client built from a secret, without keeping the secret itself in the key"""
+    return (kind, hashlib.sha256((secret or "").encode("utf-8")).hexdigest()[:16])
+
+
+# === Shared clients ===
+# Imports are local: each app only installs the clients it uses.
+
+def groq_client(session_state, api_key: str):
+    from groq import Groq
+    return session_resource(session_state, secret_key("groq", api_key),
+                            lambda: Groq(api_key=api_key))
+
+
+def cohere_client(session_state, api_key: str):
+    import cohere
+    return session_resource(session_state, secret_key("cohere", api_key),
+                            lambda: cohere.Client(api_key=api_key))
+
+
+def mongo_client(session_state, uri: str):
+    from pymongo import MongoClient
+    return session_resource(session_state, secret_key("mongodb", uri),
+                            lambda: MongoClient(uri),
+                            health_check=lambda client: client.admin.command("ping"))
+
+
+def llm_provider(session_state, name: Optional[str] = None, **configs):
+    """
+    Shared LLM provider, chosen by name or $LLM_PROVIDER (see llm_providers.get_provider)
+
+    Args:
+        configs: Constructor arguments per provider name
+    """
+    from llm_providers import get_provider
+    name = name or os.environ.get("LLM_PROVIDER") or next(iter(configs), "fake")
+    return session_resource(session_state, secret_key("llm", f"{name}:{configs.get(name)!r}"),
+                            lambda: get_provider(name, **configs))
+
+
+def response_cache(session_state):
+    """Shared ResponseCache, semantic when $RESPONSE_CACHE_EMBED_MODEL is set"""
+    from response_cache import ResponseCache
+    return session_resource(session_state, ("response_cache",), ResponseCache.from_env)
+
+
+def llm_scheduler(session_state, backend: str = "ollama", **options):
+    """Shared FairScheduler admitting requests to one model backend"""
+    from llm_scheduler import FairScheduler
+    return session_resource(session_state, ("scheduler", backend), lambda: FairScheduler(backend=backend, **options))
+
+
+def transcript_store(session_state):
+    """Shared TranscriptStore writing every session's transcript in the background"""
+    from transcript_store import TranscriptStore
+    return session_resource(session_state, ("transcript_store",), TranscriptStore)
@@ -1,17 +1,20 @@
 import os
 import streamlit as st
-import json
-import datetime
 import uuid
-from typing import List, Dict, Any, Optional, Union
-from llama_index.core import SimpleDirectoryReader, ServiceContext, Response
-from llama_index.core.chat_engine import SimpleChatEngine
-from llama_index.core.memory import ChatMemoryBuffer
-from llama_index.llms.groq import Groq
+from typing import List, Dict, Any, Optional
+from chat_history import HistoryWindow, llm_summarizer
+from response_cache import replay
+from shared_resources import llm_provider, response_cache, transcript_store
+from stream_render import StreamRenderer
+from history_view import HistoryView
+from user_registry import registry
 
 # Initialize session state variables if they don't exist
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "history_view" not in st.session_state:
+    # Recent messages eagerly, older ones paged on request
+    st.session_state.history_view = HistoryView(older_label="🕘 Earlier messages", hidden_label="{count} messages hidden")
 
 if "chat_engine" not in st.session_state:
     st.session_state.chat_engine = None
@@ -22,85 +25,65 @@ if "authenticated_user" not in st.session_state:
 if "is_authenticated" not in st.session_state:
     st.session_state.is_authenticated = False
     
-# Add timestamps to messages if not present
-if "message_timestamps" not in st.session_state:
-    st.session_state.message_timestamps = []
-
-# ============= JSON Data Storage =============
-# Sample users data
-USERS = {
-    "X12345": {
-        "user_name": "John Doe",
-        "user_system_prompt": "You are a helpful AI assistant for John Doe. You specialize in technical support and programming advice."
-    },
-    "X67890": {
-        "user_name": "Jane Smith",
-        "user_system_prompt": "You are a dedicated AI assistant for Jane Smith. You focus on data analysis and scientific research."
-    },
-    "X11111": {
-        "user_name": "Robert Johnson",
-        "user_system_prompt": "You are Robert Johnson's AI helper. You excel at creative writing and marketing suggestions."
-    },
-    "X22222": {
-        "user_name": "Emily Davis",
-        "user_system_prompt": "You are Emily's personal AI assistant. You're good at providing health and wellness recommendations."
-    },
-    "X33333": {
-        "user_name": "Michael Wilson",
-        "user_system_prompt": "You are Michael's AI companion. You specialize in financial advice and investment strategies."
-    }
-}
+
+# ============= Users (personas.json, reloaded when it changes) =============
+APP_NAME = "simple_chatbot"
 
 # Guest system prompt for unauthenticated users
-GUEST_SYSTEM_PROMPT = "You are a general-purpose AI assistant for a guest user. You can provide helpful information but avoid sharing sensitive data."
+GUEST_SYSTEM_PROMPT = registry.guest_prompt(APP_NAME)
+
+# Messages are also appended, with their timestamp, to a transcript log
+if "transcript_id" not in st.session_state:
+    st.session_state.transcript_id = f"{APP_NAME}-{uuid.uuid4().hex}"
 
 def authenticate_user(user_key: str) -> Optional[Dict[str, Any]]:
     """Authenticate user based on their key"""
-    if user_key in USERS:
+    user = registry.get(APP_NAME, user_key)
+    if user:
         return {
-            "user_key": user_key,
-            "user_name": USERS[user_key]["user_name"],
-            "user_system_prompt": USERS[user_key]["user_system_prompt"]
+            "user_name": user["user_name"],
+            "user_system_prompt": user["prompt"]
         }
     return None
 
-def initialize_chat_engine(system_prompt: str):
-    """Initialize the chat engine with the given system prompt"""
-    # Initialize Groq LLM
-    llm = Groq(
-        api_key=os.getenv("GROQ_API_KEY", ""), 
-        model="llama3-8b-8192"
-    )
+class ChatEngine:
+    """Chat engine with its own token-limited memory, streaming from a shared LLM provider"""
     
-    # Create memory buffer for chat history
-    memory = ChatMemoryBuffer.from_defaults(token_limit=3900)
+    def __init__(self, provider, system_prompt: str, token_limit: int = 3900, cache=None):
+        self.provider = provider
+        self.cache = cache
+        self.system_prompt = system_prompt
+        self.history: List[Dict[str, str]] = []
+        self.window = HistoryWindow(token_budget=token_limit, summarize=llm_summarizer(provider.complete))
     
-    # Initialize chat engine
-    chat_engine = SimpleChatEngine.from_defaults(
-        llm=llm,
-        system_prompt=system_prompt,
-        memory=memory,
-        verbose=True
-    )
-    
-    return chat_engine
+    def stream_chat(self, message: str):
+        """Yield the answer's tokens, then add the exchange to the memory"""
+        # Only a conversation's first question is shared through the cache
+        history = list(self.history)
+        cached = self.cache.get(self.system_prompt, message, history) if self.cache else None
+        if cached:
+            stream = replay(cached)
+        else:
+            stream = self.provider.stream(self.window.build(self.system_prompt, self.history, message))
+        tokens = []
+        for token in stream:
+            tokens.append(token)
+            yield token
+        answer = "".join(tokens)
+        if self.cache and not cached:
+            self.cache.put(self.system_prompt, message, answer, history)
+        self.history.append({"role": "user", "content": message})
+        self.history.append({"role": "assistant", "content": answer})
 
-# Function to format chat history as text with timestamps
-def format_chat_history_as_text():
-    """Format the chat history as text with timestamps"""
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    text_output = f"Chat History - {now}\n\n"
-    
-    # Ensure timestamps list is the same length as messages
-    while len(st.session_state.message_timestamps) < len(st.session_state.messages):
-        st.session_state.message_timestamps.append(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-    
-    for i, message in enumerate(st.session_state.messages):
-        timestamp = st.session_state.message_timestamps[i]
-        sender = "User" if message["role"] == "user" else "Assistant"
-        text_output += f"[{timestamp}] {sender}:\n{message['content']}\n\n"
+def initialize_chat_engine(system_prompt: str):
+    """Initialize the chat engine with the given system prompt"""
+    # Groq LLM shared by all sessions ($LLM_PROVIDER=fake for local tests)
+    llm = llm_provider(
+        st.session_state,
+        groq={"api_key": os.getenv("GROQ_API_KEY", ""), "model": "llama3-8b-8192"}
+    )
     
-    return text_output
+    return ChatEngine(llm, system_prompt, cache=response_cache(st.session_state))
 
 # ============= Main Streamlit App =============
 st.subheader('PERSONAL-B0T', divider='red')
@@ -113,7 +96,7 @@ with st.sidebar:
     if st.button("Nouveau Chat"):
         # Clear current chat if there's any
         st.session_state.messages = []
-        st.session_state.message_timestamps = []
+        st.session_state.transcript_id = f"{APP_NAME}-{uuid.uuid4().hex}"
         
         # Authenticate user
         user = authenticate_user(user_key)
@@ -139,13 +122,19 @@ if st.session_state.is_authenticated and st.session_state.authenticated_user:
 else:
     st.sidebar.info("Currently in Guest Mode")
 
-# Add download button for chat history as text
-if st.session_state.messages:
-    # Create text format download button
-    text_history = format_chat_history_as_text()
+# Transcript log written in the background, shared by all sessions
+transcripts = transcript_store(st.session_state)
+
+def add_message(role: str, content: str):
+    """Add a message to the chat history and its transcript"""
+    st.session_state.messages.append({"role": role, "content": content})
+    transcripts.append(st.session_state.transcript_id, role, content)
+
+# Download button for chat history as text, built from the transcript on request
+if st.session_state.messages and st.sidebar.button("Prepare Chat History"):
     st.sidebar.download_button(
         label="Download Chat History",
-        data=text_history,
+        data=transcripts.export(st.session_state.transcript_id, "timestamped"),
         file_name="chat_history.txt",
         mime="text/plain"
     )
@@ -153,18 +142,12 @@ if st.session_state.messages:
 # Chat interface
 if st.session_state.chat_engine:
     # Display chat messages
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    st.session_state.history_view.render(st.session_state.messages)
     
     # Input for new message
     if prompt := st.chat_input("Type your message here..."):
-        # Add timestamp
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        st.session_state.message_timestamps.append(current_time)
-        
         # Add user message to chat history
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        add_message("user", prompt)
         
         # Display user message
         with st.chat_message("user"):
@@ -172,15 +155,12 @@ if st.session_state.chat_engine:
         
         # Generate and display assistant response
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = st.session_state.chat_engine.chat(prompt)
-                st.markdown(response.response)
-        
-        # Add timestamp for assistant message
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        st.session_state.message_timestamps.append(current_time)
+            renderer = StreamRenderer(st.empty(), cursor="▌")
+            for token in st.session_state.chat_engine.stream_chat(prompt):
+                renderer.write(token)
+            response = renderer.finish()
         
         # Add assistant response to chat history
-        st.session_state.messages.append({"role": "assistant", "content": response.response})
+        add_message("assistant", response)
 else:
     st.info("Please authenticate using the sidebar to start chatting.")
@@ -1,48 +1,50 @@
 import streamlit as st
-from groq import Groq
 import datetime
-
-# === GROQ Client ===
-client = Groq(api_key=st.secrets['GROQ_API'])
-
-# === Liste des ingénieurs autorisés ===
-ENGINEERS = {
-    "1234-ABCD": {
-        "name": "Alice Dupont",
-        "prompt": (
-            "Vous êtes Alice Dupont, ingénieure spécialisée en réseaux et sécurité dans un fournisseur cloud. "
-            "Vous conseillez sur la configuration réseau, les VPN, le SDN, et la sécurité des infrastructures cloud."
-        )
-    },
-    "5678-EFGH": {
-        "name": "Jean Morel",
-        "prompt": (
-            "Vous êtes Jean Morel, ingénieur DevOps dans un département cloud. Vous aidez sur la CI/CD, "
-            "l'automatisation avec Ansible/Terraform, le monitoring, et la conteneurisation (Docker, K8s)."
-        )
-    },
-    "9012-IJKL": {
-        "name": "Claire Martin",
-        "prompt": (
-            "Vous êtes Claire Martin, ingénieure cloud spécialisée en architecture haute disponibilité et migration. "
-            "Vous conseillez sur le design scalable, la gestion des pannes, et les stratégies de migration vers le cloud."
-        )
-    }
-}
-
-# === Prompt invité par défaut ===
-GUEST_PROMPT = (
-    "Vous êtes un assistant expert en infrastructure IT, spécialisé dans la planification et le déploiement "
-    "dans une entreprise de services cloud. Répondez de manière technique, détaillée et claire."
+import uuid
+from shared_resources import llm_provider, response_cache, transcript_store
+from stream_render import StreamRenderer
+from history_view import HistoryView
+from chat_history import HistoryWindow, llm_summarizer
+from user_registry import registry
+from response_cache import replay
+
+# === LLM providers (shared by all sessions; $LLM_PROVIDER selects groq, ollama or fake) ===
+provider = llm_provider(
+    st.session_state,
+    groq={"api_key": st.secrets['GROQ_API'], "model": "llama-3.3-70b-versatile"},
+    ollama={"model": "gemma3:4b"},
+)
+# Small, fast model writing the conversation summary
+summary_provider = llm_provider(
+    st.session_state,
+    groq={"api_key": st.secrets['GROQ_API'], "model": "llama-3.1-8b-instant"},
+    ollama={"model": "gemma3:4b"},
 )
 
+# === Ingénieurs autorisés et prompt invité (personas.json, rechargé à chaud) ===
+APP_NAME = "stream_chatbot"
+GUEST_PROMPT = registry.guest_prompt(APP_NAME)
+
 # === INIT SESSION STATE ===
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "history_view" not in st.session_state:
+    # Recent messages eagerly, older ones paged on request
+    st.session_state.history_view = HistoryView()
 if "current_prompt" not in st.session_state:
     st.session_state.current_prompt = GUEST_PROMPT
 if "engineer_mode" not in st.session_state:
     st.session_state.engineer_mode = False
+if "transcript_id" not in st.session_state:
+    st.session_state.transcript_id = f"{APP_NAME}-{uuid.uuid4().hex}"
+if "history_window" not in st.session_state:
+    # Older turns are folded into a summary written by a small, fast model
+    st.session_state.history_window = HistoryWindow(
+        token_budget=3000,
+        summarize=llm_summarizer(lambda messages: summary_provider.complete(
+            messages, temperature=0.1, max_tokens=400
+        ))
+    )
 
 
 # === SIDEBAR ===
@@ -51,9 +53,10 @@ engineer_mode = st.sidebar.toggle("  | `Accès personnalisé` ")
 
 if engineer_mode:
     key = st.sidebar.text_input("🔐 Clé d'accès", type="password")
-    if key in ENGINEERS:
-        st.sidebar.success(f"✅ {ENGINEERS[key]['name']} 👷‍♂️")
-        st.session_state.current_prompt = ENGINEERS[key]["prompt"]
+    engineer = registry.get(APP_NAME, key)
+    if engineer:
+        st.sidebar.success(f"✅ {engineer['user_name']} 👷‍♂️")
+        st.session_state.current_prompt = engineer["prompt"]
         st.session_state.engineer_mode = True
     else:
         st.sidebar.warning("Clé invalide ou vide. Mode invité activé.")
@@ -65,14 +68,21 @@ else:
 
 if st.sidebar.button("Nouveau Chat 💬 ", use_container_width=True):
     st.session_state.messages = []
+    st.session_state.history_window.reset()
+    st.session_state.transcript_id = f"{APP_NAME}-{uuid.uuid4().hex}"
 
-if st.session_state.messages:
-    chat_text = "\n".join(
-        [f"{m['role'].upper()} : {m['content']}" for m in st.session_state.messages]
-    )
+# Every message is appended to a transcript log written in the background;
+# the export is built from that log only when asked for
+transcripts = transcript_store(st.session_state)
+
+def add_message(role, content):
+    st.session_state.messages.append({"role": role, "content": content})
+    transcripts.append(st.session_state.transcript_id, role, content)
+
+if st.session_state.messages and st.sidebar.button("📄 Préparer l'historique", use_container_width=True):
     st.sidebar.download_button(
         label="📥 Télécharger l'historique",
-        data=chat_text,
+        data=transcripts.export(st.session_state.transcript_id, "text"),
         file_name=f"chat_{datetime.datetime.now().strftime('%Y-%m-%d_%H%M')}.txt",
         mime="text/plain"
     )
@@ -80,44 +90,43 @@ if st.session_state.messages:
 # === Affichage des anciens messages ===
 st.subheader("🧠 Assistant IT – Cloud & Infra 💎", divider='orange')
 
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+st.session_state.history_view.render(st.session_state.messages)
 
 # === Stream avec mémoire ===
-def context_messages(user_message, memory_limit=2):
-    history = st.session_state.messages[-memory_limit*2:]
-    messages = [{"role": "system", "content": st.session_state.current_prompt}]
-    messages.extend(history)
-    messages.append({"role": "user", "content": user_message})
-    return messages
-
-def stream_groq_response(messages):
-    return client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        messages=messages,
+def context_messages(user_message):
+    # Recent turns within the token budget, older ones as a rolling summary;
+    # the last stored message is user_message itself
+    return st.session_state.history_window.build(
+        st.session_state.current_prompt, st.session_state.messages[:-1], user_message
+    )
+
+def stream_response(messages):
+    return provider.stream(
+        messages,
         temperature=0.4,
         top_p=1,
-        max_completion_tokens=1024,
-        stream=True,
+        max_tokens=1024,
     )
 
 # === Input utilisateur ===
 if prompt := st.chat_input("Posez votre question technique..."):
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    add_message("user", prompt)
     with st.chat_message("user"):
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
-        placeholder = st.empty()
-        response_text = ""
-        context = context_messages(prompt)
+        renderer = StreamRenderer(st.empty(), cursor="▌🤖✨")
+        # First questions already answered for this persona are replayed from the cache
+        cache = response_cache(st.session_state)
+        history = st.session_state.messages[:-1]
+        cached = cache.get(st.session_state.current_prompt, prompt, history)
+        tokens = replay(cached) if cached else stream_response(context_messages(prompt))
 
-        for chunk in stream_groq_response(context):
-            if chunk.choices[0].delta.content:
-                response_text += chunk.choices[0].delta.content
-                placeholder.markdown(response_text + "▌🤖✨")
+        for token in tokens:
+            renderer.write(token)
 
-        placeholder.markdown(response_text)
+        response_text = renderer.finish()
+        if not cached:
+            cache.put(st.session_state.current_prompt, prompt, response_text, history)
 
-    st.session_state.messages.append({"role": "assistant", "content": response_text})
+    add_message("assistant", response_text)
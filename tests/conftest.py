@@ -0,0 +1,11 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAG_DIR = os.path.join(ROOT, "Chatbot_RAG_PDF_Assistant")
+
+# Shared modules live at the repository root, the RAG assistant's modules and
+# its local service stubs in their own folders, as the apps and benches import them
+for path in (ROOT, RAG_DIR, os.path.join(RAG_DIR, "bench")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,71 @@
+import pytest
+
+pytest.importorskip("langgraph.checkpoint.sqlite")
+
+from langgraph.checkpoint.base import empty_checkpoint
+
+import chat_checkpoint
+from chat_checkpoint import BoundedSqliteSaver
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def put(saver, thread_id, parent=None):
+    checkpoint = empty_checkpoint()
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    if parent:
+        config["configurable"]["checkpoint_id"] = parent["configurable"]["checkpoint_id"]
+    return saver.put(config, checkpoint, {"source": "input", "step": 0}, {})
+
+
+def checkpoint_count(saver, thread_id):
+    return len(list(saver.list({"configurable": {"thread_id": thread_id}})))
+
+
+def test_only_the_latest_checkpoints_are_kept(tmp_path):
+    saver = BoundedSqliteSaver(str(tmp_path / "memory.sqlite"), keep_checkpoints=2,
+                               maintenance_interval=3600)
+    config = None
+    for _ in range(5):
+        config = put(saver, "t1", config)
+    assert checkpoint_count(saver, "t1") == 5
+
+    assert saver.maintain() == {"evicted_threads": 0, "removed_checkpoints": 3}
+    assert checkpoint_count(saver, "t1") == 2
+    assert saver.get_tuple({"configurable": {"thread_id": "t1"}}).config == config
+    saver.close()
+
+
+def test_idle_threads_are_evicted(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(chat_checkpoint.time, "time", clock)
+    saver = BoundedSqliteSaver(str(tmp_path / "memory.sqlite"), thread_ttl=60,
+                               maintenance_interval=3600)
+    put(saver, "idle")
+    clock.now += 50
+    put(saver, "active")
+    clock.now += 20
+
+    assert saver.maintain()["evicted_threads"] == 1
+    assert checkpoint_count(saver, "idle") == 0
+    assert checkpoint_count(saver, "active") == 1
+    saver.close()
+
+
+def test_history_survives_reopening(tmp_path):
+    path = str(tmp_path / "memory.sqlite")
+    saver = BoundedSqliteSaver(path)
+    config = put(saver, "t1")
+    saver.close()
+
+    reopened = BoundedSqliteSaver(path)
+    assert reopened.get_tuple({"configurable": {"thread_id": "t1"}}).config == config
+    reopened.forget_thread("t1")
+    assert reopened.get_tuple({"configurable": {"thread_id": "t1"}}) is None
+    reopened.close()
@@ -0,0 +1,79 @@
+import pytest
+
+# The checkpointer needs langgraph's SQLite saver and a langchain-core matching langgraph
+pytest.importorskip("langgraph.checkpoint.sqlite")
+
+from chat_engine import ChatBot
+from llm_providers import FakeProvider
+from response_cache import ResponseCache
+
+ANSWER = "Redémarrez le service puis vérifiez les journaux."
+
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "fake")
+    bot = ChatBot("unused", checkpoint_path=str(tmp_path / "memory.sqlite"), response_cache=ResponseCache())
+    bot.llm = FakeProvider(first_token_latency=0, tokens_per_second=0, responses=[ANSWER])
+    yield bot
+    bot.close()
+
+
+def test_stream_yields_model_tokens_and_checkpoints_the_answer(bot):
+    tokens = list(bot.stream("Comment redémarrer le service ?", thread_id="t1"))
+
+    assert len(tokens) == len(ANSWER.split(" "))
+    assert "".join(tokens) == ANSWER
+    messages = bot.app.get_state({"configurable": {"thread_id": "t1"}}).values["messages"]
+    assert [(m.type, m.content) for m in messages] == [
+        ("human", "Comment redémarrer le service ?"), ("ai", ANSWER)]
+
+
+def test_admission_is_held_while_the_model_runs(bot):
+    events = []
+
+    class Slot:
+        def __enter__(self):
+            events.append("enter")
+
+        def __exit__(self, *exc):
+            events.append("exit")
+
+    for _ in bot.stream("Comment redémarrer le service ?", thread_id="t1", admission=Slot):
+        events.append("token")
+
+    assert events[0] == "enter" and events[-1] == "exit"
+    assert events.count("token") == len(ANSWER.split(" "))
+
+
+def test_workflows_are_compiled_once_per_system_prompt(bot):
+    bot.max_workflows = 2
+    first = bot._workflow_for("Persona A")
+    assert bot._workflow_for("Persona A") is first
+    bot._workflow_for("Persona B")
+    bot._workflow_for("Persona C")
+
+    # The default prompt's and Persona A's workflows were the least recently used
+    assert list(bot._workflows) == ["Persona B", "Persona C"]
+    assert bot._workflow_for("Persona A") is not first
+
+
+def test_thread_history_survives_a_system_prompt_change(bot):
+    list(bot.stream("Première question sur le service ?", thread_id="t1", system_prompt="Persona A"))
+    list(bot.stream("Et ensuite ?", thread_id="t1", system_prompt="Persona B"))
+
+    state = bot._workflow_for("Persona B").get_state({"configurable": {"thread_id": "t1"}})
+    assert [m.content for m in state.values["messages"] if m.type == "human"] == [
+        "Première question sur le service ?", "Et ensuite ?"]
+
+
+def test_first_question_of_a_new_thread_is_answered_from_the_cache(bot):
+    question = "Comment redémarrer le service ?"
+    list(bot.stream(question, thread_id="alice-chat1", system_prompt="Persona A"))
+    bot.llm = FakeProvider(first_token_latency=0, tokens_per_second=0, responses=["Autre réponse."])
+
+    # A new chat of the same persona, e.g. the same user coming back, reuses the answer
+    assert "".join(bot.stream(question, thread_id="alice-chat2", system_prompt="Persona A")) == ANSWER
+    # A follow-up depends on the thread's history and goes to the model
+    assert "".join(bot.stream(question, thread_id="alice-chat2", system_prompt="Persona A")) == "Autre réponse."
+    assert bot.response_cache.stats()["hits"] == 1
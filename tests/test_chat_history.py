@@ -0,0 +1,59 @@
+from chat_history import (SUMMARY_HEADER, HistoryWindow, clip, estimate_tokens,
+                          extractive_summary, split_point)
+
+
+def turns(count, words=20):
+    return [{"role": "user" if i % 2 == 0 else "assistant",
+             "content": f"Message {i}. " + "mot " * words} for i in range(count)]
+
+
+def test_clip_keeps_head_and_tail():
+    text = "a" * 100 + "z" * 100
+    clipped = clip(text, 10)
+
+    assert clipped.startswith("a") and clipped.endswith("z") and "[...]" in clipped
+    assert clip("court", 10) == "court"
+
+
+def test_split_point_starts_on_a_user_turn_below_low_water():
+    messages = turns(10)
+    size = sum(estimate_tokens(m["content"]) for m in messages)
+
+    assert split_point(messages, size) == 0
+    start = split_point(messages, size // 2)
+    assert start > 0 and messages[start]["role"] == "user"
+    assert sum(estimate_tokens(m["content"]) for m in messages[start:]) <= size // 2 * 0.75
+
+
+def test_extractive_summary_keeps_first_sentences():
+    summary = extractive_summary("", [{"role": "user", "content": "Le disque est plein. Voici les logs..."}])
+    assert summary == "- user: Le disque est plein."
+
+
+def test_window_folds_evicted_turns_into_the_summary_once():
+    calls = []
+
+    def summarize(summary, evicted):
+        calls.append(len(evicted))
+        return summary + f"[{len(evicted)}]"
+
+    window = HistoryWindow(token_budget=200, summary_tokens=20, summarize=summarize)
+    history = turns(12)
+    messages = window.build("Système", history, "Question ?")
+
+    assert messages[0] == {"role": "system", "content": "Système"}
+    assert messages[1]["content"].startswith(SUMMARY_HEADER)
+    assert messages[-1] == {"role": "user", "content": "Question ?"}
+    assert sum(estimate_tokens(m["content"]) for m in messages) <= 200
+    # The next turn fits again without summarizing the same turns twice
+    window.build("Système", history + turns(1, words=1), "Suite ?")
+    assert calls == [window.folded]
+
+
+def test_window_resets_when_the_conversation_is_cleared():
+    window = HistoryWindow(token_budget=200, summary_tokens=20)
+    window.build("Système", turns(12), "Question ?")
+    assert window.summary
+
+    assert window.build("Système", [], "Nouvelle question ?") == [
+        {"role": "system", "content": "Système"}, {"role": "user", "content": "Nouvelle question ?"}]
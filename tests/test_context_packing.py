@@ -0,0 +1,44 @@
+import numpy as np
+
+from chat_history import CHARS_PER_TOKEN
+from context_packing import Segment, build_context, join_overlapping, mmr, pack
+from vector_index import VectorIndex
+
+
+def segment(text, score, vector):
+    return Segment("doc", [0], text, score, np.asarray(vector, dtype=np.float32))
+
+
+def test_join_overlapping_removes_the_shared_text():
+    assert join_overlapping("restart the MEP_206 service", "MEP_206 service then check", 50) == \
+        "restart the MEP_206 service then check"
+    assert join_overlapping("first", "second", 50) == "first\nsecond"
+
+
+def test_neighbouring_chunks_merged_and_duplicates_dropped():
+    index = VectorIndex()
+    texts = ["alpha beta gamma", "gamma delta", "boilerplate footer", "boilerplate  FOOTER"]
+    index.add(list(range(4)), texts, np.eye(4, dtype=np.float32))
+    hits = [("doc", 0, 0.9), ("doc", 1, 0.5), ("doc", 3, 0.4), ("other", 0, 0.3)]
+    other = VectorIndex()
+    other.add([0], ["boilerplate footer"], np.eye(4, dtype=np.float32)[2:3])
+
+    passages = build_context(hits, {"doc": index, "other": other}, token_budget=100)
+
+    assert passages == ["alpha beta gamma delta", "boilerplate  FOOTER"]
+
+
+def test_mmr_prefers_a_different_passage_over_a_near_copy():
+    segments = [segment("a", 1.0, [1, 0]), segment("a'", 0.95, [0.99, 0.14]), segment("b", 0.8, [0, 1])]
+
+    order = mmr(segments, query_vector=[1, 0], diversity=0.7)
+
+    assert [s.text for s in order] == ["a", "b", "a'"]
+
+
+def test_pack_keeps_to_the_budget_and_truncates_only_the_first_passage():
+    long_text = "x" * (20 * CHARS_PER_TOKEN)
+    segments = [segment(long_text, 1.0, [1, 0]), segment("short", 0.5, [0, 1])]
+
+    assert pack(segments, token_budget=10) == [long_text[:10 * CHARS_PER_TOKEN]]
+    assert pack(segments[1:], token_budget=10) == ["short"]
@@ -0,0 +1,61 @@
+import numpy as np
+
+import embedding_cache
+from embedding_cache import EmbeddingCache
+from metrics import Metrics
+
+MODEL = "embed-english-v3.0"
+
+
+def test_vectors_round_trip_and_count_hits(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    vectors = [np.arange(4, dtype=np.float32), np.ones(4, dtype=np.float32)]
+
+    assert cache.get_many(MODEL, "search_document", ["a", "b"]) == [None, None]
+    cache.put_many(MODEL, "search_document", ["a", "b"], vectors)
+    found = cache.get_many(MODEL, "search_document", ["a", "c", "b"])
+
+    np.testing.assert_array_equal(found[0], vectors[0])
+    assert found[1] is None
+    np.testing.assert_array_equal(found[2], vectors[1])
+    # The input type is part of the key: queries and documents do not mix
+    assert cache.get_many(MODEL, "search_query", ["a"]) == [None]
+    assert cache.stats() | {"hit_rate": 0} == {"hits": 2, "misses": 4, "hit_rate": 0, "entries": 2}
+
+
+def test_cache_survives_reopening(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    cache = EmbeddingCache(path)
+    cache.put_many(MODEL, "search_document", ["a"], [np.ones(4)])
+    cache.close()
+
+    reopened = EmbeddingCache(path)
+    assert reopened.stats()["entries"] == 1
+    assert reopened.get_many(MODEL, "search_document", ["a"])[0].dtype == np.float32
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: next(clock))
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), max_entries=2)
+    cache.put_many(MODEL, "search_document", ["a"], [np.ones(4)])
+    cache.put_many(MODEL, "search_document", ["b"], [np.ones(4)])
+    # Reading "a" makes "b" the least recently used
+    cache.get_many(MODEL, "search_document", ["a"])
+    cache.put_many(MODEL, "search_document", ["c"], [np.ones(4)])
+
+    hits = cache.get_many(MODEL, "search_document", ["a", "b", "c"])
+    assert [vector is not None for vector in hits] == [True, False, True]
+    assert cache.stats()["entries"] == 2
+
+
+def test_lookups_are_reported_to_metrics(tmp_path, monkeypatch):
+    recorded = Metrics(enabled=True)
+    monkeypatch.setattr(embedding_cache, "metrics", recorded)
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    cache.put_many(MODEL, "search_document", ["a"], [np.ones(4)])
+    cache.get_many(MODEL, "search_document", ["a", "b", "c"])
+
+    text = recorded.prometheus_text()
+    assert 'embedding_cache_lookups_total{input_type="search_document",outcome="hit"} 1' in text
+    assert 'embedding_cache_lookups_total{input_type="search_document",outcome="miss"} 2' in text
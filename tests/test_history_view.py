@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+
+import history_view
+from history_view import HistoryView, preview
+
+
+class FakeStreamlit:
+    """Records what HistoryView draws; selectbox picks `page`"""
+
+    def __init__(self, page=None):
+        self.page = page
+        self.rendered = []
+        self.labels = []
+
+    @contextmanager
+    def chat_message(self, role):
+        yield
+
+    def markdown(self, text):
+        self.rendered.append(text)
+
+    @contextmanager
+    def expander(self, label):
+        yield
+
+    def selectbox(self, label, options, format_func, **kwargs):
+        self.labels = [format_func(option) for option in options]
+        return self.page
+
+
+MESSAGES = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"Message {i}\n\nsuite"}
+            for i in range(25)]
+
+
+def test_only_recent_messages_are_rendered_until_a_page_is_chosen(monkeypatch):
+    fake = FakeStreamlit()
+    monkeypatch.setattr(history_view, "st", fake)
+    HistoryView(recent=20, page_size=20).render(MESSAGES)
+
+    assert fake.rendered == [m["content"] for m in MESSAGES[5:]]
+    assert fake.labels == ["5 messages masqués", "Messages 1–5 · Message 0"]
+
+    fake = FakeStreamlit(page=0)
+    monkeypatch.setattr(history_view, "st", fake)
+    HistoryView(recent=20, page_size=20).render(MESSAGES)
+    assert fake.rendered == [m["content"] for m in MESSAGES]
+
+
+def test_short_histories_have_no_pager(monkeypatch):
+    fake = FakeStreamlit()
+    monkeypatch.setattr(history_view, "st", fake)
+    HistoryView(recent=20).render(MESSAGES[:3])
+
+    assert fake.rendered == [m["content"] for m in MESSAGES[:3]]
+    assert fake.labels == []
+
+
+def test_preview_is_the_shortened_first_line():
+    assert preview({"content": "\n  Erreur disque\nDétails"}) == "Erreur disque"
+    assert preview({"content": "x" * 100}) == "x" * 60 + "…"
@@ -0,0 +1,88 @@
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("PyPDF2")
+pytest.importorskip("streamlit_pdf_viewer")
+
+import ingestion_pipeline
+from ingestion_pipeline import IngestionPipeline
+from rag_engine import RAGEngine
+from stubs import StubCollection, StubEmbedder, StubGroq
+
+PAGES = [f"Page {page}: " + " ".join(f"p{page}w{word}" for word in range(300)) for page in range(1, 13)]
+
+
+class FailingEmbedder(StubEmbedder):
+    """Fails on the nth embed call"""
+    def __init__(self, fail_on):
+        super().__init__(latency=0)
+        self.fail_on = fail_on
+
+    def embed(self, texts, model=None, input_type=None):
+        if self.calls + 1 == self.fail_on:
+            self.calls += 1
+            raise RuntimeError("embedder unavailable")
+        return super().embed(texts, model, input_type)
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    def extract_pages(pdf_path, workers=1, errors=None):
+        yield from PAGES
+    monkeypatch.setattr(ingestion_pipeline, "extract_pages", extract_pages)
+    return PAGES
+
+
+def make_engine(embedder, collection=None):
+    return RAGEngine(None, None, None, embed_batch_size=4, groq_client=StubGroq(),
+                     cohere_client=embedder, collection=collection or StubCollection())
+
+
+def test_chunks_stored_in_document_order(pages):
+    collection = StubCollection()
+    engine = make_engine(StubEmbedder(latency=0), collection)
+
+    doc_id = IngestionPipeline(engine, embed_workers=4).run("runbook.pdf", title="Runbook")
+
+    index = engine.indexes[doc_id]
+    texts = [index.content(row) for row in range(len(index))]
+    assert len(texts) > 8
+    assert index.ids == list(range(len(texts)))
+    # Chunks follow the text: overlaps aside, every word appears once, in order
+    words = [word for text in texts for word in text.split() if word.startswith("p")]
+    expected = [word for page in pages for word in page.split() if word.startswith("p")]
+    assert list(dict.fromkeys(words)) == expected
+    assert [doc["id"] for doc in collection.docs] == list(range(len(texts)))
+    assert engine.documents() == {doc_id: "Runbook"}
+
+
+def test_same_fingerprint_as_add_document(pages):
+    embedder = StubEmbedder(latency=0)
+    engine = make_engine(embedder)
+
+    doc_id = IngestionPipeline(engine).run("runbook.pdf")
+    calls = embedder.calls
+
+    assert engine.add_document(pages) == doc_id
+    assert embedder.calls == calls
+
+
+def test_failed_document_is_dropped(pages):
+    collection = StubCollection()
+    engine = make_engine(FailingEmbedder(fail_on=2), collection)
+
+    with pytest.raises(RuntimeError):
+        IngestionPipeline(engine, embed_workers=1).run("runbook.pdf", doc_id="runbook")
+
+    assert engine.documents() == {}
+    assert collection.docs == []
+
+
+def test_fingerprint_when_the_document_id_is_given(pages):
+    embedder = StubEmbedder(latency=0)
+    engine = make_engine(embedder)
+
+    IngestionPipeline(engine).run("runbook.pdf", doc_id="runbook")
+
+    # Hashed page by page in the extract stage, as RAGEngine.fingerprint does
+    assert engine.is_indexed("runbook", engine.fingerprint(pages))
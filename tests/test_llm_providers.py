@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from llm_providers import FakeProvider, Provider, get_provider
+
+MESSAGES = [{"role": "user", "content": "Comment redémarrer le service ?"}]
+
+
+class FlakyProvider(Provider):
+    """Fails its first attempts before streaming, or after a first token"""
+    name = "flaky"
+
+    def __init__(self, failures, fail_after_token=False, **kwargs):
+        super().__init__("flaky", backoff_base=0.001, **kwargs)
+        self.failures = failures
+        self.fail_after_token = fail_after_token
+
+    async def _astream(self, messages, model, **options):
+        if self.fail_after_token:
+            yield "partiel"
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("connexion perdue")
+        yield "ok"
+
+
+class SlowProvider(Provider):
+    name = "slow"
+
+    async def _astream(self, messages, model, **options):
+        await asyncio.sleep(1)
+        yield "trop tard"
+
+
+def test_fake_provider_streams_a_canned_answer():
+    provider = FakeProvider(first_token_latency=0, tokens_per_second=0, responses=["un deux trois"])
+
+    assert list(provider.stream(MESSAGES)) == ["un", " deux", " trois"]
+    assert provider.complete(MESSAGES, max_tokens=2) == "un deux"
+    stats = provider.stats()
+    assert stats["calls"] == 2 and stats["errors"] == 0
+
+
+def test_connection_errors_are_retried_before_the_first_token():
+    provider = FlakyProvider(failures=2, retries=2)
+
+    assert provider.complete(MESSAGES) == "ok"
+    assert provider.stats()["retries"] == 2
+
+
+def test_retries_give_up_after_the_limit():
+    provider = FlakyProvider(failures=3, retries=2)
+
+    with pytest.raises(ConnectionError):
+        provider.complete(MESSAGES)
+    assert provider.metrics[-1].error == "ConnectionError"
+
+
+def test_partial_answers_are_not_retried():
+    provider = FlakyProvider(failures=1, fail_after_token=True, retries=2)
+
+    with pytest.raises(ConnectionError):
+        provider.complete(MESSAGES)
+    assert provider.metrics[-1].attempts == 1
+
+
+def test_first_token_timeout():
+    provider = SlowProvider("slow", first_token_timeout=0.05, retries=0)
+
+    with pytest.raises(asyncio.TimeoutError):
+        provider.complete(MESSAGES)
+
+
+def test_get_provider_by_name_or_environment(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "fake")
+    assert isinstance(get_provider(fake={"first_token_latency": 0}), FakeProvider)
+    with pytest.raises(ValueError):
+        get_provider("inconnu")
@@ -0,0 +1,89 @@
+import pytest
+
+import llm_scheduler
+from llm_scheduler import FairScheduler, QueueFull
+from metrics import Metrics
+
+
+def test_waiting_users_are_served_round_robin():
+    scheduler = FairScheduler(max_in_flight=1)
+    running = scheduler.submit("first")
+    # One user sends a burst before the others ask once
+    burst = [scheduler.submit("alice") for _ in range(3)]
+    bob = scheduler.submit("bob")
+    carol = scheduler.submit("carol")
+
+    granted = []
+    current = running
+    for _ in range(5):
+        scheduler.release(current)
+        current = next(t for t in burst + [bob, carol] if t.granted.is_set() and t not in granted)
+        granted.append(current)
+
+    assert granted == [burst[0], bob, carol, burst[1], burst[2]]
+    assert scheduler.stats()["completed"] == 5
+
+
+def test_position_and_wait_estimate():
+    scheduler = FairScheduler(max_in_flight=1, service_seconds=10)
+    scheduler.submit("first")
+    alice = [scheduler.submit("alice") for _ in range(2)]
+    bob = scheduler.submit("bob")
+
+    assert scheduler.position(alice[0]) == 0
+    assert scheduler.position(bob) == 1
+    assert scheduler.position(alice[1]) == 2
+    assert scheduler.estimated_wait(scheduler.position(bob)) == 20
+
+
+def test_queue_full():
+    scheduler = FairScheduler(max_in_flight=1, max_queue=2)
+    scheduler.submit("a")
+    scheduler.submit("b")
+    scheduler.submit("c")
+
+    with pytest.raises(QueueFull):
+        scheduler.submit("d")
+    with pytest.raises(QueueFull):
+        with scheduler.slot("d"):
+            pass
+    assert scheduler.stats()["waiting"] == 2
+
+
+def test_slot_gives_back_its_place_when_the_caller_leaves():
+    scheduler = FairScheduler(max_in_flight=1)
+    holder = scheduler.submit("a")
+
+    def impatient(position, seconds):
+        raise TimeoutError("page closed")
+
+    with pytest.raises(TimeoutError):
+        with scheduler.slot("b", on_wait=impatient, poll_interval=0.01):
+            pass
+
+    assert scheduler.stats()["waiting"] == 0
+    scheduler.release(holder)
+    with scheduler.slot("c", poll_interval=0.01):
+        assert scheduler.stats()["in_flight"] == 1
+    assert scheduler.stats() | {"service_seconds": 0} == {
+        "in_flight": 0, "waiting": 0, "users_waiting": 0,
+        "completed": 2, "cancelled": 1, "service_seconds": 0,
+    }
+
+
+def test_waits_and_outcomes_are_reported_to_metrics(monkeypatch):
+    recorded = Metrics(enabled=True)
+    monkeypatch.setattr(llm_scheduler, "metrics", recorded)
+    scheduler = FairScheduler(max_in_flight=1, max_queue=1, backend="ollama")
+    running = scheduler.submit("a")
+    scheduler.submit("b")
+    with pytest.raises(QueueFull):
+        scheduler.submit("c")
+    scheduler.release(running)
+
+    text = recorded.prometheus_text()
+    assert 'llm_scheduler_requests_total{backend="ollama",outcome="completed"} 1' in text
+    assert 'llm_scheduler_requests_total{backend="ollama",outcome="rejected"} 1' in text
+    assert 'llm_scheduler_in_flight{backend="ollama"} 1' in text
+    assert 'llm_scheduler_waiting{backend="ollama"} 0' in text
+    assert 'llm_scheduler_wait_seconds_count{backend="ollama"} 2' in text
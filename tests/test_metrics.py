@@ -0,0 +1,90 @@
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+
+import pytest
+
+import metrics as metrics_module
+from metrics import Metrics
+
+
+def test_disabled_metrics_record_nothing():
+    recorded = Metrics()
+    with recorded.span("rag.query") as span:
+        span.set(chunks=3)
+    recorded.incr("calls_total")
+
+    assert recorded.prometheus_text() == "\n"
+
+
+def test_nested_spans_share_a_trace(tmp_path):
+    trace = tmp_path / "trace.jsonl"
+    recorded = Metrics(enabled=True, trace_path=str(trace))
+    with recorded.span("rag.query", mode="hybrid"):
+        with recorded.span("rag.embed") as span:
+            span.set(texts=1)
+    with pytest.raises(ValueError):
+        with recorded.span("rag.query", mode="hybrid"):
+            raise ValueError("boom")
+    recorded.flush_trace()
+
+    embed, query, failed = [json.loads(line) for line in trace.read_text().splitlines()]
+    assert embed["trace_id"] == query["trace_id"] != failed["trace_id"]
+    assert embed["parent_id"] == query["span_id"] and query["parent_id"] is None
+    assert embed["attrs"] == {"texts": 1} and failed["error"] == "ValueError"
+    text = recorded.prometheus_text()
+    assert 'span_duration_seconds_count{mode="hybrid",span="rag.query"} 2' in text
+    assert 'span_errors_total{error="ValueError",span="rag.query"} 1' in text
+
+
+def test_prometheus_text_of_counters_gauges_and_histograms():
+    recorded = Metrics(enabled=True, buckets={"latency": (0.1, 1.0)})
+    recorded.incr("calls_total", provider="fake")
+    recorded.incr("calls_total", 2, provider="fake")
+    recorded.gauge("queue_length", 4)
+    for value in (0.05, 0.5, 5.0):
+        recorded.observe("latency", value, label='a "quoted"\nvalue')
+
+    lines = recorded.prometheus_text().splitlines()
+    assert "# TYPE calls_total counter" in lines
+    assert 'calls_total{provider="fake"} 3' in lines
+    assert "queue_length 4" in lines
+    assert 'latency_bucket{label="a \\"quoted\\"\\nvalue",le="0.1"} 1' in lines
+    assert 'latency_bucket{label="a \\"quoted\\"\\nvalue",le="1"} 2' in lines
+    assert 'latency_bucket{label="a \\"quoted\\"\\nvalue",le="+Inf"} 3' in lines
+
+
+def test_exporters_start_with_the_first_value_and_only_once(monkeypatch):
+    served = []
+    recorded = Metrics(enabled=True, port=9999)
+    monkeypatch.setattr(recorded, "serve", served.append)
+    assert served == []
+
+    recorded.incr("calls_total")
+    recorded.observe("latency", 0.1)
+    assert served == [9999]
+
+
+def test_exporters_never_start_in_a_child_process(monkeypatch):
+    served = []
+    recorded = Metrics(enabled=True, port=9999)
+    monkeypatch.setattr(recorded, "serve", served.append)
+    monkeypatch.setattr(multiprocessing, "parent_process", lambda: object())
+
+    recorded.incr("calls_total")
+    assert served == []
+    assert "calls_total 1" in recorded.prometheus_text()
+
+
+def test_importing_starts_no_exporter(tmp_path):
+    # In a fresh interpreter, with every exporter configured
+    env = dict(os.environ, METRICS_PORT="0", METRICS_FILE=str(tmp_path / "metrics.prom"),
+               METRICS_TRACE_FILE=str(tmp_path / "trace.jsonl"))
+    script = ("from metrics import metrics; "
+              "print(metrics.enabled, metrics._started, metrics._server, metrics._thread)")
+    output = subprocess.run([sys.executable, "-c", script], cwd=os.path.dirname(metrics_module.__file__),
+                            env=env, capture_output=True, text=True, check=True).stdout
+
+    assert output.split() == ["True", "False", "None", "None"]
@@ -0,0 +1,64 @@
+import pytest
+
+pytest.importorskip("PyPDF2")
+pytest.importorskip("streamlit_pdf_viewer")
+
+from pdf_pages import extract_range
+from pdf_processor import extract_pages, process_pdf
+
+
+def write_pdf(path, pages):
+    """Minimal PDF with one line of Helvetica text per page (an empty string leaves the page blank)"""
+    count = len(pages)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>"
+        % (b" ".join(b"%d 0 R" % (4 + 2 * n) for n in range(count)), count),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for n, text in enumerate(pages):
+        stream = b"BT /F1 12 Tf 72 720 Td (%s) Tj ET" % text.encode("latin-1") if text else b""
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (5 + 2 * n))
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+    return str(path)
+
+
+def test_extract_range_returns_page_numbers_and_text(tmp_path):
+    pdf = write_pdf(tmp_path / "doc.pdf", ["first page", "second page", "third page"])
+
+    pages = extract_range(pdf, 1, 3)
+
+    assert [(page_num, text.strip(), error) for page_num, text, error in pages] == [
+        (1, "second page", None), (2, "third page", None)]
+
+
+def test_pages_yielded_in_order_and_blank_pages_skipped(tmp_path):
+    texts = [f"page {n}" if n % 5 else "" for n in range(40)]
+    pdf = write_pdf(tmp_path / "doc.pdf", texts)
+    expected = [f"Page {n + 1}: page {n}" for n in range(40) if n % 5]
+
+    serial = [page.strip() for page in extract_pages(pdf)]
+    errors = []
+    pooled = [page.strip() for page in process_pdf(pdf, workers=2, errors=errors)]
+
+    assert serial == expected
+    assert pooled == expected
+    assert errors == []
+
+
+def test_unreadable_file_raises(tmp_path):
+    path = tmp_path / "broken.pdf"
+    path.write_bytes(b"not a pdf")
+    with pytest.raises(Exception, match="Error processing PDF"):
+        process_pdf(str(path))
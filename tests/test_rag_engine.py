@@ -0,0 +1,157 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain")
+
+from langchain.schema import Document
+
+from rag_engine import RRF_K, RAGEngine, reciprocal_rank_fusion
+from stubs import StubCollection, StubEmbedder, StubGroq
+
+
+def make_engine(embedder, collection, **kwargs):
+    return RAGEngine(None, None, None, groq_client=StubGroq(),
+                     cohere_client=embedder, collection=collection, **kwargs)
+
+
+def test_store_documents_embeds_and_writes_in_batches():
+    collection = StubCollection()
+    embedder = StubEmbedder(latency=0)
+    engine = make_engine(embedder, collection, embed_batch_size=4, embed_concurrency=3)
+    documents = [Document(page_content=f"chunk {n}") for n in range(10)]
+
+    engine.store_documents(documents, doc_id="runbook", title="Runbook")
+
+    # 4 + 4 + 2 chunks: one embed call and one insert_many per batch
+    assert embedder.calls == 3
+    assert collection.writes == 3
+    # Batches finish in any order but are stored in submission order
+    assert [(doc["id"], doc["content"]) for doc in collection.docs] == [(n, f"chunk {n}") for n in range(10)]
+    assert engine.indexes["runbook"].content(9) == "chunk 9"
+
+
+def test_document_reused_from_the_collection():
+    collection = StubCollection()
+    embedder = StubEmbedder(latency=0)
+    pages = ["Page 1: restart MEP_206 with the service account " * 20]
+
+    doc_id = make_engine(embedder, collection).add_document(pages, title="Runbook")
+    calls = embedder.calls
+
+    reopened = make_engine(embedder, collection)
+    assert reopened.documents() == {doc_id: "Runbook"}
+    assert reopened.add_document(pages) == doc_id
+    assert embedder.calls == calls
+    assert reopened._get_relevant_documents("MEP_206", k=1)[0].startswith("Page 1")
+
+
+def test_tenants_only_see_their_own_documents():
+    collection = StubCollection()
+    embedder = StubEmbedder(latency=0)
+    alice = make_engine(embedder, collection, tenant="alice")
+    bob = make_engine(embedder, collection, tenant="bob")
+
+    doc_id = alice.add_document(["Page 1: Alice's runbook " * 20], title="Runbook")
+    bob.add_document(["Page 1: Bob's notes " * 20], title="Notes")
+    alice.drop_document(doc_id)
+
+    assert make_engine(embedder, collection, tenant="alice").documents() == {}
+    assert list(make_engine(embedder, collection, tenant="bob").documents().values()) == ["Notes"]
+
+
+def test_expired_documents_are_evicted_from_disk(tmp_path):
+    root = tmp_path / "indexes"
+    embedder = StubEmbedder(latency=0)
+    # The index root does not exist until a document is written
+    engine = make_engine(embedder, None, index_dir=str(root), tenant="alice", doc_ttl=60)
+    doc_id = engine.add_document(["Page 1: restart MEP_206 " * 20])
+    other = make_engine(embedder, None, index_dir=str(root), tenant="bob", doc_ttl=60)
+    other.add_document(["Page 1: check the disks " * 20])
+
+    assert engine.evict_expired(now=time.time() + 3600) == [doc_id]
+    # The other tenant's expired index is swept too, with its directory
+    assert not (root / "alice" / doc_id).exists()
+    assert not (root / "bob").exists()
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    vector = [(0.9, "a", 0), (0.8, "a", 1), (0.5, "c", 0), (0.1, "b", 0)]
+    lexical = [(12.0, "b", 0), (3.0, "a", 1)]
+
+    hits = reciprocal_rank_fusion([vector, lexical], k=3)
+
+    # a/1, second in both rankings, beats b/0 (first and last) and a/0 (first in one only)
+    assert [(doc_id, row) for doc_id, row, _ in hits] == [("a", 1), ("b", 0), ("a", 0)]
+    assert hits[0][2] == pytest.approx(2 / (RRF_K + 2))
+
+
+def test_rrf_sorts_each_ranking_and_ignores_raw_scores():
+    # Lexical scores are unbounded, vector scores are cosines: only ranks count
+    unsorted = [(0.2, "a", 2), (0.7, "a", 1), (0.9, "a", 0)]
+    hits = reciprocal_rank_fusion([unsorted, [(1000.0, "a", 2)]], k=2)
+    assert [row for _, row, _ in hits] == [2, 0]
+
+
+def test_rrf_handles_missing_rankings():
+    assert reciprocal_rank_fusion([[], []], k=3) == []
+    hits = reciprocal_rank_fusion([[], [(1.0, "a", 4)]], k=3)
+    assert hits == [("a", 4, pytest.approx(1 / (RRF_K + 1)))]
+
+
+def test_concurrent_sessions_index_a_document_once(tmp_path):
+    embedder = StubEmbedder(latency=0.01)
+    engine = make_engine(embedder, None, index_dir=str(tmp_path))
+    pages = ["Page 1: restart MEP_206 with the service account " * 200]
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(engine.add_document(pages))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The sessions after the first wait for it, then reuse its index
+    assert len(set(results)) == 1
+    assert embedder.calls == 1
+    assert engine._get_relevant_documents("MEP_206", k=1)[0].startswith("Page 1")
+
+
+class UnavailableEmbedder(StubEmbedder):
+    """Fails, or hangs, once documents are indexed"""
+    def __init__(self, error=None, delay=0.0):
+        super().__init__(latency=0)
+        self.error = error
+        self.delay = delay
+
+    def embed(self, texts, model=None, input_type=None):
+        if input_type == "search_query":
+            time.sleep(self.delay)
+            if self.error is not None:
+                raise self.error
+        return super().embed(texts, model, input_type)
+
+
+@pytest.mark.parametrize("embedder", [
+    UnavailableEmbedder(error=ConnectionError("cohere unreachable")),
+    UnavailableEmbedder(delay=0.5),
+])
+def test_lexical_ranking_alone_when_the_embedder_is_unavailable(embedder):
+    engine = make_engine(embedder, StubCollection(), query_embed_timeout=0.1)
+    engine.add_document(["Page 1: restart MEP_206 " * 30 + "Page 2: check the disks " * 30])
+
+    started = time.monotonic()
+    hits = engine._get_relevant_documents("MEP_206", k=1)
+
+    assert time.monotonic() - started < 0.4
+    assert "MEP_206" in hits[0]
+    engine.close()
+
+
+def test_other_embedder_errors_are_raised():
+    engine = make_engine(UnavailableEmbedder(error=ValueError("bad request")), StubCollection())
+    engine.add_document(["Page 1: restart MEP_206 " * 30])
+
+    with pytest.raises(ValueError):
+        engine._get_relevant_documents("MEP_206", k=1)
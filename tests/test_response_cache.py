@@ -0,0 +1,97 @@
+import response_cache
+from metrics import Metrics
+from response_cache import ResponseCache, replay
+
+PROMPT = "Tu es un assistant IT."
+QUESTION = "Comment redémarrer le service MEP_206 ?"
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_hit_ignores_case_accents_and_punctuation():
+    cache = ResponseCache()
+    cache.put(PROMPT, QUESTION, "systemctl restart mep_206", history=())
+
+    assert cache.get(PROMPT, "comment REDEMARRER le service mep_206", history=()) == "systemctl restart mep_206"
+    assert cache.get("Autre persona", QUESTION, history=()) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_only_first_turns_are_shared():
+    cache = ResponseCache()
+    history = [{"role": "user", "content": "voici mes logs"}]
+    cache.put(PROMPT, QUESTION, "réponse liée aux logs", history=history)
+    assert cache.get(PROMPT, QUESTION, history=()) is None
+
+    cache.put(PROMPT, QUESTION, "réponse générale", history=())
+    assert cache.get(PROMPT, QUESTION, history=history) is None
+
+
+def test_short_questions_and_empty_answers_are_not_cached():
+    cache = ResponseCache()
+    cache.put(PROMPT, "merci !", "de rien", history=())
+    cache.put(PROMPT, QUESTION, "  ", history=())
+    assert cache.stats()["entries"] == 0
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    cache = ResponseCache(ttl=60)
+    cache.put(PROMPT, QUESTION, "réponse", history=())
+
+    clock.now += 59
+    assert cache.get(PROMPT, QUESTION, history=()) == "réponse"
+    clock.now += 2
+    assert cache.get(PROMPT, QUESTION, history=()) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    questions = [f"Comment vérifier le disque du serveur {n} ?" for n in range(3)]
+    cache.put(PROMPT, questions[0], "a", history=())
+    cache.put(PROMPT, questions[1], "b", history=())
+    # Reading the first entry makes the second the least recently used
+    assert cache.get(PROMPT, questions[0], history=()) == "a"
+    cache.put(PROMPT, questions[2], "c", history=())
+
+    assert cache.get(PROMPT, questions[1], history=()) is None
+    assert cache.get(PROMPT, questions[0], history=()) == "a"
+    assert cache.get(PROMPT, questions[2], history=()) == "c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_semantic_match_above_threshold():
+    vectors = {QUESTION: [1.0, 0.0], "Comment relancer le service MEP_206 ?": [0.99, 0.1],
+               "Comment vérifier le disque du serveur ?": [0.0, 1.0]}
+    cache = ResponseCache(embed=lambda texts: [vectors[text] for text in texts])
+    cache.put(PROMPT, QUESTION, "systemctl restart mep_206", history=())
+
+    assert cache.get(PROMPT, "Comment relancer le service MEP_206 ?", history=()) == "systemctl restart mep_206"
+    assert cache.get(PROMPT, "Comment vérifier le disque du serveur ?", history=()) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_replay_streams_the_answer_unchanged():
+    answer = "Étape 1 :\n  systemctl restart mep_206\n"
+    assert "".join(replay(answer)) == answer.rstrip()
+
+
+def test_lookups_are_reported_to_metrics(monkeypatch):
+    recorded = Metrics(enabled=True)
+    monkeypatch.setattr(response_cache, "metrics", recorded)
+    cache = ResponseCache()
+    cache.get(PROMPT, QUESTION, history=())
+    cache.put(PROMPT, QUESTION, "réponse", history=())
+    cache.get(PROMPT, QUESTION, history=())
+
+    text = recorded.prometheus_text()
+    assert 'response_cache_lookups_total{outcome="hit"} 1' in text
+    assert 'response_cache_lookups_total{outcome="miss"} 1' in text
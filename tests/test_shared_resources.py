@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+
+from shared_resources import SharedResources, release_session_lease, session_lease
+
+
+class Client:
+    built = 0
+
+    def __init__(self):
+        Client.built += 1
+        self.number = Client.built
+        self.up = True
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def ping(client):
+    if not client.up:
+        raise ConnectionError("down")
+
+
+def test_lease_reads_rebuild_an_unhealthy_resource():
+    pool = SharedResources(health_check_interval=0)
+    lease = pool.lease("mongo", Client, ping)
+    first = lease.value
+
+    first.up = False
+
+    second = lease.value
+    assert second is not first
+    assert first.closed and not second.closed
+    assert lease.value is second
+
+
+def test_released_resource_is_closed_once():
+    pool = SharedResources()
+    leases = [pool.lease("groq", Client) for _ in range(2)]
+    client = leases[0].value
+
+    leases[0].release()
+    assert not client.closed
+    leases[1].release()
+    assert client.closed
+    assert pool.health() == {}
+
+
+def test_slow_build_does_not_block_other_keys():
+    pool = SharedResources()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.3)
+        return Client()
+
+    builder = threading.Thread(target=pool.acquire, args=("slow", slow))
+    builder.start()
+    started.wait()
+    begin = time.monotonic()
+    pool.acquire("fast", Client)
+    assert time.monotonic() - begin < 0.1
+    # A second session waits for the same build instead of starting another
+    assert pool.acquire("slow", slow) is pool.get("slow")
+    builder.join()
+    assert pool.health()["slow"]["refs"] == 2
+
+
+def test_failed_build_is_retried():
+    pool = SharedResources()
+
+    def broken():
+        raise ConnectionError("unreachable")
+
+    with pytest.raises(ConnectionError):
+        pool.acquire("ollama", broken)
+    assert isinstance(pool.acquire("ollama", Client), Client)
+
+
+def test_session_holds_one_lease_per_key_until_released():
+    session_state = {}
+    engine = session_lease(session_state, ("rag_engine", "tenant-a"), Client).value
+
+    assert session_lease(session_state, ("rag_engine", "tenant-a"), Client).value is engine
+    release_session_lease(session_state, ("rag_engine", "tenant-a"))
+    assert engine.closed
+    release_session_lease(session_state, ("rag_engine", "tenant-a"))
@@ -0,0 +1,67 @@
+import stream_render
+from metrics import Metrics
+from stream_render import StreamRenderer
+
+
+class Placeholder:
+    def __init__(self):
+        self.draws = []
+
+    def markdown(self, text):
+        self.draws.append(text)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_chunks_are_coalesced_within_a_frame():
+    placeholder, clock = Placeholder(), Clock()
+    renderer = StreamRenderer(placeholder, cursor="|", max_fps=10, clock=clock)
+    for token in ["un ", "deux ", "trois "]:
+        clock.now += 0.01
+        renderer.write(token)
+    assert placeholder.draws == []
+
+    clock.now += 0.1
+    renderer.write("quatre")
+    assert placeholder.draws == ["un deux trois quatre|"]
+    assert renderer.stats() == {"chunks": 4, "flushes": 1, "chars": len("un deux trois quatre")}
+
+
+def test_sentence_end_flushes_early():
+    placeholder, clock = Placeholder(), Clock()
+    renderer = StreamRenderer(placeholder, cursor="|", max_fps=4, clock=clock)
+    clock.now += 0.1
+    renderer.write("Bonjour")
+    clock.now += 0.01
+    renderer.write(".\n")
+    # A quarter of the frame interval has passed and the chunk ends a line
+    assert placeholder.draws == ["Bonjour.\n|"]
+
+
+def test_finish_draws_the_full_text_without_cursor():
+    placeholder, clock = Placeholder(), Clock()
+    renderer = StreamRenderer(placeholder, cursor="|", max_fps=1, clock=clock)
+    renderer.write("")
+    renderer.write("réponse")
+
+    assert renderer.finish() == "réponse"
+    assert placeholder.draws == ["réponse"]
+
+
+def test_chunks_and_redraws_are_reported_to_metrics(monkeypatch):
+    recorded = Metrics(enabled=True)
+    monkeypatch.setattr(stream_render, "metrics", recorded)
+    renderer = StreamRenderer(Placeholder(), max_fps=1, clock=Clock())
+    for token in ["un", " deux", " trois"]:
+        renderer.write(token)
+    renderer.finish()
+
+    text = recorded.prometheus_text()
+    assert "stream_render_chunks_total 3" in text
+    assert "stream_render_flushes_total 1" in text
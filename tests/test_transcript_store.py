@@ -0,0 +1,51 @@
+import json
+import os
+
+import pytest
+
+from transcript_store import TranscriptStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    # Flushed on read only, so tests do not race the background thread
+    store = TranscriptStore(str(tmp_path), flush_interval=3600)
+    yield store
+    store.close()
+
+
+def test_appends_are_buffered_then_written_once(store):
+    store.append("chat-1", "user", "Bonjour")
+    store.append("chat-1", "assistant", "Bonjour, que puis-je faire ?")
+    assert not os.path.exists(store.path("chat-1"))
+
+    assert [(r["role"], r["content"]) for r in store.records("chat-1")] == [
+        ("user", "Bonjour"), ("assistant", "Bonjour, que puis-je faire ?")]
+    store.append("chat-1", "user", "Merci")
+    assert len(list(store.records("chat-1"))) == 3
+
+
+def test_transcripts_are_kept_apart_and_ids_sanitized(store):
+    store.append("chat/../1", "user", "a")
+    store.append("chat-2", "user", "b")
+
+    assert os.path.dirname(store.path("chat/../1")) == store.directory
+    assert [r["content"] for r in store.records("chat/../1")] == ["a"]
+    assert list(store.records("inconnu")) == []
+
+
+def test_text_and_json_exports(store):
+    store.append("chat-1", "user", "Bonjour")
+    store.append("chat-1", "assistant", "Salut")
+
+    assert store.export("chat-1", "text").read().decode("utf-8") == "USER : Bonjour\nASSISTANT : Salut"
+    assert json.load(store.export("chat-1", "json")) == [
+        {"role": "user", "content": "Bonjour"}, {"role": "assistant", "content": "Salut"}]
+
+
+def test_timestamped_export(store):
+    store.append("chat-1", "user", "Bonjour")
+    text = store.export("chat-1", "timestamped").read().decode("utf-8")
+
+    assert text.startswith("Chat History - ")
+    assert "] User:\nBonjour\n" in text
@@ -0,0 +1,72 @@
+import json
+import os
+
+import pytest
+
+from user_registry import UserRegistry, hash_key
+
+PERSONAS = {
+    "chat_app": {
+        "guest_prompt": "Tu es un assistant IT.",
+        "users": [{"key_sha256": hash_key("secret-key"), "user_name": "Alice", "prompt": "Tu aides Alice."}],
+    }
+}
+
+
+def write(path, content, mtime):
+    path.write_text(content if isinstance(content, str) else json.dumps(content), encoding="utf-8")
+    # Distinct modification times, however coarse the filesystem clock
+    os.utime(path, ns=(mtime, mtime))
+
+
+@pytest.fixture
+def personas(tmp_path):
+    path = tmp_path / "personas.json"
+    write(path, PERSONAS, 1_000_000_000)
+    return path
+
+
+def test_lookup_by_key_digest(personas):
+    registry = UserRegistry(str(personas))
+
+    user = registry.get("chat_app", " secret-key ")
+    assert user["user_name"] == "Alice"
+    assert user["prompt"] == "Tu aides Alice."
+    assert registry.get("chat_app", "wrong") is None
+    assert registry.get("chat_app", "") is None
+    assert registry.guest_prompt("chat_app") == "Tu es un assistant IT."
+    assert registry.guest_prompt("other_app") is None
+
+
+def test_reload_picks_up_changes(personas):
+    registry = UserRegistry(str(personas), check_interval=0)
+    changed = json.loads(json.dumps(PERSONAS))
+    changed["chat_app"]["users"][0]["user_name"] = "Alice B."
+    write(personas, changed, 2_000_000_000)
+
+    assert registry.get("chat_app", "secret-key")["user_name"] == "Alice B."
+
+
+@pytest.mark.parametrize("content", [
+    "{ not json",
+    [1, 2],
+    {"chat_app": "not a section"},
+    {"chat_app": {"users": [1]}},
+    {"chat_app": {"users": [{"user_name": "no key", "prompt": "..."}]}},
+])
+def test_malformed_file_keeps_previous_registry(personas, content):
+    registry = UserRegistry(str(personas), check_interval=0)
+    write(personas, content, 2_000_000_000)
+
+    assert registry.reload() is False
+    assert registry.get("chat_app", "secret-key")["user_name"] == "Alice"
+    # Once fixed, the file is picked up again
+    write(personas, PERSONAS | {"other_app": {"guest_prompt": "Bonjour"}}, 3_000_000_000)
+    assert registry.guest_prompt("other_app") == "Bonjour"
+
+
+def test_missing_file_keeps_previous_registry(personas):
+    registry = UserRegistry(str(personas), check_interval=0)
+    personas.unlink()
+
+    assert registry.get("chat_app", "secret-key")["user_name"] == "Alice"
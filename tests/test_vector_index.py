@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+
+from vector_index import DTYPES, PersistentVectorIndex, VectorIndex, dequantize, normalize, quantize
+
+DIM = 32
+
+
+def random_rows(count, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+
+
+def brute_force(rows, query, k):
+    scores = normalize(rows) @ normalize(query)
+    return [int(row) for row in np.argsort(-scores)[:k]]
+
+
+def fill(index, rows, start=0):
+    ids = list(range(start, start + len(rows)))
+    index.add(ids, [f"chunk {i}" for i in ids], rows)
+
+
+def test_top_k_matches_brute_force():
+    rows = random_rows(300)
+    index = VectorIndex()
+    # Several inserts, so the matrix grows past its initial capacity
+    for start in range(0, len(rows), 70):
+        fill(index, rows[start:start + 70], start)
+    query = random_rows(1, seed=1)[0]
+
+    hits = index.search(query, k=5)
+
+    assert [row for row, _ in hits] == brute_force(rows, query, 5)
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+    assert index.content(hits[0][0]) == f"chunk {hits[0][0]}"
+
+
+def test_top_k_bounds():
+    index = VectorIndex()
+    assert index.search(random_rows(1)[0], k=3) == []
+    fill(index, random_rows(2))
+    assert len(index.search(random_rows(1)[0], k=10)) == 2
+    assert index.search(random_rows(1)[0], k=0) == []
+
+
+def test_rejects_other_dimensions():
+    index = VectorIndex(dim=DIM)
+    with pytest.raises(ValueError):
+        fill(index, np.ones((2, DIM + 1), dtype=np.float32))
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_persistent_index_reopens_with_same_results(tmp_path, dtype):
+    rows = random_rows(120)
+    query = random_rows(1, seed=2)[0]
+    index = PersistentVectorIndex(str(tmp_path), dtype=dtype)
+    fill(index, rows[:60])
+    fill(index, rows[60:], 60)
+    index.update_meta(title="Runbook")
+    index.flush()
+    expected = index.search(query, k=5)
+
+    reopened = PersistentVectorIndex(str(tmp_path))
+
+    assert len(reopened) == 120
+    assert reopened.dtype == dtype
+    assert reopened.meta["title"] == "Runbook"
+    assert [row for row, _ in reopened.search(query, k=5)] == [row for row, _ in expected]
+    assert reopened.content(7) == "chunk 7"
+    assert reopened.lexical.search("chunk 7", k=1)[0][0] == 7
+
+
+def test_ivf_falls_back_to_exact_search_before_training():
+    rows = random_rows(50)
+    query = random_rows(1, seed=3)[0]
+    index = VectorIndex(ann_params={"nlist": 4, "train_size": 1000})
+    fill(index, rows)
+
+    assert not index.ann.trained
+    assert [row for row, _ in index.search(query, k=5)] == brute_force(rows, query, 5)
+
+
+def test_ivf_search_after_training_returns_indexed_rows():
+    rows = random_rows(400)
+    index = VectorIndex(ann_params={"nlist": 4, "nprobe": 4, "train_size": 200})
+    fill(index, rows)
+    index.ann.train(index.matrix)
+    query = rows[17]
+
+    # Probing every list scans every row, so the result is exact
+    assert index.ann.trained
+    assert index.search(query, k=3)[0][0] == 17
+    assert [row for row, _ in index.search(query, k=5)] == brute_force(rows, query, 5)
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float32", 1e-7), ("float16", 1e-3), ("int8", 1e-2)])
+def test_quantization_round_trip(dtype, tolerance):
+    rows = normalize(random_rows(20))
+
+    stored, scales = quantize(rows, dtype)
+
+    assert stored.dtype == DTYPES[dtype]
+    assert (scales is not None) == (dtype == "int8")
+    np.testing.assert_allclose(dequantize(stored, scales), rows, atol=tolerance)
+
+
+def test_int8_quantization_keeps_zero_rows():
+    rows = np.zeros((1, DIM), dtype=np.float32)
+    stored, scales = quantize(rows, "int8")
+    assert not np.any(dequantize(stored, scales))
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_quantized_scores_match_dequantized_rows(dtype):
+    rows = normalize(random_rows(1500))
+    # Zero, tiny (float16 subnormal) and negative components
+    rows[0] = 0
+    rows[1, :4] = [1e-6, -1e-6, 3e-5, -1.0]
+    index = VectorIndex(dtype=dtype)
+    fill(index, rows)
+    query = random_rows(1, seed=4)[0]
+
+    expected = dequantize(index.matrix, index.scales) @ normalize(query)
+
+    np.testing.assert_allclose(index.scores(query), expected, rtol=1e-5, atol=1e-6)
+
+
+def test_ivf_with_derived_nlist_trains_at_document_scale():
+    rows = random_rows(2100)
+    index = VectorIndex(ann_params={})
+    fill(index, rows[:2000])
+    assert not index.ann.trained
+
+    fill(index, rows[2000:], 2000)
+
+    # sqrt(2100) lists of about 46 rows each
+    assert index.ann.trained
+    assert index.ann.nlist == 45
+    assert index.search(rows[17], k=1)[0][0] == 17
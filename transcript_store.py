@@ -0,0 +1,115 @@
+import datetime
+import io
+import json
+import os
+import re
+import threading
+from typing import Dict, Iterator, List
+
+DEFAULT_DIRECTORY = os.environ.get("TRANSCRIPT_DIR", "transcripts")
+# Seconds between two background flushes
+FLUSH_INTERVAL = 1.0
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class TranscriptStore:
+    """
+    Append-only JSONL transcript per conversation
+
+    append() only buffers the message; a background thread writes buffered
+    lines to <directory>/<transcript_id>.jsonl every flush_interval seconds.
+    Exports are produced on request by streaming the log, so keeping a
+    transcript costs the same per message however long the conversation is.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, flush_interval: float = FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        self._buffers: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="transcript-flush", daemon=True)
+        self._thread.start()
+
+    def path(self, transcript_id: str) -> str:
+        return os.path.join(self.directory, _UNSAFE.sub("_", transcript_id) + ".jsonl")
+
+    def append(self, transcript_id: str, role: str, content: str):
+        record = {
+            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "role": role,
+            "content": content,
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._buffers.setdefault(transcript_id, []).append(line)
+
+    def flush(self, transcript_id: str = None):
+        """Write buffered lines, of one transcript or all of them"""
+        # Held across taking and writing the lines, so a reader flushing its
+        # transcript waits for a background flush already holding them
+        with self._file_lock:
+            with self._lock:
+                if transcript_id is None:
+                    buffers, self._buffers = self._buffers, {}
+                else:
+                    buffers = {transcript_id: self._buffers.pop(transcript_id, [])}
+            for tid, lines in buffers.items():
+                if lines:
+                    with open(self.path(tid), "a", encoding="utf-8") as f:
+                        f.writelines(lines)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def records(self, transcript_id: str) -> Iterator[dict]:
+        """Messages of a transcript, read lazily from its log"""
+        self.flush(transcript_id)
+        try:
+            f = open(self.path(transcript_id), encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                yield json.loads(line)
+
+    def export(self, transcript_id: str, fmt: str = "text"):
+        """
+        Transcript as a file object ready for st.download_button
+
+        fmt is "text" (ROLE : content lines), "timestamped" (one dated block
+        per message) or "json" (list of role/content objects). The log is
+        streamed record by record into the buffer, without building the
+        whole transcript as one string.
+        """
+        out = io.BytesIO()
+        for chunk in self._format(self.records(transcript_id), fmt):
+            out.write(chunk.encode("utf-8"))
+        out.seek(0)
+        return out
+
+    @staticmethod
+    def _format(records, fmt):
+        if fmt == "json":
+            yield "["
+            for i, record in enumerate(records):
+                message = {"role": record["role"], "content": record["content"]}
+                yield ("," if i else "") + "\n  " + json.dumps(message, ensure_ascii=False)
+            yield "\n]\n"
+        elif fmt == "timestamped":
+            yield f"Chat History - {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+            for record in records:
+                sender = "User" if record["role"] == "user" else "Assistant"
+                yield f"[{record['timestamp']}] {sender}:\n{record['content']}\n\n"
+        else:
+            for i, record in enumerate(records):
+                yield ("\n" if i else "") + f"{record['role'].upper()} : {record['content']}"
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
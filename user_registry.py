@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+DEFAULT_PATH = os.environ.get(
+    "PERSONAS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "personas.json")
+)
+# Seconds between two checks of the file's modification time
+CHECK_INTERVAL = 2.0
+
+
+def hash_key(user_key: str) -> str:
+    """Digest stored in personas.json in place of the user key"""
+    return hashlib.sha256(user_key.strip().encode("utf-8")).hexdigest()
+
+
+def _persona(entry: dict) -> Mapping:
+    return MappingProxyType({
+        "user_name": entry["user_name"],
+        "prompt": entry["prompt"],
+        "it_domain": entry.get("it_domain"),
+        "skills": tuple(entry.get("skills", ())),
+    })
+
+
+def _section(section: dict) -> Mapping:
+    return MappingProxyType({
+        "guest_prompt": section.get("guest_prompt"),
+        "users": MappingProxyType({
+            entry["key_sha256"]: _persona(entry) for entry in section.get("users", ())
+        }),
+    })
+
+
+class UserRegistry:
+    """
+    Users and personas of every app, loaded from personas.json
+
+    The file holds one section per app with its guest prompt and users;
+    users are identified by the SHA-256 of their key, never the key itself.
+    Everything loaded is read-only and shared by all sessions, lookups are
+    a single dict access, and the file is reloaded when its modification
+    time changes, without restarting the server.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, check_interval: float = CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._sections: Mapping = MappingProxyType({})
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self) -> bool:
+        """
+        Load the file again; a file that cannot be read or has the wrong
+        structure keeps the previous registry, until it is modified again
+        """
+        with self._lock:
+            self._checked = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                return False
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+                sections = MappingProxyType({app: _section(section) for app, section in data.items()})
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                # Not retried on every check while the file is unchanged
+                self._mtime = mtime
+                return False
+            # Swapped in one assignment, so readers never see a partial load
+            self._sections = sections
+            self._mtime = mtime
+            return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        try:
+            changed = os.stat(self.path).st_mtime_ns != self._mtime
+        except OSError:
+            return
+        if changed:
+            self.reload()
+
+    def get(self, app: str, user_key: Optional[str]) -> Optional[Mapping]:
+        """Persona of the user with this key in an app, or None"""
+        if not user_key:
+            return None
+        self._maybe_reload()
+        section = self._sections.get(app)
+        return section["users"].get(hash_key(user_key)) if section else None
+
+    def guest_prompt(self, app: str) -> Optional[str]:
+        self._maybe_reload()
+        section = self._sections.get(app)
+        return section["guest_prompt"] if section else None
+
+    def users(self, app: str) -> Mapping:
+        self._maybe_reload()
+        section = self._sections.get(app)
+        return section["users"] if section else MappingProxyType({})
+
+
+# === Registry shared by all sessions of the process ===
+registry = UserRegistry()
+
+
+if __name__ == "__main__":
+    # Digest of a new user's key, to paste into personas.json
+    print(hash_key(sys.argv[1]))